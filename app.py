@@ -1,16 +1,145 @@
-from flask import Flask, render_template, request, jsonify, redirect
+from flask import Flask, Response, abort, g, make_response, render_template, request, jsonify, redirect, stream_with_context, url_for
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import threading
 import time
+import uuid
+from werkzeug.serving import is_running_from_reloader
+from assets import BUNDLES as ASSET_BUNDLES, AssetPipeline, EncodedContent
+from checkpoint import StateCheckpoint
+from clock import SYSTEM_CLOCK, VirtualClock
+from consumption import Consumables, ConsumptionProfile
+from event_stream import EventBroadcaster
+from gpio_backends import create_gpio_backend
 from gpio_controller import SimpleGPIOController
+from history import ActivationHistory
+from leader import LeaderClient, LeaderLock, LeaderServer, RemoteController
+from metrics import REQUEST_BUCKETS, Exposition, HistogramFamily
+from quiz_stats import QuizStats
+from schedule_index import OverlapIndex, find_conflicts
+from schedule_model import compile_schedules
+from schedule_simulator import SIMULATION_LOGGER, SimulatedController, SimulationRecorder
+from schedule_store import MemoryScheduleStore
+from timeline import TimelineCache, TimelineIndex
+from timing_engine import TimingEngine
+from transition_timer import TransitionTimer
+from zones import DEFAULT_ZONE, Zone, check_pin_conflicts, create_zone, load_zone_config
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "scent-controller-secret-key"
+# "json" rewrites schedules.json on every change, "journal" appends to schedules.journal,
+# "sqlite" keeps schedules in schedules.db (migrated from schedules.json on first start)
+app.config["SCHEDULE_STORAGE"] = os.environ.get("SCHEDULE_STORAGE", "json")
+# "auto" drives real pins when RPi.GPIO is installed and falls back to "mock";
+# "recording" simulates the pins and keeps a timeline of every edge
+app.config["GPIO_BACKEND"] = os.environ.get("GPIO_BACKEND", "auto")
+# "1" when several worker processes serve the app (see README, "Production server"): the
+# worker holding LEADER_LOCK owns the GPIO and the scheduler, the others forward to it
+app.config["MULTIPROCESS"] = os.environ.get("MULTIPROCESS", "0") == "1"
+app.config["LEADER_LOCK"] = os.environ.get("LEADER_LOCK", "scent-controller.lock")
+# Controller state of every zone, saved on each transition and resumed after a restart
+app.config["STATE_CHECKPOINT"] = os.environ.get("STATE_CHECKPOINT", "controller_state.json")
+# Log of every activation and pin edge (rotated), and the usage totals kept from it
+app.config["ACTIVATION_HISTORY"] = os.environ.get("ACTIVATION_HISTORY", "activation_history.log")
+app.config["USAGE_TOTALS"] = os.environ.get("USAGE_TOTALS", "usage_totals.json")
+# Cartridge capacity, flow rate and refill baselines
+app.config["CONSUMABLES"] = os.environ.get("CONSUMABLES", "consumables.json")
+# Quiz submissions (rotated) and the answer counters kept from them
+app.config["QUIZ_LOG"] = os.environ.get("QUIZ_LOG", "quiz_submissions.log")
+app.config["QUIZ_COUNTERS"] = os.environ.get("QUIZ_COUNTERS", "quiz_counters.json")
+# "1" serves the static files as minified, content-hashed, precompressed bundles from /assets/
+# and caches the rendered pages; "0" serves the source files (edits show without a restart)
+app.config["ASSET_PIPELINE"] = os.environ.get("ASSET_PIPELINE", "1") == "1"
+
+# Set up by create_app(): the GPIO backend and the timing thread driving the pins of
+# every zone exist only in the leader process (the only process in single-process mode)
+gpio_backend = None
+timing_engine = None
+leader_lock = None
+leader_client = None
+schedule_thread = None
+state_checkpoint = None
+activation_history = None
+
+# Schedules of the default zone, read from disk once and served from memory afterwards
+schedule_store = None
+
+# Cartridge settings of every zone (any worker may record a refill)
+consumables = None
+
+# Scent descriptions and names for the quiz result
+SCENT_INFO = {
+    "red": {
+        "name": "CRIMSON",
+        "description": "Bold and energizing - perfect for motivation and passion",
+        "mood": "Energetic and passionate"
+    },
+    "blue": {
+        "name": "AZURE",
+        "description": "Cool and refreshing - ideal for relaxation and tranquility",
+        "mood": "Calm and peaceful"
+    },
+    "yellow": {
+        "name": "AMBER",
+        "description": "Warm and inviting - great for comfort and coziness",
+        "mood": "Warm and welcoming"
+    },
+    "green": {
+        "name": "SAGE",
+        "description": "Fresh and clarifying - excellent for focus and clarity",
+        "mood": "Fresh and focused"
+    }
+}
+
+# Quiz submissions and their running counters (any worker may record one)
+quiz_stats = None
+
+# Static bundles served from /assets/ (built by create_app() unless ASSET_PIPELINE is off)
+asset_pipeline = None
+
+# Rendered pages by template, compressed once (pages only change with the templates)
+page_cache = {}
+
+# The schedule monitor sleeps until the next transition; edits wake it early
+transition_timer = TransitionTimer()
+
+# Controller and schedule changes are pushed to the browser over /api/events
+events = EventBroadcaster()
+
+# Zones by id (the default zone and those from zones.json), filled by create_app()
+zones = {}
+
+
+def watch_zone_schedules(zone):
+    """Wake the schedule monitor and notify /api/events clients when the zone's schedules change"""
+    zone.store.add_listener(transition_timer.wake)
+    if zone.id == DEFAULT_ZONE:
+        zone.store.add_listener(lambda: events.publish("schedules", {"version": zone.store.version}))
+    else:
+        zone.store.add_listener(
+            lambda: events.publish("zone_schedules", {"zone": zone.id, "version": zone.store.version})
+        )
+
+
+def watch_zone_controller(zone):
+    """Notify /api/events clients when the zone's controller state changes"""
+    if zone.id == DEFAULT_ZONE:
+        zone.controller.add_listener(lambda: events.publish("status", zone.controller.get_status()))
+    else:
+        zone.controller.add_listener(
+            lambda: events.publish(
+                "zone_status", {"zone": zone.id, "status": zone.controller.get_status()}
+            )
+        )
+
 
-# Initialize GPIO controller
-gpio_controller = SimpleGPIOController()
+def get_zone(zone_id=None):
+    """Return the zone a request addresses (the default zone for the original /api/... routes)"""
+    zone = zones.get(zone_id or DEFAULT_ZONE)
+    if zone is None:
+        abort(make_response(jsonify({"error": f"Unknown zone: {zone_id}"}), 404))
+    return zone
 
 
 def load_pin_mapping():
@@ -32,63 +161,151 @@ def load_pin_mapping():
 
 
 def load_schedules():
-    """Load scheduled items from JSON file"""
-    default_schedules = {"schedules": []}
-
-    try:
-        if os.path.exists("schedules.json"):
-            with open("schedules.json", "r") as f:
-                return json.load(f)
-        else:
-            # Create default schedules file
-            with open("schedules.json", "w") as f:
-                json.dump(default_schedules, f, indent=2)
-            return default_schedules
-    except Exception as e:
-        app.logger.error(f"Error loading schedules: {e}")
-        return default_schedules
+    """Load scheduled items for read-modify-write (served from the in-memory store)"""
+    return schedule_store.load()
 
 
 def save_schedules(schedules_data):
     """Save schedules to JSON file"""
     try:
-        with open("schedules.json", "w") as f:
-            json.dump(schedules_data, f, indent=2)
+        schedule_store.save(schedules_data)
         return True
     except Exception as e:
         app.logger.error(f"Error saving schedules: {e}")
         return False
 
 
-# Load configurations
-pin_mapping = load_pin_mapping()
-gpio_controller.set_pin_mapping(pin_mapping["formulas"])
+# Tells the state versions of this process apart from those served before a restart
+ETAG_EPOCH = uuid.uuid4().hex[:8]
+
+
+def state_etag(*versions):
+    """Build an ETag from the state versions a response was rendered from"""
+    return "-".join([ETAG_EPOCH, *(str(v) for v in versions)])
+
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds etag, otherwise None
+
+    Read the versions for etag before building the payload: if the state
+    changes in between, the client gets a newer body under an older tag and
+    simply refetches next time, never the other way round.
+    """
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    """Tag a response so clients can revalidate it with If-None-Match"""
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate on every request
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+# Request latency per route; scraped from /metrics
+request_seconds = HistogramFamily(("method", "route", "status"), REQUEST_BUCKETS)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get("request_started")
+    if started is not None:
+        # The URL rule, not the path, keeps the label set small
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        request_seconds.labels(request.method, route, str(response.status_code)).observe(
+            time.perf_counter() - started
+        )
+    return response
+
+
+def load_zone_formulas(zone_id):
+    """Read a zone's pin mapping from its configuration file"""
+    if zone_id == DEFAULT_ZONE:
+        return load_pin_mapping()["formulas"]
+    return load_zone_config()[zone_id]["formulas"]
+
+
+@app.context_processor
+def asset_url_helper():
+    return {"asset_urls": asset_urls}
+
+
+def asset_urls(name):
+    """URLs a page loads for an asset bundle: the hashed bundle, or its source files"""
+    if asset_pipeline is not None:
+        return [f"/assets/{asset_pipeline.filenames[name]}"]
+    return [url_for("static", filename=source) for source in ASSET_BUNDLES[name]]
+
+
+def send_encoded(content, cache_control):
+    """Respond with the precompressed variant of content the client accepts
+
+    The ETag is the content hash, told apart per encoding; it stays the
+    same across workers and restarts while the content is unchanged.
+    """
+    encoding, body = content.negotiate(request.accept_encodings)
+    etag = content.etag if encoding == "identity" else f"{content.etag}-{encoding}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, content_type=content.content_type)
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+@app.route("/assets/<filename>")
+def get_asset(filename):
+    """A bundle built by the asset pipeline; its name changes with its content"""
+    content = asset_pipeline.get(filename) if asset_pipeline is not None else None
+    if content is None:
+        abort(404)
+    return send_encoded(content, "public, max-age=31536000, immutable")
+
+
+def render_page(template):
+    """Render a page that takes no arguments, once per process when the asset pipeline is on"""
+    if asset_pipeline is None:
+        return render_template(template)
+    content = page_cache.get(template)
+    if content is None:
+        content = page_cache[template] = EncodedContent(
+            render_template(template).encode(), "text/html; charset=utf-8"
+        )
+    return send_encoded(content, "no-cache")
 
 
 @app.route("/")
 def selection():
     """Main selection menu page"""
-    return render_template("selection.html")
+    return render_page("selection.html")
 
 
 @app.route("/schedule")
 def schedule():
     """Time scheduling page"""
-    return render_template("schedule.html")
+    return render_page("schedule.html")
 
 
 @app.route("/schedule/<int:schedule_id>")
 def edit_schedule(schedule_id):
     """Edit specific schedule page"""
     try:
-        # Load schedules to check if the ID exists
-        schedules_data = load_schedules()
-        schedule = None
-        
-        for s in schedules_data.get("schedules", []):
-            if s.get("id") == schedule_id:
-                schedule = s
-                break
+        # Check if the ID exists
+        schedule = schedule_store.get(schedule_id)
         
         if not schedule:
             # If schedule doesn't exist, redirect to main schedule page
@@ -106,32 +323,44 @@ def edit_schedule(schedule_id):
 @app.route("/quiz")
 def quiz():
     """Scent preference quiz page"""
-    return render_template("quiz.html")
+    return render_page("quiz.html")
 
 
 @app.route("/information")
 def information():
     """Scent information and controls page"""
-    return render_template("information.html")
+    return render_page("information.html")
+
+
+@app.route("/api/zones", methods=["GET"])
+def list_zones():
+    """List the zones with their pin mapping and current state"""
+    try:
+        return jsonify({"zones": [zone.summary() for zone in list(zones.values())]})
+    except Exception as e:
+        app.logger.error(f"Error listing zones: {e}")
+        return jsonify({"error": "Internal server error"}), 500
 
 
 @app.route("/api/activate", methods=["POST"])
-def activate_formula():
+@app.route("/api/zones/<zone_id>/activate", methods=["POST"])
+def activate_formula(zone_id=None):
     """Activate formula with configuration"""
+    zone = get_zone(zone_id)
     try:
         data = request.get_json()
         color = data.get("color")
         cycle_time = data.get("cycle_time", 60)
         duration = data.get("duration", 10)
 
-        if color not in ["red", "blue", "yellow", "green"]:
+        if color not in zone.controller.pin_mapping:
             return jsonify({"error": "Invalid color"}), 400
 
         # Check if there's a currently active schedule and pause it
-        paused_schedule_info = pause_conflicting_schedule()
+        paused_schedule_info = pause_conflicting_schedule(zone)
         
         # Manual activation - this will override any scheduled formula
-        success = gpio_controller.activate_formula(
+        success = zone.controller.activate_formula(
             color,
             cycle_time,
             duration,
@@ -145,7 +374,7 @@ def activate_formula():
                 "active_formula": color,
                 "cycle_time": cycle_time,
                 "duration": duration,
-                "user_override": gpio_controller.user_override,
+                "user_override": zone.controller.user_override,
             }
             
             # Include paused schedule info if any
@@ -162,13 +391,15 @@ def activate_formula():
 
 
 @app.route("/api/deactivate", methods=["POST"])
-def deactivate_all():
+@app.route("/api/zones/<zone_id>/deactivate", methods=["POST"])
+def deactivate_all(zone_id=None):
     """Deactivate all formulas"""
+    zone = get_zone(zone_id)
     try:
         # Check if there's a currently active schedule and pause it
-        paused_schedule_info = pause_conflicting_schedule()
+        paused_schedule_info = pause_conflicting_schedule(zone)
         
-        gpio_controller.deactivate_all()
+        zone.controller.deactivate_all()
         
         response_data = {
             "status": "success", 
@@ -187,21 +418,46 @@ def deactivate_all():
 
 
 @app.route("/api/status", methods=["GET"])
-def get_status():
+@app.route("/api/zones/<zone_id>/status", methods=["GET"])
+def get_status(zone_id=None):
     """Get current GPIO pin states"""
+    zone = get_zone(zone_id)
     try:
-        status = gpio_controller.get_status()
-        return jsonify(status)
+        etag = state_etag(zone.controller.version)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        status = zone.controller.get_status()
+        return with_etag(jsonify(status), etag)
     except Exception as e:
         app.logger.error(f"Error getting status: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
+@app.route("/api/events", methods=["GET"])
+def get_events():
+    """Stream controller status and schedule changes as Server-Sent Events"""
+
+    def initial_events():
+        # Current state first, so (re)connecting clients never need to poll
+        zone = get_zone()
+        yield "status", zone.controller.get_status()
+        yield "schedules", {"version": zone.store.version}
+
+    return Response(
+        stream_with_context(events.stream(initial_events)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/api/clear-override", methods=["POST"])
-def clear_user_override():
+@app.route("/api/zones/<zone_id>/clear-override", methods=["POST"])
+def clear_user_override(zone_id=None):
     """Clear user override to allow schedules to resume"""
+    zone = get_zone(zone_id)
     try:
-        gpio_controller.clear_user_override()
+        zone.controller.clear_user_override()
         return jsonify(
             {
                 "status": "success",
@@ -215,28 +471,23 @@ def clear_user_override():
 
 
 @app.route("/api/pause-schedule", methods=["POST"])
-def pause_schedule():
+@app.route("/api/zones/<zone_id>/pause-schedule", methods=["POST"])
+def pause_schedule(zone_id=None):
     """Manually pause the current active schedule"""
+    zone = get_zone(zone_id)
     try:
-        schedules_data = load_schedules()
-        current_time = datetime.now().strftime("%H:%M")
-        
         # Find currently active schedule
-        active_schedule = find_active_schedule_for_time(schedules_data, current_time)
+        active_schedule = find_active_schedule(zone.clock.now(), zone)
         
         if active_schedule and not active_schedule.get("paused", False):
             # Mark the schedule as paused
-            schedules = schedules_data.get("schedules", [])
-            for schedule in schedules:
-                if schedule["id"] == active_schedule["id"]:
-                    schedule["paused"] = True
-                    schedule["paused_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    break
-            
-            save_schedules(schedules_data)
+            zone.store.update(
+                active_schedule["id"],
+                {"paused": True, "paused_at": zone.clock.now().strftime("%Y-%m-%d %H:%M:%S")},
+            )
             
             # Deactivate current GPIO
-            gpio_controller.deactivate_all()
+            zone.controller.deactivate_all()
             
             return jsonify({
                 "status": "success",
@@ -261,34 +512,25 @@ def pause_schedule():
 
 
 @app.route("/api/resume-schedule", methods=["POST"])
-def resume_schedule():
+@app.route("/api/zones/<zone_id>/resume-schedule", methods=["POST"])
+def resume_schedule(zone_id=None):
     """Resume a paused schedule"""
+    zone = get_zone(zone_id)
     try:
-        schedules_data = load_schedules()
-        current_time = datetime.now().strftime("%H:%M")
-        
         # Find currently paused schedule that should be active now
         paused_schedule = None
-        active_schedule = find_active_schedule_for_time(schedules_data, current_time)
+        active_schedule = find_active_schedule(zone.clock.now(), zone)
         
         if active_schedule and active_schedule.get("paused", False):
             paused_schedule = active_schedule
         
         if paused_schedule:
             # Unpause the schedule
-            schedules = schedules_data.get("schedules", [])
-            for schedule in schedules:
-                if schedule["id"] == paused_schedule["id"]:
-                    schedule["paused"] = False
-                    if "paused_at" in schedule:
-                        del schedule["paused_at"]
-                    break
-            
-            save_schedules(schedules_data)
+            zone.store.update(paused_schedule["id"], {"paused": False}, remove=("paused_at",))
             
             # Clear user override and refresh current schedule
-            gpio_controller.clear_user_override()
-            refresh_result = refresh_current_schedule()
+            zone.controller.clear_user_override()
+            refresh_result = refresh_current_schedule(zone)
             
             return jsonify({
                 "status": "success",
@@ -314,21 +556,34 @@ def resume_schedule():
 
 
 @app.route("/api/reload-pin-mapping", methods=["POST"])
-def reload_pin_mapping():
+@app.route("/api/zones/<zone_id>/reload-pin-mapping", methods=["POST"])
+def reload_pin_mapping(zone_id=None):
     """Reload pin mapping from JSON file without restarting the app"""
+    zone = get_zone(zone_id)
     try:
+        # Read the new mapping first; zones sharing the timing engine need disjoint pins
+        try:
+            new_formulas = load_zone_formulas(zone.id)
+            check_pin_conflicts(
+                {
+                    **{other.id: other.controller.pin_mapping for other in zones.values()},
+                    zone.id: new_formulas,
+                }
+            )
+        except (KeyError, ValueError) as e:
+            return jsonify({"error": f"Invalid pin mapping for zone {zone.id}: {e}"}), 400
+
         # Deactivate all current formulas first
-        gpio_controller.deactivate_all()
+        zone.controller.deactivate_all()
         
         # Reload pin mapping from file
-        new_pin_mapping = load_pin_mapping()
-        gpio_controller.set_pin_mapping(new_pin_mapping["formulas"])
+        zone.controller.set_pin_mapping(new_formulas)
         
         return jsonify(
             {
                 "status": "success",
                 "message": "Pin mapping reloaded successfully",
-                "pin_mapping": new_pin_mapping["formulas"]
+                "pin_mapping": new_formulas
             }
         )
     except Exception as e:
@@ -337,39 +592,32 @@ def reload_pin_mapping():
 
 
 @app.route("/api/schedule-status", methods=["GET"])
-def get_schedule_status():
+@app.route("/api/zones/<zone_id>/schedule-status", methods=["GET"])
+def get_schedule_status(zone_id=None):
     """Get detailed schedule status including next upcoming schedule"""
+    zone = get_zone(zone_id)
     try:
-        schedules_data = load_schedules()
-        current_time = datetime.now().strftime("%H:%M")
+        current_datetime = zone.clock.now()
+        current_time = current_datetime.strftime("%H:%M")
+
+        # The payload only changes with the schedules, the controller state or the minute
+        etag = state_etag(
+            zone.store.current_version(),
+            zone.controller.version,
+            current_datetime.strftime("%Y%m%d%H%M"),
+        )
+        cached = not_modified(etag)
+        if cached:
+            return cached
 
         # Find currently active schedule
-        active_schedule = find_active_schedule_for_time(schedules_data, current_time)
+        active_schedule = find_active_schedule(current_datetime, zone)
 
         # Get GPIO status for correlation
-        gpio_status = gpio_controller.get_status()
-
-        # Find next upcoming schedule
-        next_schedule = None
-        current_datetime = datetime.now()
-
-        for schedule in schedules_data.get("schedules", []):
-            if (
-                schedule.get("enabled")
-                and should_activate_schedule(schedule)
-                and schedule.get("start_time")
-            ):
+        gpio_status = zone.controller.get_status()
 
-                # Parse start time for today
-                start_time = datetime.strptime(schedule["start_time"], "%H:%M").time()
-                start_datetime = datetime.combine(current_datetime.date(), start_time)
-
-                # If start time has passed today, check tomorrow
-                if start_datetime <= current_datetime:
-                    start_datetime += timedelta(days=1)
-
-                if not next_schedule or start_datetime < next_schedule["datetime"]:
-                    next_schedule = {"schedule": schedule, "datetime": start_datetime}
+        # Find next upcoming schedule (a start that already passed today counts for tomorrow)
+        next_schedule, next_datetime = zone.store.next_after(current_datetime)
 
         # Check if active schedule is paused
         paused_schedule = None
@@ -382,104 +630,247 @@ def get_schedule_status():
             }
             active_schedule = None  # Don't show as active if paused
 
+        return with_etag(
+            jsonify(
+                {
+                    "current_time": current_time,
+                    "active_schedule": active_schedule,
+                    "paused_schedule": paused_schedule,
+                    "next_schedule": next_schedule,
+                    "next_schedule_time": (
+                        next_datetime.strftime("%H:%M") if next_schedule else None
+                    ),
+                    "gpio_status": gpio_status,
+                }
+            ),
+            etag,
+        )
+    except Exception as e:
+        app.logger.error(f"Error getting schedule status: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+def timing_stats():
+    """Scheduler and GPIO edge timing of the leader process"""
+    return {
+        "scheduler": transition_timer.get_stats(),
+        "gpio": timing_engine.get_stats(),
+    }
+
+
+@app.route("/api/timing-stats", methods=["GET"])
+def get_timing_stats():
+    """Get timing statistics (how late schedule transitions and GPIO edges fired)"""
+    try:
+        if timing_engine is None:
+            # A follower worker: the scheduler and the pins run in the leader
+            return jsonify(leader_client.query("timing_stats"))
+        return jsonify(timing_stats())
+    except Exception as e:
+        app.logger.error(f"Error getting timing stats: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+def usage_totals():
+    """Usage totals by zone from the leader's activation history"""
+    return activation_history.usage()
+
+
+def zone_usage(zone):
+    """The zone's usage totals, from this process or the leader"""
+    if activation_history is None:
+        usage = leader_client.query("usage")
+    else:
+        usage = usage_totals()
+    return usage.get(zone.id) or {"formulas": {}, "hours": {}, "days": {}}
+
+
+@app.route("/api/usage", methods=["GET"])
+@app.route("/api/zones/<zone_id>/usage", methods=["GET"])
+def get_usage(zone_id=None):
+    """On-time totals of the zone's formulas: overall, per hour (last week) and per day (last year)"""
+    zone = get_zone(zone_id)
+    try:
+        # A follower worker asks the leader, where the pins and their history are
+        return jsonify(zone_usage(zone))
+    except Exception as e:
+        app.logger.error(f"Error getting usage: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route("/api/consumables", methods=["GET"])
+@app.route("/api/zones/<zone_id>/consumables", methods=["GET"])
+def get_consumables(zone_id=None):
+    """Cartridge level of each formula and when the schedules will have emptied it"""
+    zone = get_zone(zone_id)
+    try:
+        formulas = zone_usage(zone)["formulas"]
+        # Expanded once per schedules version; a forecast only walks the last week
+        profile = zone.store.cached_compiled("consumption_profile", ConsumptionProfile)
+        now = zone.clock.now()
         return jsonify(
             {
-                "current_time": current_time,
-                "active_schedule": active_schedule,
-                "paused_schedule": paused_schedule,
-                "next_schedule": next_schedule["schedule"] if next_schedule else None,
-                "next_schedule_time": (
-                    next_schedule["datetime"].strftime("%H:%M")
-                    if next_schedule
-                    else None
-                ),
-                "gpio_status": gpio_status,
+                "formulas": {
+                    formula: consumables.status(
+                        zone.id, formula, formulas.get(formula, {}).get("on_seconds", 0.0), profile, now
+                    )
+                    for formula in zone.controller.pin_mapping
+                }
             }
         )
     except Exception as e:
-        app.logger.error(f"Error getting schedule status: {e}")
+        app.logger.error(f"Error getting consumables: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
+@app.route("/api/consumables/<formula>/refill", methods=["POST"])
+@app.route("/api/zones/<zone_id>/consumables/<formula>/refill", methods=["POST"])
+def refill_consumable(formula, zone_id=None):
+    """Record a full cartridge (optionally with a new capacity_ml / flow_ml_per_second)"""
+    zone = get_zone(zone_id)
+    if formula not in zone.controller.pin_mapping:
+        return jsonify({"error": f"Unknown formula: {formula}"}), 404
+    data = request.get_json(silent=True) or {}
+    changes = {}
+    for key in ("capacity_ml", "flow_ml_per_second"):
+        if key in data:
+            value = data[key]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                return jsonify({"error": f"{key} must be a positive number"}), 400
+            changes[key] = value
+
+    try:
+        on_seconds = zone_usage(zone)["formulas"].get(formula, {}).get("on_seconds", 0.0)
+        changes["refilled_on_seconds"] = on_seconds
+        changes["refilled_at"] = zone.clock.now().isoformat(timespec="seconds")
+        consumables.update(zone.id, formula, changes)
+        profile = zone.store.cached_compiled("consumption_profile", ConsumptionProfile)
+        return jsonify(
+            {
+                "status": "success",
+                "formula": formula,
+                "cartridge": consumables.status(zone.id, formula, on_seconds, profile, zone.clock.now()),
+            }
+        )
+    except Exception as e:
+        app.logger.error(f"Error recording refill: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus text exposition of the request, scheduler, storage and GPIO metrics"""
+    out = Exposition(prefix="scent_")
+    samples = request_seconds.items()
+    out.counter(
+        "http_requests_total",
+        "HTTP requests handled, by route and status.",
+        [(labels, histogram.snapshot()[2]) for labels, histogram in samples],
+    )
+    out.histogram("http_request_duration_seconds", "HTTP request latency by route.", samples)
+    # Worker processes report their own requests and storage I/O; only the leader has
+    # the scheduler, controller and GPIO metrics
+    out.gauge(
+        "leader",
+        "1 if this process owns the GPIO and the schedule monitor.",
+        1 if timing_engine is not None else 0,
+    )
+    for zone in list(zones.values()):
+        zone.store.collect_metrics(out, {"zone": zone.id})
+    if timing_engine is not None:
+        transition_timer.collect_metrics(out)
+        if state_checkpoint is not None:
+            state_checkpoint.collect_metrics(out)
+        if activation_history is not None:
+            activation_history.collect_metrics(out)
+        pin_labels = {}
+        for zone in list(zones.values()):
+            zone.controller.collect_metrics(out, {"zone": zone.id})
+            for color, pin in zone.controller.pin_mapping.items():
+                pin_labels[pin] = {"zone": zone.id, "formula": color, "pin": pin}
+        timing_engine.collect_metrics(out, pin_labels)
+    out.gauge(
+        "threads",
+        "Threads in the process (activations share the one GPIO timing thread).",
+        threading.active_count(),
+    )
+    out.gauge("event_stream_clients", "Connected /api/events clients.", events.client_count())
+    return Response(out.text(), content_type=Exposition.CONTENT_TYPE)
+
+
 @app.route("/api/schedules", methods=["GET"])
-def get_schedules():
+@app.route("/api/zones/<zone_id>/schedules", methods=["GET"])
+def get_schedules(zone_id=None):
     """Get all scheduled items"""
+    zone = get_zone(zone_id)
     try:
-        schedules_data = load_schedules()
-        return jsonify(schedules_data)
+        etag = state_etag(zone.store.current_version())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        # Serialized once per schedules version, not once per request
+        body = zone.store.cached("schedules_json", lambda data: app.json.dumps(data) + "\n")
+        return with_etag(Response(body, mimetype="application/json"), etag)
     except Exception as e:
         app.logger.error(f"Error getting schedules: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
 @app.route("/api/schedules", methods=["POST"])
-def create_schedule():
+@app.route("/api/zones/<zone_id>/schedules", methods=["POST"])
+def create_schedule(zone_id=None):
     """Create new scheduled item"""
+    zone = get_zone(zone_id)
     try:
         data = request.get_json()
 
         # Validate schedule data
-        validation_error = validate_schedule_data(data)
+        validation_error = validate_schedule_data(data, zone)
         if validation_error:
             return jsonify({"error": validation_error}), 400
 
-        schedules_data = load_schedules()
+        # Create new schedule object (the store assigns the id)
+        new_schedule = build_new_schedule(data)
+
+        # Hold the store lock so no other edit can slip in between check and insert
+        with zone.store.lock:
+            # Check for overlapping schedules
+            overlapping = get_overlap_index(zone).overlapping(new_schedule)
+            if overlapping:
+                overlap_details = []
+                for schedule in overlapping:
+                    overlap_details.append(
+                        {
+                            "id": schedule["id"],
+                            "formula": schedule["formula"],
+                            "time_range": f"{schedule['start_time']}-{schedule['end_time']}",
+                            "recurrence": schedule["recurrence"],
+                        }
+                    )
 
-        # Create new schedule object
-        max_id = max([s.get("id", 0) for s in schedules_data["schedules"]], default=0)
-        new_schedule = {
-            "id": max_id + 1,
-            "start_time": data.get("start_time"),
-            "end_time": data.get("end_time"),
-            "formula": data.get("formula"),
-            "cycle_time": data.get("cycle_time", 60),
-            "duration": data.get("duration", 10),
-            "recurrence": data.get("recurrence", "daily"),
-            "enabled": True,
-        }
-        
-        # Add schedule_date for one-time schedules
-        if data.get("recurrence") == "once" and data.get("schedule_date"):
-            new_schedule["schedule_date"] = data.get("schedule_date")
+                return (
+                    jsonify(
+                        {
+                            "error": "Schedule overlaps with existing schedules",
+                            "overlapping_schedules": overlap_details,
+                            "message": "Please choose a different time slot or disable the conflicting schedules.",
+                        }
+                    ),
+                    409,
+                )  # 409 Conflict
 
-        # Check for overlapping schedules
-        overlapping = find_overlapping_schedules(
-            new_schedule, schedules_data["schedules"]
-        )
-        if overlapping:
-            overlap_details = []
-            for schedule in overlapping:
-                overlap_details.append(
-                    {
-                        "id": schedule["id"],
-                        "formula": schedule["formula"],
-                        "time_range": f"{schedule['start_time']}-{schedule['end_time']}",
-                        "recurrence": schedule["recurrence"],
-                    }
-                )
+            # Add the new schedule
+            try:
+                new_schedule = zone.store.insert(new_schedule)
+            except Exception as e:
+                app.logger.error(f"Error saving schedules: {e}")
+                return jsonify({"error": "Failed to save schedule"}), 500
 
-            return (
-                jsonify(
-                    {
-                        "error": "Schedule overlaps with existing schedules",
-                        "overlapping_schedules": overlap_details,
-                        "message": "Please choose a different time slot or disable the conflicting schedules.",
-                    }
-                ),
-                409,
-            )  # 409 Conflict
-
-        # Add the new schedule
-        schedules_data["schedules"].append(new_schedule)
-
-        if save_schedules(schedules_data):
-            # Check if this new schedule should be active right now
-            refresh_result = refresh_current_schedule()
-            response = new_schedule.copy()
-            response["refresh_result"] = refresh_result
-            return jsonify(response)
-        else:
-            return jsonify({"error": "Failed to save schedule"}), 500
+        # Check if this new schedule should be active right now
+        refresh_result = refresh_current_schedule(zone)
+        response = new_schedule.copy()
+        response["refresh_result"] = refresh_result
+        return jsonify(response)
 
     except Exception as e:
         app.logger.error(f"Error creating schedule: {e}")
@@ -487,87 +878,84 @@ def create_schedule():
 
 
 @app.route("/api/schedules/<int:schedule_id>", methods=["PUT"])
-def update_schedule(schedule_id):
+@app.route("/api/zones/<zone_id>/schedules/<int:schedule_id>", methods=["PUT"])
+def update_schedule(schedule_id, zone_id=None):
     """Update existing scheduled item"""
+    zone = get_zone(zone_id)
     try:
         data = request.get_json()
-        schedules_data = load_schedules()
 
-        # Find the schedule to update
-        target_schedule = None
-        for schedule in schedules_data["schedules"]:
-            if schedule.get("id") == schedule_id:
-                target_schedule = schedule
-                break
+        with zone.store.lock:
+            # Find the schedule to update
+            target_schedule = zone.store.get(schedule_id)
+
+            if not target_schedule:
+                return jsonify({"error": "Schedule not found"}), 404
+
+            # Create updated schedule data for validation
+            updated_schedule = {
+                "start_time": data.get("start_time", target_schedule.get("start_time")),
+                "end_time": data.get("end_time", target_schedule.get("end_time")),
+                "formula": data.get("formula", target_schedule.get("formula")),
+                "cycle_time": data.get("cycle_time", target_schedule.get("cycle_time", 60)),
+                "duration": data.get("duration", target_schedule.get("duration", 10)),
+                "recurrence": data.get(
+                    "recurrence", target_schedule.get("recurrence", "daily")
+                ),
+                "enabled": data.get("enabled", target_schedule.get("enabled", True)),
+            }
+            
+            # Handle schedule_date for one-time schedules
+            if updated_schedule["recurrence"] == "once":
+                updated_schedule["schedule_date"] = data.get("schedule_date", target_schedule.get("schedule_date"))
+
+            # Validate the updated schedule data
+            validation_error = validate_schedule_data(updated_schedule, zone)
+            if validation_error:
+                return jsonify({"error": validation_error}), 400
+
+            # Check for overlapping schedules (excluding the current schedule)
+            overlapping = get_overlap_index(zone).overlapping(
+                updated_schedule, exclude_id=schedule_id
+            )
+            if overlapping:
+                overlap_details = []
+                for schedule in overlapping:
+                    overlap_details.append(
+                        {
+                            "id": schedule["id"],
+                            "formula": schedule["formula"],
+                            "time_range": f"{schedule['start_time']}-{schedule['end_time']}",
+                            "recurrence": schedule["recurrence"],
+                        }
+                    )
 
-        if not target_schedule:
-            return jsonify({"error": "Schedule not found"}), 404
-
-        # Create updated schedule data for validation
-        updated_schedule = {
-            "start_time": data.get("start_time", target_schedule.get("start_time")),
-            "end_time": data.get("end_time", target_schedule.get("end_time")),
-            "formula": data.get("formula", target_schedule.get("formula")),
-            "cycle_time": data.get("cycle_time", target_schedule.get("cycle_time", 60)),
-            "duration": data.get("duration", target_schedule.get("duration", 10)),
-            "recurrence": data.get(
-                "recurrence", target_schedule.get("recurrence", "daily")
-            ),
-            "enabled": data.get("enabled", target_schedule.get("enabled", True)),
-        }
-        
-        # Handle schedule_date for one-time schedules
-        if updated_schedule["recurrence"] == "once":
-            updated_schedule["schedule_date"] = data.get("schedule_date", target_schedule.get("schedule_date"))
+                return (
+                    jsonify(
+                        {
+                            "error": "Updated schedule would overlap with existing schedules",
+                            "overlapping_schedules": overlap_details,
+                            "message": "Please choose a different time slot or disable the conflicting schedules.",
+                        }
+                    ),
+                    409,
+                )  # 409 Conflict
 
-        # Validate the updated schedule data
-        validation_error = validate_schedule_data(updated_schedule)
-        if validation_error:
-            return jsonify({"error": validation_error}), 400
+            # Clear paused status when schedule is updated - editing should unpause the schedule
+            remove = ("paused", "paused_at") if target_schedule.get("paused") else ()
 
-        # Check for overlapping schedules (excluding the current schedule)
-        overlapping = find_overlapping_schedules(
-            updated_schedule, schedules_data["schedules"], exclude_id=schedule_id
-        )
-        if overlapping:
-            overlap_details = []
-            for schedule in overlapping:
-                overlap_details.append(
-                    {
-                        "id": schedule["id"],
-                        "formula": schedule["formula"],
-                        "time_range": f"{schedule['start_time']}-{schedule['end_time']}",
-                        "recurrence": schedule["recurrence"],
-                    }
-                )
+            # Update the schedule
+            try:
+                target_schedule = zone.store.update(schedule_id, updated_schedule, remove=remove)
+            except Exception as e:
+                app.logger.error(f"Error saving schedules: {e}")
+                return jsonify({"error": "Failed to save schedule"}), 500
 
-            return (
-                jsonify(
-                    {
-                        "error": "Updated schedule would overlap with existing schedules",
-                        "overlapping_schedules": overlap_details,
-                        "message": "Please choose a different time slot or disable the conflicting schedules.",
-                    }
-                ),
-                409,
-            )  # 409 Conflict
-
-        # Update the schedule
-        target_schedule.update(updated_schedule)
-        
-        # Clear paused status when schedule is updated - editing should unpause the schedule
-        if target_schedule.get("paused"):
-            target_schedule.pop("paused", None)
-            target_schedule.pop("paused_at", None)
-
-        if save_schedules(schedules_data):
-            # Check if the current schedule needs to be updated
-            refresh_result = refresh_current_schedule()
-            response = target_schedule.copy()
-            response["refresh_result"] = refresh_result
-            return jsonify(response)
-        else:
-            return jsonify({"error": "Failed to save schedule"}), 500
+        # Check if the current schedule needs to be updated
+        refresh_result = refresh_current_schedule(zone)
+        response = target_schedule.copy()
+        response["refresh_result"] = refresh_result
+        return jsonify(response)
 
     except Exception as e:
         app.logger.error(f"Error updating schedule: {e}")
@@ -575,18 +963,18 @@ def update_schedule(schedule_id):
 
 
 @app.route("/api/schedules/check-overlap", methods=["POST"])
-def check_schedule_overlap():
+@app.route("/api/zones/<zone_id>/schedules/check-overlap", methods=["POST"])
+def check_schedule_overlap(zone_id=None):
     """Check if a schedule would overlap with existing schedules without creating it"""
+    zone = get_zone(zone_id)
     try:
         data = request.get_json()
 
         # Validate schedule data
-        validation_error = validate_schedule_data(data)
+        validation_error = validate_schedule_data(data, zone)
         if validation_error:
             return jsonify({"error": validation_error, "valid": False}), 400
 
-        schedules_data = load_schedules()
-
         # Create temporary schedule object for overlap checking
         temp_schedule = {
             "start_time": data.get("start_time"),
@@ -598,8 +986,8 @@ def check_schedule_overlap():
 
         # Check for overlaps (exclude schedule if editing)
         exclude_id = data.get("exclude_id")  # For edit operations
-        overlapping = find_overlapping_schedules(
-            temp_schedule, schedules_data["schedules"], exclude_id=exclude_id
+        overlapping = get_overlap_index(zone).overlapping(
+            temp_schedule, exclude_id=exclude_id
         )
 
         if overlapping:
@@ -636,22 +1024,257 @@ def check_schedule_overlap():
         return jsonify({"error": "Internal server error"}), 500
 
 
+@app.route("/api/schedules/conflicts", methods=["GET"])
+@app.route("/api/zones/<zone_id>/schedules/conflicts", methods=["GET"])
+def get_schedule_conflicts(zone_id=None):
+    """Report every pair of enabled schedules that overlap each other"""
+    zone = get_zone(zone_id)
+    try:
+        conflicts = zone.store.cached_compiled("conflicts", find_conflicts)
+
+        conflict_details = []
+        for first, second, days in conflicts:
+            conflict_details.append(
+                {
+                    "schedules": [
+                        {
+                            "id": schedule["id"],
+                            "formula": schedule["formula"],
+                            "time_range": f"{schedule['start_time']}-{schedule['end_time']}",
+                            "recurrence": schedule["recurrence"],
+                        }
+                        for schedule in (first, second)
+                    ],
+                    "days": days,
+                }
+            )
+
+        return jsonify(
+            {
+                "has_conflicts": bool(conflict_details),
+                "conflict_count": len(conflict_details),
+                "conflicts": conflict_details,
+            }
+        )
+
+    except Exception as e:
+        app.logger.error(f"Error checking schedule conflicts: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route("/api/schedules/bulk", methods=["POST"])
+@app.route("/api/zones/<zone_id>/schedules/bulk", methods=["POST"])
+def bulk_create_schedules(zone_id=None):
+    """Create a batch of schedules in one atomic write, all or nothing"""
+    zone = get_zone(zone_id)
+    try:
+        data = request.get_json(silent=True)
+        items = data.get("schedules") if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Provide a non-empty \"schedules\" list"}), 400
+
+        # Validate the whole batch, reporting every invalid entry at once
+        errors = []
+        new_schedules = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors.append({"index": index, "error": "Schedule must be an object"})
+                continue
+            validation_error = validate_schedule_data(item, zone)
+            if validation_error:
+                errors.append({"index": index, "error": validation_error})
+                continue
+            new_schedule = build_new_schedule(item)
+            # Imports may carry disabled schedules (e.g. from /api/schedules/export)
+            if item.get("enabled") is False:
+                new_schedule["enabled"] = False
+            new_schedules.append((index, new_schedule))
+        if errors:
+            return jsonify({"error": "Invalid schedules in batch", "errors": errors}), 400
+
+        # Hold the store lock so no other edit can slip in between check and insert
+        with zone.store.lock:
+            # One sweep over existing + new schedules finds overlaps within the batch
+            # and against stored schedules; stored pairs are left to /conflicts
+            batch_index = {id(schedule): index for index, schedule in new_schedules}
+            combined = zone.store.compiled() + compile_schedules(
+                {"schedules": [schedule for _, schedule in new_schedules]}
+            )
+
+            def detail(schedule):
+                if id(schedule) in batch_index:
+                    key = {"index": batch_index[id(schedule)]}
+                else:
+                    key = {"id": schedule["id"]}
+                key.update(
+                    {
+                        "formula": schedule["formula"],
+                        "time_range": f"{schedule['start_time']}-{schedule['end_time']}",
+                        "recurrence": schedule["recurrence"],
+                    }
+                )
+                return key
+
+            conflict_details = [
+                {"schedules": [detail(first), detail(second)], "days": days}
+                for first, second, days in find_conflicts(combined)
+                if id(second) in batch_index
+            ]
+            if conflict_details:
+                return (
+                    jsonify(
+                        {
+                            "error": "Schedules in the batch overlap with each other or with existing schedules",
+                            "conflicts": conflict_details,
+                            "message": "Nothing was saved. Fix the conflicting time slots and resubmit the batch.",
+                        }
+                    ),
+                    409,
+                )  # 409 Conflict
+
+            try:
+                created = zone.store.insert_many([schedule for _, schedule in new_schedules])
+            except Exception as e:
+                app.logger.error(f"Error saving schedules: {e}")
+                return jsonify({"error": "Failed to save schedules"}), 500
+
+        # Check if one of the new schedules should be active right now
+        refresh_result = refresh_current_schedule(zone)
+        return jsonify(
+            {
+                "created": created,
+                "count": len(created),
+                "refresh_result": refresh_result,
+            }
+        )
+
+    except Exception as e:
+        app.logger.error(f"Error creating schedules in bulk: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route("/api/schedules/export", methods=["GET"])
+@app.route("/api/zones/<zone_id>/schedules/export", methods=["GET"])
+def export_schedules(zone_id=None):
+    """Download all schedules as JSON that POST /api/schedules/bulk accepts"""
+    zone = get_zone(zone_id)
+    try:
+        schedules_data = zone.store.snapshot()
+        prefix = "schedules" if zone.id == DEFAULT_ZONE else f"schedules-{zone.id}"
+        filename = f"{prefix}-{datetime.now().strftime('%Y%m%d-%H%M')}.json"
+        return Response(
+            json.dumps(schedules_data, indent=2),
+            mimetype="application/json",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+    except Exception as e:
+        app.logger.error(f"Error exporting schedules: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+# Longest range /api/schedules/simulate replays in one request
+MAX_SIMULATION_DAYS = 366
+
+
+def parse_local_datetime(value, name):
+    """Parse an ISO 8601 local date/time query parameter (raises ValueError)"""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: use an ISO 8601 date/time such as 2024-05-06T09:00")
+    if moment.tzinfo is not None:
+        raise ValueError(f"Invalid {name}: use local time without a UTC offset")
+    return moment
+
+
+@app.route("/api/schedules/simulate", methods=["GET"])
+@app.route("/api/zones/<zone_id>/schedules/simulate", methods=["GET"])
+def get_schedule_simulation(zone_id=None):
+    """Replay the scheduler over ?from=&to= (default: the next 7 days) and return the activation timeline"""
+    zone = get_zone(zone_id)
+    try:
+        start = request.args.get("from")
+        start = parse_local_datetime(start, "from") if start else zone.clock.now().replace(microsecond=0)
+        end = request.args.get("to")
+        end = parse_local_datetime(end, "to") if end else start + timedelta(days=7)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if end <= start:
+        return jsonify({"error": "to must be after from"}), 400
+    if end - start > timedelta(days=MAX_SIMULATION_DAYS):
+        return jsonify({"error": f"Simulate at most {MAX_SIMULATION_DAYS} days at once"}), 400
+
+    try:
+        return jsonify(
+            simulate_schedules(zone.store.snapshot(), start, end, zone.controller.pin_mapping)
+        )
+    except Exception as e:
+        app.logger.error(f"Error simulating schedules: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+# The monthly calendar shows six weeks; keep responses to a couple of months
+MAX_TIMELINE_DAYS = 62
+
+
+@app.route("/api/timeline", methods=["GET"])
+@app.route("/api/zones/<zone_id>/timeline", methods=["GET"])
+def get_timeline(zone_id=None):
+    """Schedule occurrences over ?start=&days= (default: today and the next 6 days) for the calendar"""
+    zone = get_zone(zone_id)
+    today = zone.clock.now().date()
+    start = request.args.get("start")
+    try:
+        start = date.fromisoformat(start) if start else today
+    except ValueError:
+        return jsonify({"error": "Invalid start: use a date such as 2024-05-06"}), 400
+    days = request.args.get("days", 7, type=int)
+    if not 1 <= days <= MAX_TIMELINE_DAYS:
+        return jsonify({"error": f"days must be between 1 and {MAX_TIMELINE_DAYS}"}), 400
+
+    try:
+        # Dateless one-time schedules show on the current day, so the day is part of the state
+        etag = state_etag(zone.store.current_version(), today.toordinal())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+
+        def render():
+            index = zone.store.cached_compiled(
+                "timeline_index", lambda schedules: TimelineIndex(schedules, pause_expires_at)
+            )
+            payload = {
+                "start": start.isoformat(),
+                "days": days,
+                "intervals": index.expand(start, days, today),
+            }
+            return app.json.dumps(payload) + "\n"
+
+        # Rendered once per range and schedules version: a schedule change starts a new cache
+        timelines = zone.store.cached("timeline_cache", lambda data: TimelineCache())
+        body = timelines.get((start, days, today), render)
+        return with_etag(Response(body, mimetype="application/json"), etag)
+    except Exception as e:
+        app.logger.error(f"Error building timeline: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
 @app.route("/api/schedules/<int:schedule_id>", methods=["DELETE"])
-def delete_schedule(schedule_id):
+@app.route("/api/zones/<zone_id>/schedules/<int:schedule_id>", methods=["DELETE"])
+def delete_schedule(schedule_id, zone_id=None):
     """Delete scheduled item"""
+    zone = get_zone(zone_id)
     try:
-        schedules_data = load_schedules()
-        schedules_data["schedules"] = [
-            s for s in schedules_data["schedules"] if s.get("id") != schedule_id
-        ]
-
-        if save_schedules(schedules_data):
-            # Check if the currently running schedule was deleted and needs to be stopped
-            refresh_result = refresh_current_schedule()
-            return jsonify({"status": "success", "refresh_result": refresh_result})
-        else:
+        try:
+            zone.store.delete(schedule_id)
+        except Exception as e:
+            app.logger.error(f"Error saving schedules: {e}")
             return jsonify({"error": "Failed to save schedules"}), 500
 
+        # Check if the currently running schedule was deleted and needs to be stopped
+        refresh_result = refresh_current_schedule(zone)
+        return jsonify({"status": "success", "refresh_result": refresh_result})
+
     except Exception as e:
         app.logger.error(f"Error deleting schedule: {e}")
         return jsonify({"error": "Internal server error"}), 500
@@ -668,7 +1291,7 @@ def quiz_result():
             return jsonify({"error": "Invalid number of answers"}), 400
         
         # Count answers for each scent formula
-        scent_counts = {"red": 0, "blue": 0, "yellow": 0, "green": 0}
+        scent_counts = dict.fromkeys(SCENT_INFO, 0)
         
         for answer in answers:
             if answer in scent_counts:
@@ -677,34 +1300,16 @@ def quiz_result():
         # Find the scent with the most votes
         recommended_scent = max(scent_counts, key=scent_counts.get)
         
-        # Scent descriptions and names
-        scent_info = {
-            "red": {
-                "name": "CRIMSON",
-                "description": "Bold and energizing - perfect for motivation and passion",
-                "mood": "Energetic and passionate"
-            },
-            "blue": {
-                "name": "AZURE", 
-                "description": "Cool and refreshing - ideal for relaxation and tranquility",
-                "mood": "Calm and peaceful"
-            },
-            "yellow": {
-                "name": "AMBER",
-                "description": "Warm and inviting - great for comfort and coziness",
-                "mood": "Warm and welcoming"
-            },
-            "green": {
-                "name": "SAGE",
-                "description": "Fresh and clarifying - excellent for focus and clarity",
-                "mood": "Fresh and focused"
-            }
-        }
+        try:
+            quiz_stats.record(answers, recommended_scent)
+        except Exception as e:
+            # The visitor still gets the result
+            app.logger.error(f"Error recording quiz submission: {e}")
         
         return jsonify({
             "status": "success",
             "recommended_scent": recommended_scent,
-            "scent_info": scent_info[recommended_scent],
+            "scent_info": SCENT_INFO[recommended_scent],
             "score_breakdown": scent_counts
         })
         
@@ -713,13 +1318,23 @@ def quiz_result():
         return jsonify({"error": "Internal server error"}), 500
 
 
-def should_activate_schedule(schedule):
+@app.route("/api/quiz-stats", methods=["GET"])
+def get_quiz_stats():
+    """Quiz submissions so far, with the distribution of recommendations and of each question's answers"""
+    try:
+        return jsonify(quiz_stats.stats())
+    except Exception as e:
+        app.logger.error(f"Error getting quiz stats: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
+def should_activate_schedule(schedule, clock=SYSTEM_CLOCK):
     """Check if schedule should activate based on recurrence pattern"""
     # Don't activate paused schedules
     if schedule.get("paused", False):
         return False
         
-    now = datetime.now()
+    now = clock.now()
     current_day = now.strftime("%A").lower()
 
     recurrence = schedule.get("recurrence", "daily")
@@ -755,23 +1370,50 @@ def should_activate_schedule(schedule):
     return False
 
 
-def mark_schedule_as_executed(schedule_id):
+def mark_schedule_as_executed(schedule_id, zone=None):
     """Mark a one-time schedule as executed and disable it"""
+    zone = zone or get_zone()
     try:
-        schedules_data = load_schedules()
-        schedules = schedules_data.get("schedules", [])
-        
-        for schedule in schedules:
-            if schedule.get("id") == schedule_id:
-                schedule["executed"] = True
-                schedule["enabled"] = False  # Disable the schedule
-                break
-        
-        save_schedules(schedules_data)
-        app.logger.info(f"Schedule {schedule_id} marked as executed and disabled")
+        # Disable the schedule along with marking it executed
+        zone.store.update(schedule_id, {"executed": True, "enabled": False})
+        zone.logger.info(f"Schedule {schedule_id} marked as executed and disabled")
         
     except Exception as e:
-        app.logger.error(f"Error marking schedule {schedule_id} as executed: {e}")
+        zone.logger.error(f"Error marking schedule {schedule_id} as executed: {e}")
+
+
+def pause_expires_at(schedule):
+    """When a schedule's pause runs out: 2 hours after pausing, or at the next midnight
+
+    Either way a later occurrence is due, so the pause only skips the current
+    one. Returns None for schedules without a (readable) pause time.
+    """
+    paused_at = schedule.get("paused_at")
+    if not paused_at:
+        return None
+    try:
+        paused_datetime = datetime.fromisoformat(paused_at)
+    except ValueError:
+        return None
+    next_midnight = datetime.combine(paused_datetime.date() + timedelta(days=1), datetime.min.time())
+    return min(paused_datetime + timedelta(hours=2), next_midnight)
+
+
+def paused_schedules(schedules):
+    """(pause expiry, Schedule) of the paused schedules, soonest expiry first"""
+    expiries = [(pause_expires_at(s.data), s) for s in schedules if s.paused]
+    return sorted(((e, s) for e, s in expiries if e is not None), key=lambda item: item[0])
+
+
+def resume_expired_pauses(zone):
+    """Auto-resume the zone's paused schedules whose pause has run out"""
+    now = zone.clock.now()
+    for expires_at, paused in zone.store.cached_compiled("paused", paused_schedules):
+        if expires_at > now:
+            break
+        schedule = zone.store.update(paused.id, {}, remove=("paused", "paused_at"))
+        if schedule:
+            zone.logger.info(f"Auto-resumed schedule: {schedule.get('formula')} ({schedule.get('start_time')}-{schedule.get('end_time')})")
 
 
 def is_time_in_range(current_time, start_time, end_time):
@@ -786,28 +1428,6 @@ def is_time_in_range(current_time, start_time, end_time):
         return current >= start or current < end  # Changed <= to < for end time
 
 
-def calculate_schedule_duration(start_time, end_time):
-    """Calculate duration in seconds between start and end time"""
-    try:
-        start = datetime.strptime(start_time, "%H:%M").time()
-        end = datetime.strptime(end_time, "%H:%M").time()
-
-        # Convert to datetime objects for today
-        today = datetime.now().date()
-        start_dt = datetime.combine(today, start)
-        end_dt = datetime.combine(today, end)
-
-        # Handle overnight schedules
-        if end < start:
-            end_dt = end_dt + timedelta(days=1)
-
-        duration = (end_dt - start_dt).total_seconds()
-        return max(duration, 60)  # Minimum 1 minute
-    except Exception as e:
-        app.logger.error(f"Error calculating schedule duration: {e}")
-        return 3600  # Default to 1 hour
-
-
 def schedules_overlap(schedule1, schedule2):
     """Check if two schedules have overlapping time ranges on the same days"""
     # Check if they share any recurrence days
@@ -913,7 +1533,7 @@ def time_ranges_overlap(start1, end1, start2, end2):
 
 
 def find_overlapping_schedules(new_schedule, existing_schedules, exclude_id=None):
-    """Find all existing schedules that would overlap with the new schedule"""
+    """Find all existing schedules that would overlap with the new schedule (linear scan)"""
     overlapping = []
 
     for schedule in existing_schedules:
@@ -932,8 +1552,26 @@ def find_overlapping_schedules(new_schedule, existing_schedules, exclude_id=None
     return overlapping
 
 
-def validate_schedule_data(data):
-    """Validate schedule data and return error message if invalid"""
+def build_new_schedule(data):
+    """Build a new schedule from validated request data (the store assigns the id)"""
+    new_schedule = {
+        "start_time": data.get("start_time"),
+        "end_time": data.get("end_time"),
+        "formula": data.get("formula"),
+        "cycle_time": data.get("cycle_time", 60),
+        "duration": data.get("duration", 10),
+        "recurrence": data.get("recurrence", "daily"),
+        "enabled": True,
+    }
+
+    # Add schedule_date for one-time schedules
+    if data.get("recurrence") == "once" and data.get("schedule_date"):
+        new_schedule["schedule_date"] = data.get("schedule_date")
+    return new_schedule
+
+
+def validate_schedule_data(data, zone):
+    """Validate schedule data for zone and return error message if invalid"""
     # Check required fields
     required_fields = ["start_time", "end_time", "formula", "recurrence"]
     for field in required_fields:
@@ -977,8 +1615,8 @@ def validate_schedule_data(data):
     if data["start_time"] == data["end_time"]:
         return "Start time and end time cannot be the same."
 
-    # Validate formula
-    valid_formulas = ["red", "blue", "yellow", "green"]
+    # Validate formula against the zone's pin mapping
+    valid_formulas = list(zone.controller.pin_mapping)
     if data["formula"] not in valid_formulas:
         return f"Invalid formula. Must be one of: {', '.join(valid_formulas)}"
 
@@ -1015,16 +1653,8 @@ def validate_schedule_data(data):
     return None  # No errors
 
 
-def wait_for_next_minute():
-    """Wait until the next minute begins (at :00 seconds)"""
-    now = datetime.now()
-    # Calculate seconds until next minute
-    seconds_to_wait = 60 - now.second - (now.microsecond / 1000000.0)
-    time.sleep(seconds_to_wait)
-
-
 def find_active_schedule_for_time(schedules_data, current_time):
-    """Find which schedule should be active at the given time"""
+    """Find which schedule should be active at the given time (linear scan of schedules_data)"""
     for schedule in schedules_data.get("schedules", []):
         if (
             schedule.get("enabled")
@@ -1040,59 +1670,67 @@ def find_active_schedule_for_time(schedules_data, current_time):
     return None
 
 
-def pause_conflicting_schedule():
+def find_active_schedule(moment, zone=None):
+    """Find which stored schedule should be active at the given datetime (indexed lookup)"""
+    zone = zone or get_zone()
+    return zone.store.active_at(moment)
+
+
+def get_overlap_index(zone=None):
+    """Per-weekday interval index of the stored schedules for overlap checks"""
+    zone = zone or get_zone()
+    return zone.store.cached_compiled("overlap_index", OverlapIndex)
+
+
+def pause_conflicting_schedule(zone=None):
     """Pause any currently active schedule when user manually overrides"""
+    zone = zone or get_zone()
     try:
-        schedules_data = load_schedules()
-        current_time = datetime.now().strftime("%H:%M")
-        
         # Find what schedule should be active right now
-        active_schedule = find_active_schedule_for_time(schedules_data, current_time)
+        active_schedule = find_active_schedule(zone.clock.now(), zone)
         
         if active_schedule and not active_schedule.get("paused", False):
             # Get current GPIO status
-            gpio_status = gpio_controller.get_status()
+            gpio_status = zone.controller.get_status()
             
             # If there's something active, pause the conflicting schedule
             # This includes both scheduled and previously resumed schedules
             if gpio_status.get("active"):
-                # Find the schedule in the data and pause it
-                for schedule in schedules_data["schedules"]:
-                    if schedule.get("id") == active_schedule.get("id"):
-                        schedule["paused"] = True
-                        schedule["paused_at"] = datetime.now().isoformat()
-                        
-                        # Save the updated schedules
-                        if save_schedules(schedules_data):
-                            app.logger.info(f"Paused schedule: {schedule.get('formula')} ({schedule.get('start_time')}-{schedule.get('end_time')})")
-                            return {
-                                "id": schedule.get("id"),
-                                "formula": schedule.get("formula"),
-                                "start_time": schedule.get("start_time"),
-                                "end_time": schedule.get("end_time"),
-                                "recurrence": schedule.get("recurrence", "daily")
-                            }
-                        break
+                # Pause the schedule in the store
+                schedule = zone.store.update(
+                    active_schedule.get("id"),
+                    {"paused": True, "paused_at": zone.clock.now().isoformat()},
+                )
+                if schedule:
+                    zone.logger.info(f"Paused schedule: {schedule.get('formula')} ({schedule.get('start_time')}-{schedule.get('end_time')})")
+                    return {
+                        "id": schedule.get("id"),
+                        "formula": schedule.get("formula"),
+                        "start_time": schedule.get("start_time"),
+                        "end_time": schedule.get("end_time"),
+                        "recurrence": schedule.get("recurrence", "daily")
+                    }
         
         return None
         
     except Exception as e:
-        app.logger.error(f"Error pausing conflicting schedule: {e}")
+        zone.logger.error(f"Error pausing conflicting schedule: {e}")
         return None
 
 
-def refresh_current_schedule():
+def refresh_current_schedule(zone=None):
     """Check current time and update active schedule if needed after schedule changes"""
+    zone = zone or get_zone()
     try:
-        schedules_data = load_schedules()
-        current_time = datetime.now().strftime("%H:%M")
-        current_datetime = datetime.now()
+        resume_expired_pauses(zone)
+        current_datetime = zone.clock.now()
         
-        # Find what schedule should be active right now
-        target_schedule = find_active_schedule_for_time(schedules_data, current_time)
+        # Find what schedule should be active right now (pre-parsed, see schedule_model)
+        target = zone.store.active_schedule_at(current_datetime)
+        target_schedule = target.data if target else None
         
         # Get current GPIO status
-        gpio_status = gpio_controller.get_status()
+        gpio_status = zone.controller.get_status()
         
 
         
@@ -1102,23 +1740,16 @@ def refresh_current_schedule():
                 # Auto-resume logic: clear pause flag if this is a new occurrence
                 paused_at = target_schedule.get("paused_at")
                 if paused_at:
-                    paused_datetime = datetime.fromisoformat(paused_at)
-                    current_datetime = datetime.now()
-                    
-                    # If more than 2 hours have passed or it's a different day, auto-resume
-                    if ((current_datetime - paused_datetime).total_seconds() > 7200 or 
-                        paused_datetime.date() != current_datetime.date()):
+                    # If 2 hours have passed or it's a different day, auto-resume
+                    if pause_expires_at(target_schedule) <= current_datetime:
                         
                         # Clear pause flag and update schedule
-                        schedules_data = load_schedules()
-                        for schedule in schedules_data["schedules"]:
-                            if schedule.get("id") == target_schedule.get("id"):
-                                schedule.pop("paused", None)
-                                schedule.pop("paused_at", None)
-                                save_schedules(schedules_data)
-                                app.logger.info(f"Auto-resumed schedule: {schedule.get('formula')} ({schedule.get('start_time')}-{schedule.get('end_time')})")
-                                target_schedule = schedule  # Use updated schedule
-                                break
+                        schedule = zone.store.update(
+                            target_schedule.get("id"), {}, remove=("paused", "paused_at")
+                        )
+                        if schedule:
+                            zone.logger.info(f"Auto-resumed schedule: {schedule.get('formula')} ({schedule.get('start_time')}-{schedule.get('end_time')})")
+                            target_schedule = schedule  # Use updated schedule
                     else:
                         # Schedule is still paused, don't start it
                         return {
@@ -1131,24 +1762,26 @@ def refresh_current_schedule():
             target_cycle_time = target_schedule.get("cycle_time", 60)
             target_duration = target_schedule.get("duration", 10)
             
-            # Check if we need to start or change the active formula
+            end_datetime = target.end_after(current_datetime)
+            # The running activation's end (the simulator keeps it as a datetime)
+            running_end = gpio_status.get("schedule_end_time")
+            if isinstance(running_end, datetime):
+                running_end = running_end.timestamp()
+            
+            # Check if we need to start or change the active formula; an edited end time
+            # restarts the run too, or it would stop at the old end
             needs_change = (
                 not gpio_status.get("active") or 
                 gpio_status.get("active_formula") != target_formula or 
-                gpio_status.get("cycle_time") != target_cycle_time or 
-                gpio_status.get("duration") != target_duration or
-                not gpio_status.get("is_scheduled")
+                gpio_status.get("current_cycle_time") != target_cycle_time or 
+                gpio_status.get("current_duration") != target_duration or
+                not gpio_status.get("is_scheduled") or
+                running_end is None or
+                abs(running_end - end_datetime.timestamp()) > 1
             )
             
             if needs_change:
                 # Calculate remaining time for this schedule
-                end_time = datetime.strptime(target_schedule["end_time"], "%H:%M").time()
-                end_datetime = datetime.combine(current_datetime.date(), end_time)
-                
-                # Handle case where end time is next day (crosses midnight)
-                if end_datetime <= current_datetime:
-                    end_datetime += timedelta(days=1)
-                
                 remaining_seconds = (end_datetime - current_datetime).total_seconds()
                 
                 # Don't start if less than 30 seconds remaining
@@ -1158,15 +1791,13 @@ def refresh_current_schedule():
                         "message": "Schedule time has already passed or expires too soon"
                     }
                 
-                remaining_minutes = remaining_seconds / 60
-                
-                # Start the scheduled formula
-                success = gpio_controller.activate_formula(
+                # Start the scheduled formula for the rest of its window
+                success = zone.controller.activate_formula(
                     target_formula,
                     target_cycle_time,
                     target_duration,
                     is_scheduled=True,
-                    activation_duration=remaining_minutes
+                    activation_duration=remaining_seconds
                 )
                 
                 if success:
@@ -1193,7 +1824,7 @@ def refresh_current_schedule():
         else:
             # No schedule should be active - stop any scheduled activity
             if gpio_status.get("active") and gpio_status.get("is_scheduled"):
-                gpio_controller.stop_all()
+                zone.controller.deactivate_all()
                 return {
                     "status": "stopped_activities",
                     "message": "Stopped scheduled activities - no schedule should be active"
@@ -1205,131 +1836,360 @@ def refresh_current_schedule():
                 }
                 
     except Exception as e:
-        app.logger.error(f"Error refreshing current schedule: {e}")
+        zone.logger.error(f"Error refreshing current schedule: {e}")
         return {
             "status": "error",
             "message": f"Error refreshing schedule: {str(e)}"
         }
 
 
-def schedule_monitor():
-    """Background thread to monitor scheduled activation times - checks at exact minute changes"""
-    active_schedules = {}  # Track currently active schedules
-    last_active_schedule = None  # Track what was active in the previous minute
+def adopt_running_schedule(zone):
+    """Adopt a schedule already running at startup instead of restarting its cycle
 
-    # Wait for the first minute boundary
-    wait_for_next_minute()
+    It was started by the startup check or resumed from the checkpoint; a
+    resumed manual override keeps the schedule waiting as it did before.
+    """
+    startup_schedule = find_active_schedule(zone.clock.now(), zone)
+    gpio_status = zone.controller.get_status()
+    if startup_schedule and (
+        gpio_status.get("user_override")
+        or (
+            gpio_status.get("is_scheduled")
+            and gpio_status.get("active_formula") == startup_schedule.get("formula")
+        )
+    ):
+        zone.active_schedules[startup_schedule.get("id")] = startup_schedule
+        zone.last_active_schedule = startup_schedule.get("formula")
 
-    while True:
-        try:
-            schedules_data = load_schedules()
-            current_time = datetime.now().strftime("%H:%M")
 
-            # Find which schedule should be active right now
-            target_schedule = find_active_schedule_for_time(
-                schedules_data, current_time
+def evaluate_zone_schedules(zone):
+    """Start or stop the zone's scheduled formula for the schedule that should be active now"""
+    active_schedules = zone.active_schedules  # Schedules this zone is currently running
+    resume_expired_pauses(zone)
+
+    # Find which schedule should be active right now (pre-parsed, see schedule_model)
+    target = zone.store.active_schedule_at(zone.clock.now())
+    target_schedule = target.data if target else None
+
+    # Determine what action to take
+    if target_schedule:
+        schedule_id = target_schedule.get("id")
+        target_formula = target_schedule.get("formula")
+
+        # Check if this is a new schedule starting
+        is_new_schedule = (
+            schedule_id not in active_schedules
+            or zone.last_active_schedule != target_schedule.get("formula")
+        )
+
+        if is_new_schedule:
+            # Calculate how long this schedule should run
+            schedule_duration = target.duration_seconds()
+
+            # Start new schedule even if user override is active: a scheduled
+            # activation clears the override under the controller's lock
+            if zone.controller.user_override:
+                zone.logger.info(
+                    "New schedule session starting - clearing user override for transition"
+                )
+
+            success = zone.controller.activate_formula(
+                target_formula,
+                target_schedule.get("cycle_time", 60),
+                target_schedule.get("duration", 10),
+                is_scheduled=True,
+                activation_duration=schedule_duration,
             )
 
-            # Determine what action to take
-            if target_schedule:
-                schedule_id = target_schedule.get("id")
-                target_formula = target_schedule.get("formula")
+            if success:
+                # One-time schedules handing over to this one have had their run
+                for other_id, other in list(active_schedules.items()):
+                    if other_id != schedule_id and other.get("recurrence") == "once":
+                        mark_schedule_as_executed(other_id, zone)
+                        del active_schedules[other_id]
+
+                active_schedules[schedule_id] = target_schedule
+                zone.last_active_schedule = target_formula
+                zone.logger.info(
+                    f"Started scheduled formula: {target_formula} ({target_schedule['start_time']}-{target_schedule['end_time']}) for {schedule_duration}s in zone {zone.id}"
+                )
+            else:
+                zone.logger.error(
+                    f"Failed to start scheduled formula: {target_formula} in zone {zone.id}"
+                )
+
+        # If schedule is already running, just update tracking
+        elif schedule_id not in active_schedules:
+            active_schedules[schedule_id] = target_schedule
 
-                # Check if this is a new schedule starting
-                is_new_schedule = (
-                    schedule_id not in active_schedules
-                    or last_active_schedule != target_schedule.get("formula")
+    else:
+        # No schedule should be active - check if we need to stop anything
+        schedules_to_remove = []
+
+        for schedule_id, schedule in active_schedules.items():
+            # This schedule is no longer in its time window
+            if (
+                zone.controller.active_schedule == schedule["formula"]
+                and not zone.controller.user_override
+            ):
+                zone.controller.deactivate_all()
+                zone.logger.info(
+                    f"Ended scheduled formula: {schedule['formula']} ({schedule['start_time']}-{schedule['end_time']}) in zone {zone.id}"
                 )
 
-                if is_new_schedule:
-                    # Calculate how long this schedule should run
-                    schedule_duration = calculate_schedule_duration(
-                        target_schedule["start_time"], target_schedule["end_time"]
-                    )
+            # Mark one-time schedules as executed and disable them once their
+            # window is over (marking at start would end the run immediately)
+            if schedule.get("recurrence") == "once":
+                mark_schedule_as_executed(schedule_id, zone)
+
+            schedules_to_remove.append(schedule_id)
+
+        # Clean up inactive schedules
+        for schedule_id in schedules_to_remove:
+            del active_schedules[schedule_id]
+
+        zone.last_active_schedule = None
+
+
+def zone_next_transition(zone, moment):
+    """The earliest instant after moment at which the zone's active schedule can change"""
+    transitions = [zone.store.next_transition_after(moment)]
+    # A running-out pause makes its schedule eligible again
+    for expires_at, _ in zone.store.cached_compiled("paused", paused_schedules):
+        if expires_at > moment:
+            transitions.append(expires_at)
+            break
+    transitions = [t for t in transitions if t is not None]
+    return min(transitions) if transitions else None
+
+
+def next_zone_transition(moment):
+    """The earliest instant after moment at which any zone's active schedule can change"""
+    transitions = [zone_next_transition(zone, moment) for zone in list(zones.values())]
+    transitions = [t for t in transitions if t is not None]
+    return min(transitions) if transitions else None
+
+
+def simulate_schedules(schedules_data, start, end, formulas=None):
+    """Replay the scheduler from start to end on a virtual clock and return its timeline
+
+    Runs the real scheduler code (the startup check, then the monitor's
+    evaluation at every transition, with pause expiry and one-time schedules
+    being marked executed) on an in-memory copy of schedules_data. A
+    SimulatedController stands in for the pins, idle at start as after a
+    restart. Returns {"from", "to", "activations", "events"}: every
+    activation with its schedule, cycle and start/end, and the schedule
+    changes the scheduler made (executed, resumed).
+    """
+    clock = VirtualClock(start)
+    # Pin numbers do not matter in a replay, only which formulas exist
+    formulas = formulas or dict.fromkeys(["red", "blue", "yellow", "green"])
+    zone = Zone(
+        "simulation",
+        "Simulation",
+        formulas,
+        MemoryScheduleStore(schedules_data),
+        clock=clock,
+        logger=SIMULATION_LOGGER,
+    )
+    zone.controller = controller = SimulatedController(clock, formulas)
+    recorder = SimulationRecorder(zone)
 
-                    # NEW LOGIC: Start new schedule even if user override is active
-                    # This handles session transitions automatically
-                    if gpio_controller.user_override:
-                        app.logger.info(
-                            f"New schedule session starting - clearing user override for transition"
-                        )
-                        gpio_controller.user_override = False
-
-                    success = gpio_controller.activate_formula(
-                        target_formula,
-                        target_schedule.get("cycle_time", 60),
-                        target_schedule.get("duration", 10),
-                        is_scheduled=True,
-                        activation_duration=schedule_duration,
-                    )
+    refresh_current_schedule(zone)
+    adopt_running_schedule(zone)
+    recorder.record()
+    while True:
+        # Like the monitor, which a schedule change wakes right away, evaluate again
+        # when the evaluation itself changed the schedules (bounded, in case it never settles)
+        for _ in range(10):
+            version = zone.store.current_version()
+            evaluate_zone_schedules(zone)
+            recorder.record()
+            if zone.store.current_version() == version:
+                break
 
-                    if success:
-                        active_schedules[schedule_id] = target_schedule
-                        last_active_schedule = target_formula
-                        app.logger.info(
-                            f"Started scheduled formula: {target_formula} ({target_schedule['start_time']}-{target_schedule['end_time']}) for {schedule_duration}s"
-                        )
-                        
-                        # Mark one-time schedules as executed and disable them
-                        if target_schedule.get("recurrence") == "once":
-                            mark_schedule_as_executed(target_schedule["id"])
-                            app.logger.info(f"One-time schedule {schedule_id} marked as executed and disabled")
-                    else:
-                        app.logger.error(
-                            f"Failed to start scheduled formula: {target_formula}"
-                        )
+        transition = zone_next_transition(zone, clock.now())
+        limit = end if transition is None else min(transition, end)
+        # The timing engine ends timed activations between the monitor's wake-ups
+        controller.finish_until(limit)
+        if transition is None or transition >= end:
+            break
+        clock.set(transition)
 
-                # If schedule is already running, just update tracking
-                elif schedule_id not in active_schedules:
-                    active_schedules[schedule_id] = target_schedule
+    clock.set(end)
+    return recorder.result(start, end)
 
-            else:
-                # No schedule should be active - check if we need to stop anything
-                schedules_to_remove = []
-
-                for schedule_id, schedule in active_schedules.items():
-                    # This schedule is no longer in its time window
-                    if (
-                        gpio_controller.active_schedule == schedule["formula"]
-                        and not gpio_controller.user_override
-                    ):
-                        gpio_controller.deactivate_all()
-                        app.logger.info(
-                            f"Ended scheduled formula: {schedule['formula']} ({schedule['start_time']}-{schedule['end_time']})"
-                        )
-                    schedules_to_remove.append(schedule_id)
 
-                # Clean up inactive schedules
-                for schedule_id in schedules_to_remove:
-                    del active_schedules[schedule_id]
+def schedule_monitor():
+    """Background thread that starts and stops scheduled formulas of every zone at their transition instants"""
+    for zone in list(zones.values()):
+        adopt_running_schedule(zone)
 
-                last_active_schedule = None
+    while True:
+        evaluation_started = time.perf_counter()
+        for zone in list(zones.values()):
+            try:
+                evaluate_zone_schedules(zone)
+            except Exception as e:
+                app.logger.error(f"Error in schedule monitor for zone {zone.id}: {e}")
+        transition_timer.record_evaluation(time.perf_counter() - evaluation_started)
 
+        # Sleep until the next start/end instant of any zone, or until schedules are edited
+        while True:
+            try:
+                next_transition = next_zone_transition(datetime.now())
+            except Exception as e:
+                app.logger.error(f"Error computing next schedule transition: {e}")
+                next_transition = None
+            if transition_timer.wait_until(next_transition):
+                break
+
+
+def start_leader():
+    """Take over the GPIO and the schedule monitor in this process
+
+    Runs at startup in the leader (or the only) process, and in a follower
+    that wins the election after the leader exited.
+    """
+    global gpio_backend, timing_engine, schedule_thread, state_checkpoint, activation_history
+
+    # One GPIO backend and one timing thread drive the pins of every zone
+    gpio_backend = create_gpio_backend(app.config["GPIO_BACKEND"])
+    timing_engine = TimingEngine(gpio_backend)
+    activation_history = ActivationHistory(app.config["ACTIVATION_HISTORY"], app.config["USAGE_TOTALS"])
+    activation_history.load()
+    timing_engine.add_edge_listener(activation_history.edge)
+    for zone in list(zones.values()):
+        controller = SimpleGPIOController(gpio_backend, engine=timing_engine)
+        controller.set_pin_mapping(zone.formulas)
+        zone.controller = controller
+        watch_zone_controller(zone)
+        activation_history.watch(zone.id, controller)
+    activation_history.start()
+
+    # Resume what the previous process (or leader) was running, in the same cycle phase
+    state_checkpoint = StateCheckpoint(app.config["STATE_CHECKPOINT"])
+    saved = state_checkpoint.load()
+    restored = set()
+    for zone in list(zones.values()):
+        try:
+            if zone.id in saved and zone.controller.restore(saved[zone.id]):
+                restored.add(zone.id)
         except Exception as e:
-            app.logger.error(f"Error in schedule monitor: {e}")
+            app.logger.error(f"Error restoring zone {zone.id} from the checkpoint: {e}")
+        state_checkpoint.watch(zone.id, zone.controller)
+    state_checkpoint.start()
+
+    # Run the other workers' hardware commands
+    if leader_lock is not None:
+        LeaderServer(
+            leader_lock, zones, queries={"timing_stats": timing_stats, "usage": usage_totals}
+        ).start()
+
+    # Check for active schedules at startup (restored zones are picked up by the monitor)
+    for zone in list(zones.values()):
+        if zone.id in restored:
+            continue
+        try:
+            app.logger.info(f"Checking for active schedules in zone {zone.id} at startup...")
+            startup_refresh = refresh_current_schedule(zone)
+            app.logger.info(f"Startup schedule check result: {startup_refresh.get('status', 'unknown')}")
+            if startup_refresh.get('status') == 'schedule_started':
+                formula = startup_refresh.get('formula', 'unknown')
+                remaining = startup_refresh.get('remaining_time', 0) / 60
+                app.logger.info(f"Started scheduled {formula} formula at startup ({remaining:.1f} min remaining)")
+        except Exception as e:
+            app.logger.error(f"Error checking schedules in zone {zone.id} at startup: {e}")
+
+    # Start schedule monitor thread
+    schedule_thread = threading.Thread(target=schedule_monitor, daemon=True)
+    schedule_thread.start()
+
+
+def start_follower():
+    """Serve requests in this worker and run the hardware commands in the leader"""
+    global leader_client
+
+    leader_client = LeaderClient(leader_lock, zones, on_elected=start_leader)
+    for zone in list(zones.values()):
+        zone.controller = RemoteController(leader_client, zone.id)
+        watch_zone_controller(zone)
+        # The leader re-reads the schedules so its monitor sees the change at once
+        zone.store.add_listener(lambda zone=zone: leader_client.schedules_changed(zone.id))
+    leader_client.start()
 
-        # Wait for the next minute boundary
-        wait_for_next_minute()
 
+def create_app():
+    """Load the configuration and zones and start the scheduler; returns the Flask app
+
+    Each serving process calls this once, before handling requests (python
+    app.py does, and WSGI servers load "app:create_app()"); later calls
+    return the same app. In multi-worker mode only the worker elected
+    through the lock file starts the GPIO and the scheduler.
+    """
+    global schedule_store, leader_lock, consumables, quiz_stats, asset_pipeline
+
+    if zones:
+        return app
+    storage = app.config["SCHEDULE_STORAGE"]
+    shared = app.config["MULTIPROCESS"]
+
+    # Load configurations
+    pin_mapping = load_pin_mapping()
+
+    # Additional zones from zones.json share the GPIO backend, timing engine and scheduler
+    try:
+        zone_config = load_zone_config()
+        check_pin_conflicts(
+            {
+                DEFAULT_ZONE: pin_mapping["formulas"],
+                **{zone_id: config["formulas"] for zone_id, config in zone_config.items()},
+            }
+        )
+    except (OSError, ValueError) as e:
+        app.logger.error(f"Error loading zones.json, running the default zone only: {e}")
+        zone_config = {}
+
+    zones[DEFAULT_ZONE] = create_zone(DEFAULT_ZONE, "Default", pin_mapping["formulas"], storage, shared)
+    for zone_id, config in zone_config.items():
+        zones[zone_id] = create_zone(zone_id, config["name"], config["formulas"], storage, shared)
+    for zone in zones.values():
+        watch_zone_schedules(zone)
+    schedule_store = zones[DEFAULT_ZONE].store
+    consumables = Consumables(app.config["CONSUMABLES"], shared)
+    quiz_stats = QuizStats(
+        SCENT_INFO, app.config["QUIZ_LOG"], app.config["QUIZ_COUNTERS"], shared=shared
+    )
+    if app.config["ASSET_PIPELINE"]:
+        pipeline = AssetPipeline(app.static_folder)
+        pipeline.build()
+        asset_pipeline = pipeline
+
+    if not shared:
+        start_leader()
+        return app
 
-# Check for active schedule at startup
-try:
-    app.logger.info("Checking for active schedules at startup...")
-    startup_refresh = refresh_current_schedule()
-    app.logger.info(f"Startup schedule check result: {startup_refresh.get('status', 'unknown')}")
-    if startup_refresh.get('status') == 'schedule_started':
-        formula = startup_refresh.get('formula', 'unknown')
-        remaining = startup_refresh.get('remaining_time', 0) / 60
-        app.logger.info(f"Started scheduled {formula} formula at startup ({remaining:.1f} min remaining)")
-except Exception as e:
-    app.logger.error(f"Error checking schedules at startup: {e}")
+    leader_lock = LeaderLock(app.config["LEADER_LOCK"])
+    if leader_lock.try_acquire():
+        app.logger.info(f"Worker process {os.getpid()} is the leader")
+        start_leader()
+    else:
+        start_follower()
+    return app
 
-# Start schedule monitor thread
-schedule_thread = threading.Thread(target=schedule_monitor, daemon=True)
-schedule_thread.start()
 
 if __name__ == "__main__":
+    # Development server. With debug on, this module also runs in a reloader process that
+    # only watches the source files; the hardware and scheduler start in the serving child
+    if is_running_from_reloader():
+        create_app()
     try:
         app.run(host="0.0.0.0", port=5010, debug=True)
     finally:
-        gpio_controller.cleanup()
+        # Keep the checkpoint of the running state, so a restart resumes it
+        if state_checkpoint is not None:
+            state_checkpoint.freeze()
+        for zone in zones.values():
+            zone.controller.cleanup()
+        if activation_history is not None:
+            activation_history.close()
@@ -0,0 +1,274 @@
+import gzip
+import hashlib
+import logging
+import os
+import re
+
+try:
+    import brotli  # Optional: pip install brotli adds br-encoded variants
+except ImportError:
+    brotli = None
+
+# Bundles served from /assets/, by name: the static files concatenated into each, in order.
+# The shared styles and script are one bundle every page loads (and caches) once
+BUNDLES = {
+    "common.css": ["css/base.css", "css/responsive.css"],
+    "selection.css": ["css/selection.css"],
+    "schedule.css": ["css/schedule.css"],
+    "quiz.css": ["css/quiz.css"],
+    "information.css": ["css/information.css"],
+    "common.js": ["js/app.js"],
+    "selection.js": ["js/selection.js"],
+    "schedule.js": ["js/schedule.js"],
+    "quiz.js": ["js/quiz.js"],
+    "information.js": ["js/information.js"],
+}
+
+CONTENT_TYPES = {
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+}
+
+# Strings are kept as they are, comments dropped, everything else minified
+_CSS_STRING = r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'"
+_CSS_STRINGS = re.compile(f"({_CSS_STRING})")
+_CSS_COMMENTS = re.compile(rf"{_CSS_STRING}|/\*.*?\*/", re.S)
+
+
+def minify_css(text):
+    """Drop comments and the whitespace CSS does not need"""
+    text = _CSS_COMMENTS.sub(lambda m: "" if m.group().startswith("/*") else m.group(), text)
+    parts = []
+    for index, token in enumerate(_CSS_STRINGS.split(text)):
+        if index % 2:
+            parts.append(token)
+            continue
+        token = re.sub(r"\s+", " ", token)
+        token = re.sub(r"\s*([{};,>])\s*", r"\1", token)
+        token = re.sub(r":\s+", ":", token)
+        parts.append(token.replace(";}", "}"))
+    return "".join(parts).strip()
+
+
+# A "/" after one of these starts a regular expression literal, elsewhere it divides
+_REGEX_AFTER_PUNCTUATORS = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_AFTER_KEYWORDS = {
+    "return", "typeof", "instanceof", "in", "of", "new", "delete", "void",
+    "throw", "case", "do", "else", "yield", "await",
+}
+
+
+def _end_of_string(text, i, quote):
+    """Index just past the string literal opening at text[i]"""
+    j = i + 1
+    while j < len(text):
+        c = text[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == quote:
+            return j + 1
+        if c == "\n":
+            break
+        j += 1
+    raise ValueError(f"Unterminated string literal at offset {i}")
+
+
+def _end_of_template_chunk(text, i):
+    """Scan template literal text from text[i]: (index past it, whether it stopped at "${")"""
+    j = i
+    while j < len(text):
+        c = text[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "`":
+            return j + 1, False
+        if text.startswith("${", j):
+            return j + 2, True
+        j += 1
+    raise ValueError(f"Unterminated template literal at offset {i}")
+
+
+def _end_of_regex(text, i):
+    """Index just past the body of the regular expression literal opening at text[i]"""
+    j = i + 1
+    in_class = False
+    while j < len(text):
+        c = text[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "\n":
+            break
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            return j + 1
+        j += 1
+    raise ValueError(f"Unterminated regular expression at offset {i}")
+
+
+def minify_js(text):
+    """Drop comments, indentation and blank lines
+
+    A tokenizer that knows strings, template literals (with nested ${}
+    expressions), regular expression literals and comments; every other
+    character is kept as it is. A run of whitespace becomes one space, or
+    one newline if it spans lines, so automatic semicolon insertion is
+    unaffected. Raises ValueError for an unterminated literal or comment.
+    """
+    out = []
+    pending = ""  # Whitespace owed before the next token: "", " " or "\n"
+    last = ""  # Last token of code: a punctuator or a word ("" at the start)
+    braces = []  # Open braces inside each enclosing template literal's ${}
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c.isspace() or text.startswith("/*", i):
+            # Whitespace and block comments both separate tokens
+            if c.isspace():
+                j = i + 1
+                while j < len(text) and text[j].isspace():
+                    j += 1
+            else:
+                j = text.find("*/", i + 2)
+                if j < 0:
+                    raise ValueError(f"Unterminated comment at offset {i}")
+                j += 2
+            if "\n" in text[i:j]:
+                pending = "\n"
+            elif not pending:
+                pending = " "
+            i = j
+            continue
+        if text.startswith("//", i):
+            j = text.find("\n", i)
+            i = len(text) if j < 0 else j
+            continue
+
+        if c in "'\"":
+            j = _end_of_string(text, i, c)
+            token = text[i:j]
+            last = ")"  # Literals end an operand, like a closing parenthesis
+        elif c == "`" or (c == "}" and braces and braces[-1] == 0):
+            if c == "}":
+                braces.pop()
+            j, opened = _end_of_template_chunk(text, i + 1)
+            token = text[i:j]
+            if opened:
+                braces.append(0)
+                last = "{"
+            else:
+                last = ")"
+        elif c == "/" and (last == "" or last in _REGEX_AFTER_PUNCTUATORS or last in _REGEX_AFTER_KEYWORDS):
+            j = _end_of_regex(text, i)
+            token = text[i:j]
+            last = ")"
+        elif c.isalnum() or c in "_$":
+            j = i + 1
+            while j < len(text) and (text[j].isalnum() or text[j] in "_$"):
+                j += 1
+            token = last = text[i:j]
+        elif text.startswith(("++", "--"), i):
+            # Never followed by a regex, unlike a single "+" or "-"
+            j = i + 2
+            token = text[i:j]
+            last = ")"
+        else:
+            j = i + 1
+            token = last = c
+            if braces and c == "{":
+                braces[-1] += 1
+            elif braces and c == "}":
+                braces[-1] -= 1
+
+        if pending and out:
+            out.append(pending)
+        pending = ""
+        out.append(token)
+        i = j
+    if braces:
+        raise ValueError("Unterminated template literal")
+    return "".join(out)
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+class EncodedContent:
+    """A response body compressed once up front: identity, gzip and (with brotli) br
+
+    etag identifies the content; the encodings that do not make it smaller
+    are left out.
+    """
+
+    def __init__(self, body, content_type):
+        self.content_type = content_type
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {"identity": body}
+        # mtime=0: the same content always compresses to the same bytes
+        compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(body)
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.variants[encoding] = data
+
+    def negotiate(self, accept_encodings):
+        """The (encoding, body) to send for an Accept-Encoding header (a werkzeug Accept)"""
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and accept_encodings[encoding]:
+                return encoding, self.variants[encoding]
+        return "identity", self.variants["identity"]
+
+
+class AssetPipeline:
+    """Builds the BUNDLES at startup: concatenated, minified, content-hashed and precompressed
+
+    Each bundle is served as <name>.<hash>.<ext>; the hash changes with the
+    content, so browsers may cache the files forever. Nothing is written
+    to disk: every process builds the same bundles in memory.
+    """
+
+    def __init__(self, static_folder, bundles=BUNDLES):
+        self.static_folder = static_folder
+        self.bundles = bundles
+        self.logger = logging.getLogger(__name__)
+        self.filenames = {}  # bundle name -> hashed file name
+        self.assets = {}  # hashed file name -> EncodedContent
+
+    def build(self):
+        source_bytes = 0
+        sent_bytes = 0
+        for name, sources in self.bundles.items():
+            stem, ext = os.path.splitext(name)
+            texts = []
+            for source in sources:
+                with open(os.path.join(self.static_folder, source), "r", encoding="utf-8") as f:
+                    texts.append(f.read())
+            source_bytes += sum(len(t.encode()) for t in texts)
+            minified = []
+            for source, text in zip(sources, texts):
+                try:
+                    minified.append(MINIFIERS[ext](text))
+                except ValueError as e:
+                    self.logger.warning(f"Serving {source} unminified: {e}")
+                    minified.append(text)
+            # Scripts are joined with a semicolon in case one lacks its last one
+            joined = (";\n" if ext == ".js" else "\n").join(minified)
+            content = EncodedContent(joined.encode(), CONTENT_TYPES[ext])
+            filename = f"{stem}.{content.etag[:10]}{ext}"
+            self.filenames[name] = filename
+            self.assets[filename] = content
+            sent_bytes += min(len(body) for body in content.variants.values())
+        self.logger.info(
+            f"Built {len(self.assets)} asset bundles: {source_bytes // 1024} KB of sources, "
+            f"{sent_bytes // 1024} KB compressed"
+        )
+
+    def get(self, filename):
+        """The EncodedContent served as filename, or None"""
+        return self.assets.get(filename)
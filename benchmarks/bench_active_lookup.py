@@ -0,0 +1,44 @@
+"""Micro-benchmark: active-schedule lookup, linear scan vs minute-of-week index
+
+Run from the repository root:
+
+    python benchmarks/bench_active_lookup.py
+"""
+import time
+from datetime import datetime
+
+from common import generate_schedules, import_app, measure
+from schedule_index import ActiveScheduleIndex
+from schedule_model import compile_schedules
+
+SIZES = [10, 1000, 100000]
+
+
+def main():
+    find_active_schedule_for_time = import_app().find_active_schedule_for_time
+
+    print(f"{'schedules':>10} {'linear':>12} {'index':>12} {'build':>12} {'speedup':>10}")
+    for size in SIZES:
+        data = generate_schedules(size)
+
+        started = time.perf_counter()
+        index = ActiveScheduleIndex(compile_schedules(data))
+        build = time.perf_counter() - started
+
+        now = datetime.now()
+        current_time = now.strftime("%H:%M")
+        linear_result = find_active_schedule_for_time(data, current_time)
+        index_result = index.active_at(now)
+        if linear_result is not (index_result.data if index_result else None):
+            raise SystemExit(f"Index disagrees with linear scan at {size} schedules")
+
+        linear = measure(lambda: find_active_schedule_for_time(data, current_time))
+        indexed = measure(lambda: index.active_at(now))
+        print(
+            f"{size:>10} {linear * 1e6:>10.1f}us {indexed * 1e6:>10.2f}us "
+            f"{build * 1e3:>10.1f}ms {linear / indexed:>9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark: raw schedule dicts vs the compiled Schedule model
+
+Reports, per schedule count, the RSS each representation adds (measured in a
+fresh subprocess so earlier allocations do not hide it) and the time to
+evaluate every schedule at one moment with the string-based helpers versus
+the pre-parsed Schedule objects.
+
+Run from the repository root:
+
+    python benchmarks/bench_schedule_model.py
+"""
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from common import generate_schedules, import_app, measure
+
+SIZES = [1000, 100000]
+
+
+def rss_bytes():
+    """Current resident set size of this process (Linux), falling back to the peak"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure_rss(size):
+    """Child process: print the RSS added by each representation as JSON"""
+    from schedule_index import ActiveScheduleIndex, OverlapIndex
+    from schedule_model import compile_schedules
+
+    # Round-trip through JSON so the dicts look like schedules loaded from disk
+    payload = json.dumps(generate_schedules(size))
+    gc.collect()
+    results = {}
+
+    before = rss_bytes()
+    data = json.loads(payload)
+    del payload
+    gc.collect()
+    results["dicts"] = rss_bytes() - before
+
+    before = rss_bytes()
+    compiled = compile_schedules(data)
+    gc.collect()
+    results["compiled"] = rss_bytes() - before
+
+    before = rss_bytes()
+    indexes = (ActiveScheduleIndex(compiled), OverlapIndex(compiled))
+    gc.collect()
+    results["indexes"] = rss_bytes() - before
+
+    print(json.dumps(results))
+    return indexes
+
+
+def run_child(size):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--rss", str(size)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    app = import_app()
+    is_time_in_range = app.is_time_in_range
+    should_activate_schedule = app.should_activate_schedule
+    from schedule_model import compile_schedules
+
+    print(
+        f"{'schedules':>10} {'dicts RSS':>10} {'model RSS':>10} {'index RSS':>10}"
+        f" {'compile':>10} {'eval dicts':>11} {'eval model':>11} {'speedup':>8}"
+    )
+    for size in SIZES:
+        rss = run_child(size)
+        data = generate_schedules(size)
+        schedules = data["schedules"]
+
+        started = time.perf_counter()
+        compiled = compile_schedules(data)
+        compile_time = time.perf_counter() - started
+
+        now = datetime.now()
+        current_time = now.strftime("%H:%M")
+
+        def evaluate_dicts():
+            return [
+                s
+                for s in schedules
+                if s.get("enabled")
+                and should_activate_schedule(s)
+                and is_time_in_range(current_time, s["start_time"], s["end_time"])
+            ]
+
+        def evaluate_model():
+            return [s.data for s in compiled if s.active_at(now)]
+
+        if evaluate_dicts() != evaluate_model():
+            raise SystemExit(f"Schedule model disagrees with the dict helpers at {size} schedules")
+
+        budget = 2.0 if size >= 100000 else 0.5
+        dicts = measure(evaluate_dicts, budget)
+        model = measure(evaluate_model, budget)
+        print(
+            f"{size:>10} {rss['dicts'] / 2**20:>8.1f}MB {rss['compiled'] / 2**20:>8.1f}MB"
+            f" {rss['indexes'] / 2**20:>8.1f}MB {compile_time * 1e3:>8.1f}ms"
+            f" {dicts * 1e3:>9.1f}ms {model * 1e3:>9.2f}ms {dicts / model:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--rss":
+        measure_rss(int(sys.argv[2]))
+    else:
+        main()
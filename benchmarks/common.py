@@ -0,0 +1,102 @@
+"""Shared helpers for the benchmarks: synthetic schedules and timing loops"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+RECURRENCES = [
+    "daily", "weekdays", "weekends", "monday", "tuesday", "wednesday",
+    "thursday", "friday", "saturday", "sunday", "once",
+]
+FORMULAS = ["red", "blue", "yellow", "green"]
+
+
+def generate_schedules(count, seed=42):
+    """Build a synthetic schedules.json payload with count entries"""
+    rng = random.Random(seed)
+    today = date.today()
+    schedules = []
+    for schedule_id in range(1, count + 1):
+        start = rng.randrange(24 * 60)
+        end = (start + rng.randrange(15, 240)) % (24 * 60)
+        schedule = {
+            "id": schedule_id,
+            "start_time": f"{start // 60:02d}:{start % 60:02d}",
+            "end_time": f"{end // 60:02d}:{end % 60:02d}",
+            "formula": rng.choice(FORMULAS),
+            "cycle_time": 60,
+            "duration": 10,
+            "recurrence": rng.choice(RECURRENCES),
+            "enabled": rng.random() < 0.9,
+        }
+        if schedule["recurrence"] == "once":
+            schedule["schedule_date"] = (today + timedelta(days=rng.randrange(-3, 30))).isoformat()
+        schedules.append(schedule)
+    return {"schedules": schedules}
+
+
+def write_schedules_file(path, count, seed=42):
+    """Atomically replace path with a synthetic schedules file of count entries"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(generate_schedules(count, seed), f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def measure(func, budget=0.5):
+    """Return mean seconds per call, repeating until the time budget is used"""
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= budget:
+            return elapsed / calls
+
+
+def summarize(samples_ns):
+    """Summary statistics (microseconds) of a list of per-call timings in nanoseconds"""
+    ordered = sorted(samples_ns)
+    count = len(ordered)
+
+    def percentile(fraction):
+        return ordered[min(count - 1, int(fraction * count))] / 1000
+
+    return {
+        "calls": count,
+        "mean_us": round(sum(ordered) / count / 1000, 3),
+        "min_us": round(ordered[0] / 1000, 3),
+        "p50_us": round(percentile(0.50), 3),
+        "p95_us": round(percentile(0.95), 3),
+        "p99_us": round(percentile(0.99), 3),
+        "max_us": round(ordered[-1] / 1000, 3),
+    }
+
+
+def sample(func, budget=0.5, max_calls=100000):
+    """Time func call by call until the budget is used; return summarize() of the timings"""
+    samples = []
+    deadline = time.perf_counter() + budget
+    while not samples or (time.perf_counter() < deadline and len(samples) < max_calls):
+        started = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - started)
+    return summarize(samples)
+
+
+def import_app():
+    """Import and set up app.py in a scratch directory (it creates its config files in the working directory)"""
+    os.chdir(tempfile.mkdtemp(prefix="scent-bench-"))
+    import app
+
+    app.create_app()
+    return app
@@ -0,0 +1,250 @@
+"""Benchmark suite for the scheduling and controller hot paths
+
+Generates synthetic schedules.json files (10 to 100k schedules by default),
+loads each into the schedule store and times:
+
+- find_active_schedule_for_time (linear reference) and the indexed lookup
+- find_overlapping_schedules (linear reference) and the overlap index
+- validate_schedule_data
+- GET /api/schedule-status, both a full response and a 304 revalidation
+- SimpleGPIOController.activate_formula switching between formulas on the
+  RecordingBackend: the call itself and the delay until the new pin goes
+  HIGH, taken from the recorded edge timestamps
+
+Results are written as JSON so runs from different versions can be compared:
+
+    python benchmarks/run_suite.py --output before.json
+    python benchmarks/run_suite.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from common import ROOT, import_app, sample, summarize, write_schedules_file
+
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+
+NEW_SCHEDULE = {
+    "start_time": "12:00",
+    "end_time": "13:30",
+    "formula": "blue",
+    "cycle_time": 60,
+    "duration": 10,
+    "recurrence": "weekdays",
+    "enabled": True,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_schedules(app, path, size, budget):
+    """Time the lookups and the status endpoint against one schedules file"""
+    with open(path) as f:
+        data = json.load(f)
+    app.schedule_store.save(data)
+    schedules = app.schedule_store.load()
+    client = app.app.test_client()
+    results = []
+
+    def record(name, stats, **extra):
+        results.append({"benchmark": name, "schedules": size, **stats, **extra})
+
+    current_time = datetime.now().strftime("%H:%M")
+    record(
+        "find_active_schedule_for_time",
+        sample(lambda: app.find_active_schedule_for_time(schedules, current_time), budget),
+    )
+
+    # The first lookup after a change builds the index; report it separately
+    started = time.perf_counter_ns()
+    app.find_active_schedule(datetime.now())
+    build = time.perf_counter_ns() - started
+    record(
+        "find_active_schedule",
+        sample(lambda: app.find_active_schedule(datetime.now()), budget),
+        first_call_us=round(build / 1000, 3),
+    )
+
+    existing = schedules["schedules"]
+    record(
+        "find_overlapping_schedules",
+        sample(lambda: app.find_overlapping_schedules(NEW_SCHEDULE, existing), budget),
+    )
+    started = time.perf_counter_ns()
+    app.get_overlap_index()
+    build = time.perf_counter_ns() - started
+    record(
+        "overlap_index",
+        sample(lambda: app.get_overlap_index().overlapping(NEW_SCHEDULE), budget),
+        first_call_us=round(build / 1000, 3),
+    )
+
+    response = client.get("/api/schedule-status")
+    if response.status_code != 200:
+        raise SystemExit(f"/api/schedule-status returned {response.status_code} at {size} schedules")
+    record("schedule_status", sample(lambda: client.get("/api/schedule-status"), budget))
+
+    # Only the conditional request is timed
+    samples = []
+    deadline = time.perf_counter() + budget
+    while not samples or time.perf_counter() < deadline:
+        etag = client.get("/api/schedule-status").headers["ETag"]
+        started = time.perf_counter_ns()
+        client.get("/api/schedule-status", headers={"If-None-Match": etag})
+        samples.append(time.perf_counter_ns() - started)
+    record("schedule_status_304", summarize(samples))
+    return results
+
+
+def bench_validate(app, budget):
+    # validate_schedule_data normalizes its argument in place, so hand it a copy
+    payload = dict(NEW_SCHEDULE, start_time="9:00")
+    zone = app.get_zone()
+    return [
+        {
+            "benchmark": "validate_schedule_data",
+            "schedules": None,
+            **sample(lambda: app.validate_schedule_data(dict(payload), zone), budget),
+        }
+    ]
+
+
+def bench_switch(budget):
+    """Switch between two formulas: time the call and the delay to the new pin's first edge"""
+    from gpio_backends import RecordingBackend
+    from gpio_controller import SimpleGPIOController
+
+    gpio = RecordingBackend()
+    controller = SimpleGPIOController(gpio)
+    controller.set_pin_mapping({"red": 17, "blue": 27})
+
+    calls = []
+    switches = []  # (call start, pin that should go HIGH)
+    deadline = time.perf_counter() + budget
+    colors = ("red", "blue")
+    # Each switch records two edges; stop before the ring buffer wraps
+    while not calls or (time.perf_counter() < deadline and len(calls) < gpio.capacity // 4):
+        color = colors[len(calls) % 2]
+        pin = controller.pin_mapping[color]
+        started = time.monotonic_ns()
+        controller.activate_formula(color, cycle_time=60, duration=10)
+        calls.append(time.monotonic_ns() - started)
+        switches.append((started, pin))
+
+        # The engine thread drives the pin; wait for it before switching again
+        wait_until = time.monotonic() + 1
+        while gpio.level(pin) != gpio.HIGH:
+            if time.monotonic() > wait_until:
+                raise SystemExit(f"Pin for {color} never went HIGH")
+            time.sleep(0.0001)
+    controller.cleanup()
+
+    # The recorded edge timestamps give the delay from each call to its pin's rise
+    rises = iter((t, pin) for t, pin, level in gpio.edges() if level == gpio.HIGH)
+    edges = []
+    for started, pin in switches:
+        for rise, rise_pin in rises:
+            if rise_pin == pin and rise >= started:
+                edges.append(rise - started)
+                break
+    return [
+        {"benchmark": "activate_formula", "schedules": None, **summarize(calls)},
+        {"benchmark": "activate_formula_first_edge", "schedules": None, **summarize(edges)},
+    ]
+
+
+def compare(baseline, results):
+    """Print mean-time ratios against an earlier run (above 1.0 means slower now)"""
+    def key(result):
+        return result["benchmark"], result["schedules"]
+
+    before = {key(result): result for result in baseline["results"]}
+    print(f"{'benchmark':<30} {'schedules':>9} {'before':>12} {'after':>12} {'ratio':>7}", file=sys.stderr)
+    for result in results:
+        old = before.get(key(result))
+        if not old:
+            continue
+        ratio = result["mean_us"] / old["mean_us"] if old["mean_us"] else float("inf")
+        size = result["schedules"] if result["schedules"] is not None else "-"
+        print(
+            f"{result['benchmark']:<30} {size:>9} {old['mean_us']:>10.1f}us"
+            f" {result['mean_us']:>10.1f}us {ratio:>6.2f}x",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(map(str, DEFAULT_SIZES)),
+        help="comma-separated schedule counts (default: %(default)s)",
+    )
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds per benchmark (default: %(default)s)")
+    parser.add_argument("--data-dir", help="where to write the synthetic schedules files (default: a temp dir)")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    data_dir = os.path.abspath(args.data_dir or tempfile.mkdtemp(prefix="scent-bench-data-"))
+    os.makedirs(data_dir, exist_ok=True)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    # Time the code paths, not the terminal: per-activation INFO logging would dominate
+    logging.disable(logging.INFO)
+    app = import_app()
+
+    results = []
+    for size in sizes:
+        path = write_schedules_file(os.path.join(data_dir, f"schedules-{size}.json"), size)
+        print(f"{size} schedules ({path})", file=sys.stderr)
+        results.extend(bench_schedules(app, path, size, args.budget))
+    results.extend(bench_validate(app, args.budget))
+    results.extend(bench_switch(args.budget))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "storage": app.app.config["SCHEDULE_STORAGE"],
+            "sizes": sizes,
+            "budget_s": args.budget,
+            "data_dir": data_dir,
+        },
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
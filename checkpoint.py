@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+import threading
+
+# Checkpoints of another layout are ignored rather than misread
+CHECKPOINT_FORMAT = 1
+
+
+class StateCheckpoint:
+    """Keeps a small file with every zone's controller state for restart recovery
+
+    Controllers mark the checkpoint dirty from their state listener (on
+    every transition); a writer thread then saves the state of all watched
+    controllers with an atomic rename. The saved state only changes on
+    transitions (the cycle phase is kept as its start time), so writes are
+    rare, and a write whose content equals the file is skipped. On boot,
+    load() returns what SimpleGPIOController.restore() takes per zone.
+    """
+
+    def __init__(self, path="controller_state.json"):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self._controllers = {}  # zone id -> controller
+        self._dirty = threading.Event()
+        self._frozen = False
+        self._last = None  # Bytes of the last write
+
+        self.writes = 0
+        self.skipped_writes = 0
+        self.write_errors = 0
+
+    def load(self):
+        """Return the saved state by zone id ({} when missing or unreadable)"""
+        try:
+            with open(self.path, "rb") as f:
+                self._last = f.read()
+            data = json.loads(self._last)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Ignoring unreadable controller checkpoint {self.path}: {e}")
+            return {}
+        if not isinstance(data, dict) or data.get("format") != CHECKPOINT_FORMAT:
+            self.logger.warning(f"Ignoring controller checkpoint {self.path} of another format")
+            return {}
+        return data.get("zones", {})
+
+    def watch(self, zone_id, controller):
+        """Save controller's state under zone_id, rewriting the file whenever it changes"""
+        self._controllers[zone_id] = controller
+        controller.add_listener(self._dirty.set)
+
+    def start(self):
+        """Start the writer thread; it saves the current state once right away"""
+        self._dirty.set()
+        threading.Thread(target=self._run, name="state-checkpoint", daemon=True).start()
+
+    def freeze(self):
+        """Stop writing, so the file keeps the state from before a shutdown's cleanup"""
+        self._frozen = True
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            if self._frozen:
+                return
+            try:
+                self.save()
+            except Exception as e:
+                self.write_errors += 1
+                self.logger.error(f"Error writing controller checkpoint: {e}")
+
+    def save(self):
+        """Write the state of every watched controller if it differs from the file"""
+        data = {
+            "format": CHECKPOINT_FORMAT,
+            "zones": {
+                zone_id: controller.checkpoint_state()
+                for zone_id, controller in list(self._controllers.items())
+            },
+        }
+        content = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+        if content == self._last:
+            self.skipped_writes += 1
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._last = content
+        self.writes += 1
+
+    def collect_metrics(self, out):
+        """Add the checkpoint write counters to a metrics.Exposition"""
+        out.counter("state_checkpoint_writes_total", "Controller state checkpoints written.", self.writes)
+        out.counter(
+            "state_checkpoint_skipped_writes_total",
+            "Controller state changes that left the checkpoint unchanged.",
+            self.skipped_writes,
+        )
+        out.counter(
+            "state_checkpoint_write_errors_total",
+            "Controller state checkpoints that could not be written.",
+            self.write_errors,
+        )
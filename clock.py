@@ -0,0 +1,24 @@
+from datetime import datetime
+
+
+class SystemClock:
+    """The wall clock (local time) the scheduler reads through zone.clock"""
+
+    def now(self):
+        return datetime.now()
+
+
+class VirtualClock:
+    """A clock that only moves when set, for replaying the scheduler (see schedule_simulator)"""
+
+    def __init__(self, moment):
+        self.moment = moment
+
+    def now(self):
+        return self.moment
+
+    def set(self, moment):
+        self.moment = moment
+
+
+SYSTEM_CLOCK = SystemClock()
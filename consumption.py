@@ -0,0 +1,217 @@
+import json
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+
+from schedule_store import FileRLock
+
+# Cartridge defaults until consumables.json says otherwise
+DEFAULT_CAPACITY_ML = 100.0
+DEFAULT_FLOW_ML_PER_SECOND = 0.02
+
+# Forecasts further out than this report no empty date
+FORECAST_WEEKS = 5 * 52
+
+
+def occurrence_on_seconds(window_seconds, cycle_time, duration):
+    """Pin on-time of one scheduled run: the timing engine's whole cycles over the window"""
+    period = cycle_time if cycle_time > duration else duration + 1
+    return math.ceil(window_seconds / period) * duration
+
+
+class ConsumptionProfile:
+    """Scheduled pin on-time per formula, built once per schedules version
+
+    Recurring schedules become occurrences in a repeating week: (second of
+    the week the run starts, run length, on-time), with a weekly total per
+    formula. One-time schedules with a date are kept as dated occurrences.
+    A forecast then skips whole weeks by their totals and only walks the
+    occurrences of the week the cartridge runs out in.
+    """
+
+    def __init__(self, schedules):
+        self.weekly = {}  # formula -> [(week second, length, on-time)], by week second
+        self.weekly_total = {}  # formula -> on-time per week
+        self.dated = {}  # formula -> [(start datetime, length, on-time)], by start
+
+        for schedule in schedules:
+            data = schedule.data
+            if (
+                not schedule.enabled
+                or (schedule.once and schedule.executed)
+                or schedule.start is None
+                or schedule.end is None
+                or schedule.start == schedule.end
+            ):
+                continue
+            formula = data.get("formula")
+            length = schedule.duration_seconds()
+            on_time = occurrence_on_seconds(length, data.get("cycle_time", 60), data.get("duration", 10))
+            if schedule.once:
+                if schedule.date > 0:
+                    start = datetime.fromordinal(schedule.date) + timedelta(minutes=schedule.start)
+                    self.dated.setdefault(formula, []).append((start, length, on_time))
+                continue
+            for day in range(7):
+                if schedule.days >> day & 1:
+                    self.weekly.setdefault(formula, []).append(
+                        ((day * 24 * 60 + schedule.start) * 60, length, on_time)
+                    )
+                    self.weekly_total[formula] = self.weekly_total.get(formula, 0) + on_time
+        for occurrences in list(self.weekly.values()) + list(self.dated.values()):
+            occurrences.sort()
+
+    def per_week(self, formula):
+        """Scheduled on-time of formula in a regular week (seconds)"""
+        return self.weekly_total.get(formula, 0)
+
+    def _week(self, formula, week_start):
+        """Occurrences of formula in the week from week_start (a Monday midnight), by start"""
+        week_end = week_start + timedelta(weeks=1)
+        occurrences = [
+            (week_start + timedelta(seconds=offset), length, on_time)
+            for offset, length, on_time in self.weekly.get(formula, ())
+        ]
+        dated = [o for o in self.dated.get(formula, ()) if week_start <= o[0] < week_end]
+        return sorted(occurrences + dated) if dated else occurrences
+
+    def runs_out_at(self, formula, now, budget):
+        """When the scheduled runs will have used budget seconds of on-time from now, or None
+
+        None means not within FORECAST_WEEKS (or never, without schedules).
+        Within a run the on-time is taken as spread evenly over its length.
+        """
+        if budget <= 0:
+            return now
+        midnight = datetime.combine(now.date(), datetime.min.time())
+        week_start = midnight - timedelta(days=now.weekday())
+        last_dated = max((o[0] for o in self.dated.get(formula, ())), default=None)
+        horizon = now + timedelta(weeks=FORECAST_WEEKS)
+
+        while week_start < horizon:
+            first_week = week_start <= now
+            # Skip a whole week by its total when nothing in it needs a closer look
+            if not first_week and (last_dated is None or last_dated < week_start):
+                total = self.per_week(formula)
+                if total == 0:
+                    return None
+                if budget > total:
+                    weeks = min(int((budget - 1e-9) // total), FORECAST_WEEKS)
+                    budget -= weeks * total
+                    week_start += timedelta(weeks=weeks)
+                    continue
+            for start, length, on_time in self._week(formula, week_start):
+                end = start + timedelta(seconds=length)
+                if end <= now:
+                    continue
+                if start < now:
+                    # Already running: only the rest of the run counts
+                    fraction = (end - now).total_seconds() / length
+                    on_time *= fraction
+                    length *= fraction
+                    start = now
+                if on_time >= budget:
+                    return start + timedelta(seconds=length * budget / on_time)
+                budget -= on_time
+            week_start += timedelta(weeks=1)
+        return None
+
+
+class Consumables:
+    """Cartridge settings and refill baselines, kept in consumables.json
+
+    A cartridge's use is the pin on-time since it was refilled times its
+    flow rate; the on-time comes from the usage totals (history.py), so
+    this file only changes when a cartridge is refilled or reconfigured:
+
+        {"zones": {"<zone>": {"<formula>": {"capacity_ml": 100,
+          "flow_ml_per_second": 0.02, "refilled_on_seconds": 0, "refilled_at": null}}}}
+
+    The file is re-read when another process changed it; with shared=True
+    updates hold a FileRLock on <path>.lock, as the schedule stores do.
+    """
+
+    def __init__(self, path="consumables.json", shared=False):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self.lock = FileRLock(f"{path}.lock") if shared else threading.RLock()
+        self._data = {"zones": {}}
+        self._signature = None
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            data.setdefault("zones", {})
+            self._data = data
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Error loading {self.path}: {e}")
+        self._signature = signature
+
+    def cartridge(self, zone_id, formula):
+        """Settings of one cartridge, with the defaults filled in"""
+        with self.lock:
+            self._refresh()
+            saved = self._data["zones"].get(zone_id, {}).get(formula, {})
+        return {
+            "capacity_ml": saved.get("capacity_ml", DEFAULT_CAPACITY_ML),
+            "flow_ml_per_second": saved.get("flow_ml_per_second", DEFAULT_FLOW_ML_PER_SECOND),
+            "refilled_on_seconds": saved.get("refilled_on_seconds", 0.0),
+            "refilled_at": saved.get("refilled_at"),
+        }
+
+    def update(self, zone_id, formula, changes):
+        """Save changed settings of one cartridge (atomically) and return them"""
+        with self.lock:
+            self._refresh()
+            cartridge = dict(self._data["zones"].get(zone_id, {}).get(formula, {}), **changes)
+            data = dict(self._data)
+            data["zones"] = dict(data["zones"])
+            data["zones"][zone_id] = dict(data["zones"].get(zone_id, {}), **{formula: cartridge})
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._data = data
+            stat = os.stat(self.path)
+            self._signature = (stat.st_mtime_ns, stat.st_size)
+        return self.cartridge(zone_id, formula)
+
+    def status(self, zone_id, formula, on_seconds, profile, now):
+        """Use, remaining volume and depletion forecast of one cartridge
+
+        on_seconds is the formula's total pin on-time (from the usage totals)
+        and profile the ConsumptionProfile of the zone's schedules.
+        """
+        cartridge = self.cartridge(zone_id, formula)
+        flow = cartridge["flow_ml_per_second"]
+        capacity = cartridge["capacity_ml"]
+        used_seconds = max(on_seconds - cartridge["refilled_on_seconds"], 0.0)
+        used = used_seconds * flow
+        remaining = max(capacity - used, 0.0)
+        empty_at = profile.runs_out_at(formula, now, remaining / flow) if flow > 0 else None
+        return {
+            "capacity_ml": capacity,
+            "flow_ml_per_second": flow,
+            "refilled_at": cartridge["refilled_at"],
+            "on_seconds_since_refill": round(used_seconds, 3),
+            "used_ml": round(used, 3),
+            "remaining_ml": round(remaining, 3),
+            "remaining_percent": round(remaining / capacity * 100, 1) if capacity > 0 else 0.0,
+            "scheduled_ml_per_week": round(profile.per_week(formula) * flow, 3),
+            "empty_at": empty_at.isoformat(timespec="seconds") if empty_at else None,
+            "days_left": (
+                round((empty_at - now).total_seconds() / 86400, 1) if empty_at else None
+            ),
+        }
@@ -0,0 +1,92 @@
+import json
+import logging
+import threading
+from collections import deque
+
+
+class _Subscriber:
+    """Pending messages of one connected client"""
+
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.overflowed = False
+        self.condition = threading.Condition()
+
+    def put(self, message):
+        with self.condition:
+            if len(self.pending) >= self.max_pending:
+                # Too far behind: disconnect so the browser reconnects and resyncs
+                self.overflowed = True
+            else:
+                self.pending.append(message)
+            self.condition.notify()
+
+    def get(self, timeout):
+        """Next message, None after timeout seconds of silence"""
+        with self.condition:
+            if not self.pending and not self.overflowed:
+                self.condition.wait(timeout)
+            if self.overflowed:
+                raise OverflowError("subscriber fell behind")
+            return self.pending.popleft() if self.pending else None
+
+
+class EventBroadcaster:
+    """Fans state-change events out to Server-Sent Events clients
+
+    publish() never blocks the caller: each client has a small queue of
+    pending messages, and a client that falls behind is disconnected so
+    that EventSource reconnects and receives a fresh snapshot. Idle clients
+    only cost a keep-alive comment every keepalive seconds, which is also
+    how disconnected clients are noticed.
+    """
+
+    def __init__(self, max_pending=32, keepalive=15):
+        self.max_pending = max_pending
+        self.keepalive = keepalive
+        self.logger = logging.getLogger(__name__)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def format(event, data):
+        """Encode one event in the text/event-stream format"""
+        return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+    def publish(self, event, data):
+        """Send event to every connected client"""
+        message = self.format(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+    def client_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stream(self, initial_events=None):
+        """Yield the event stream of one client until it disconnects
+
+        initial_events() is called once the client is subscribed and returns
+        (event, data) pairs describing the current state, so nothing published
+        in between is lost.
+        """
+        subscriber = _Subscriber(self.max_pending)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            # Ask EventSource to reconnect after 3 seconds if the stream drops
+            yield "retry: 3000\n\n"
+            if initial_events:
+                for event, data in initial_events():
+                    yield self.format(event, data)
+            while True:
+                message = subscriber.get(self.keepalive)
+                yield message if message is not None else ": keep-alive\n\n"
+        except OverflowError:
+            self.logger.warning("Event stream client fell behind; closing it to resync")
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
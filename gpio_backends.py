@@ -0,0 +1,197 @@
+import threading
+import time
+from array import array
+
+# Try to import RPi.GPIO, fall back to mock for development
+try:
+    import RPi.GPIO as _RPI_GPIO
+    GPIO_AVAILABLE = True
+except ImportError:
+    _RPI_GPIO = None
+    GPIO_AVAILABLE = False
+    # Using mock GPIO for development (silent mode)
+
+
+class GPIOBackend:
+    """The subset of the RPi.GPIO API the controller uses
+
+    Backends are handed to SimpleGPIOController and its timing engine; the
+    engine calls output() from its own thread, so implementations must be
+    thread-safe. hardware tells the status endpoint whether real pins move.
+    """
+
+    BCM = "BCM"
+    OUT = "OUT"
+    HIGH = 1
+    LOW = 0
+
+    hardware = False
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, mode):
+        pass
+
+    def output(self, pin, state):
+        pass
+
+    def cleanup(self):
+        pass
+
+
+class MockGPIO(GPIOBackend):
+    """Mock GPIO for development environment (silently drops every call)"""
+
+
+class RPiGPIOBackend(GPIOBackend):
+    """Real pins through the RPi.GPIO module"""
+
+    hardware = True
+
+    def __init__(self):
+        if _RPI_GPIO is None:
+            raise RuntimeError("RPi.GPIO is not installed")
+        self.gpio = _RPI_GPIO
+        self.BCM = _RPI_GPIO.BCM
+        self.OUT = _RPI_GPIO.OUT
+        self.HIGH = _RPI_GPIO.HIGH
+        self.LOW = _RPI_GPIO.LOW
+
+    def setmode(self, mode):
+        self.gpio.setmode(mode)
+
+    def setup(self, pin, mode):
+        self.gpio.setup(pin, mode)
+
+    def output(self, pin, state):
+        self.gpio.output(pin, state)
+
+    def cleanup(self):
+        self.gpio.cleanup()
+
+
+class RecordingBackend(GPIOBackend):
+    """Simulated pins that record every edge with time.monotonic_ns()
+
+    Edges (level changes; repeated writes of the same level are not edges)
+    are stored in preallocated arrays used as a ring buffer, so recording
+    never allocates and the newest capacity edges are kept. Use it to check
+    edge timing, duty cycles and switch latency without Pi hardware.
+    """
+
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self._times = array("q", bytes(8 * capacity))
+        self._pins = array("i", bytes(4 * capacity))
+        self._levels = array("b", bytes(capacity))
+        self._count = 0  # Edges recorded so far, including overwritten ones
+        self._lock = threading.Lock()
+        self.modes = {}
+        self.levels = {}  # pin -> current level (pins start LOW)
+
+    def setup(self, pin, mode):
+        with self._lock:
+            self.modes[pin] = mode
+
+    def output(self, pin, state):
+        now = time.monotonic_ns()
+        level = self.HIGH if state else self.LOW
+        with self._lock:
+            if self.levels.get(pin, self.LOW) == level:
+                return
+            self.levels[pin] = level
+            slot = self._count % self.capacity
+            self._times[slot] = now
+            self._pins[slot] = pin
+            self._levels[slot] = level
+            self._count += 1
+
+    def level(self, pin):
+        """Current level of pin"""
+        return self.levels.get(pin, self.LOW)
+
+    @property
+    def dropped(self):
+        """Edges overwritten because the ring buffer wrapped"""
+        return max(0, self._count - self.capacity)
+
+    def clear(self):
+        with self._lock:
+            self._count = 0
+
+    def edges(self, pin=None):
+        """Recorded (monotonic_ns, pin, level) edges, oldest first"""
+        # Copy the arrays (a memcpy) so output() is not held up while the tuples are built
+        with self._lock:
+            count = self._count
+            times, pins, levels = self._times[:], self._pins[:], self._levels[:]
+        start = max(0, count - self.capacity)
+        slots = [i % self.capacity for i in range(start, count)]
+        records = [(times[i], pins[i], levels[i]) for i in slots]
+        if pin is not None:
+            records = [record for record in records if record[1] == pin]
+        return records
+
+    def pulses(self, pin, edges=None):
+        """(rise_ns, fall_ns) of every recorded HIGH pulse of pin; fall_ns is None while HIGH"""
+        if edges is None:
+            edges = self.edges(pin)
+        pulses = []
+        rise = None
+        for timestamp, edge_pin, level in edges:
+            if edge_pin != pin:
+                continue
+            if level == self.HIGH:
+                rise = timestamp
+            elif rise is not None:
+                pulses.append((rise, timestamp))
+                rise = None
+        if rise is not None:
+            pulses.append((rise, None))
+        return pulses
+
+    def duty_cycle(self, pin, start_ns, end_ns):
+        """Fraction of [start_ns, end_ns) that pin spent HIGH"""
+        if end_ns <= start_ns:
+            return 0.0
+        high = 0
+        for rise, fall in self.pulses(pin):
+            fall = end_ns if fall is None else fall
+            high += max(0, min(fall, end_ns) - max(rise, start_ns))
+        return high / (end_ns - start_ns)
+
+    def timeline(self):
+        """JSON-friendly export: every edge and the HIGH pulses per pin, in ns from the first edge"""
+        edges = self.edges()
+        origin = edges[0][0] if edges else 0
+        pins = {}
+        for pin in sorted({record[1] for record in edges}):
+            pins[str(pin)] = [
+                [rise - origin, None if fall is None else fall - origin]
+                for rise, fall in self.pulses(pin, edges)
+            ]
+        return {
+            "origin_monotonic_ns": origin,
+            "dropped": self.dropped,
+            "edges": [[timestamp - origin, pin, level] for timestamp, pin, level in edges],
+            "pulses": pins,
+        }
+
+
+GPIO_BACKENDS = {
+    "rpi": RPiGPIOBackend,
+    "mock": MockGPIO,
+    "recording": RecordingBackend,
+}
+
+
+def create_gpio_backend(name="auto"):
+    """Create the GPIO backend by name; "auto" uses RPi.GPIO when it is installed"""
+    if name == "auto":
+        name = "rpi" if GPIO_AVAILABLE else "mock"
+    if name not in GPIO_BACKENDS:
+        raise ValueError(
+            f"Unknown GPIO backend '{name}'. Must be one of: auto, {', '.join(GPIO_BACKENDS)}"
+        )
+    return GPIO_BACKENDS[name]()
@@ -1,48 +1,32 @@
-import threading
 import time
 import logging
 
-# Try to import RPi.GPIO, fall back to mock for development
-try:
-    import RPi.GPIO as GPIO
-    GPIO_AVAILABLE = True
-except ImportError:
-    GPIO_AVAILABLE = False
-    # Using mock GPIO for development (silent mode)
-
-class MockGPIO:
-    """Mock GPIO for development environment"""
-    BCM = "BCM"
-    OUT = "OUT"
-    HIGH = 1
-    LOW = 0
-    
-    @staticmethod
-    def setmode(mode):
-        pass
-    
-    @staticmethod
-    def setup(pin, mode):
-        pass  # Removed debug print
-    
-    @staticmethod
-    def output(pin, state):
-        pass  # Removed debug print - GPIO operations are silent now
-    
-    @staticmethod
-    def cleanup():
-        pass  # Removed debug print
+from gpio_backends import create_gpio_backend
+from metrics import TimedLock
+from timing_engine import TimingEngine
 
 class SimpleGPIOController:
     """Simplified GPIO controller for scent dispensers"""
     
-    def __init__(self):
-        self.gpio = GPIO if GPIO_AVAILABLE else MockGPIO()
+    def __init__(self, gpio=None, engine=None):
+        # Any gpio_backends.GPIOBackend; RPi.GPIO when installed, otherwise MockGPIO
+        self.gpio = gpio if gpio is not None else create_gpio_backend()
         self.pin_mapping = {}
         self.active_formula = None
-        self.active_thread = None
-        self.stop_event = threading.Event()
-        self.lock = threading.Lock()
+        # Accounts the time activations, deactivations and status changes wait for each other
+        self.lock = TimedLock()
+        
+        # One timing thread drives the on/off edges of every pin; controllers of
+        # several zones can share it (they must drive disjoint pins)
+        self.engine = engine if engine is not None else TimingEngine(self.gpio)
+        self._activation = 0
+        self._run_for = None  # activation_duration of the running scheduled activation
+        
+        # Bumped on every state change (activate, deactivate, override); callbacks run after it
+        self.version = 0
+        self._listeners = []
+        # Immutable status snapshot, replaced (never modified) on every state change
+        self._status = None
         
         # Schedule management
         self.active_schedule = None
@@ -55,42 +39,77 @@ class SimpleGPIOController:
         self.current_duration = None
         
         # Setup GPIO mode
-        if GPIO_AVAILABLE:
-            self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setmode(self.gpio.BCM)
         
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
+        self._publish_status()
     
-    def set_pin_mapping(self, mapping):
-        """Set GPIO pin mapping for formulas"""
-        self.pin_mapping = mapping
-        
-        # Setup all pins as output
-        for color, pin in mapping.items():
+    def add_listener(self, callback):
+        """Register callback() to run whenever the controller state changes (keep it cheap)"""
+        self._listeners.append(callback)
+    
+    def _publish_status(self):
+        """Swap in a new status snapshot (call with the lock held, after changing state)"""
+        self._status = {
+            'active': bool(self.active_formula),  # Add active flag
+            'active_formula': self.active_formula,
+            'active_schedule': self.active_schedule,
+            'is_scheduled': bool(self.active_schedule and not self.user_override),  # Add is_scheduled flag
+            'user_override': self.user_override,
+            'schedule_end_time': self.schedule_end_time,
+            'pin_mapping': dict(self.pin_mapping),
+            'gpio_available': self.gpio.hardware,
+            # Cycle timing for frontend synchronization
+            'cycle_start_time': self.cycle_start_time,
+            'current_cycle_time': self.current_cycle_time,
+            'current_duration': self.current_duration
+        }
+    
+    def _notify(self):
+        # Snapshot before version: a reader seeing the new version also sees the new status
+        self._publish_status()
+        self.version += 1
+        for listener in self._listeners:
             try:
-                self.gpio.setup(pin, self.gpio.OUT)
-                self.gpio.output(pin, self.gpio.LOW)
-                self.logger.info(f"Initialized pin {pin} for {color} formula")
+                listener()
             except Exception as e:
-                self.logger.error(f"Error setting up pin {pin} for {color}: {e}")
+                self.logger.error(f"Error in controller state listener: {e}")
+    
+    def set_pin_mapping(self, mapping):
+        """Set GPIO pin mapping for formulas"""
+        with self.lock:
+            self.pin_mapping = mapping
+            
+            # Setup all pins as output
+            for color, pin in mapping.items():
+                try:
+                    self.gpio.setup(pin, self.gpio.OUT)
+                    self.gpio.output(pin, self.gpio.LOW)
+                    self.logger.info(f"Initialized pin {pin} for {color} formula")
+                except Exception as e:
+                    self.logger.error(f"Error setting up pin {pin} for {color}: {e}")
+            self._notify()
     
     def activate_formula(self, color, cycle_time=60, duration=10, is_scheduled=False, activation_duration=None):
         """Activate single formula with timing parameters"""
         try:
-            # Deactivate any currently active formula (preserve user override if this is a manual activation)
-            self._deactivate_all_internal(clear_user_override=is_scheduled)
-            
             with self.lock:
+                # Deactivate any currently active formula (preserve user override if this is a manual activation);
+                # under the same lock, so readers see the old or the new formula, never the gap
+                self._deactivate_all_internal(clear_user_override=is_scheduled)
+                
                 if color not in self.pin_mapping:
                     self.logger.error(f"Unknown formula color: {color}")
+                    self._notify()  # The previous formula was still deactivated
                     return False
                 
                 pin = self.pin_mapping[color]
                 self.active_formula = color
                 
                 # Track cycle timing for frontend synchronization
-                # Note: cycle_start_time will be set in the thread right before GPIO fires
-                self.cycle_start_time = None  # Will be set when cycle actually starts
+                # Note: cycle_start_time is set when the engine is handed the cycle below
+                self.cycle_start_time = None
                 self.current_cycle_time = cycle_time
                 self.current_duration = duration
                 
@@ -114,91 +133,108 @@ class SimpleGPIOController:
                     else:
                         self.logger.info(f"User manual activation: {color}")
                 
-                # Stop any existing thread
-                self.stop_event.set()
-                if self.active_thread and self.active_thread.is_alive():
-                    self.active_thread.join(timeout=0.1)  # Reduced timeout for faster response
-                
-                # Start new activation thread
-                self.stop_event.clear()
-                self.active_thread = threading.Thread(
-                    target=self._activation_cycle,
-                    args=(pin, cycle_time, duration, color, is_scheduled, activation_duration)
-                )
-                self.active_thread.daemon = True
-                self.active_thread.start()
+                # Hand the cycle to the timing engine; every edge is timed from its anchor,
+                # so this is the anchor point for all cycle calculations
+                self._run_for = activation_duration if is_scheduled else None
+                anchor = self._start_cycle(pin, color, cycle_time, duration)
+                # Wall-clock time of the anchor for the frontend progress circle
+                self.cycle_start_time = time.time() - (time.monotonic() - anchor)
+                self.logger.info(f"Cycle timing initialized at {self.cycle_start_time} for {color}")
                 
                 self.logger.info(f"Activated {color} formula on pin {pin} (cycle: {cycle_time}s, duration: {duration}s)")
+                self._notify()
                 return True
                 
         except Exception as e:
             self.logger.error(f"Error activating formula {color}: {e}")
             return False
     
-    def _activation_cycle(self, pin, cycle_time, duration, color, is_scheduled=False, activation_duration=None):
-        """Run the activation cycle in a separate thread"""
-        try:
-            # Set cycle_start_time once at the very beginning, right before the first GPIO fires
-            # This is the anchor point for all cycle calculations
-            with self.lock:
-                self.cycle_start_time = time.time()
-            self.logger.info(f"Cycle timing initialized at {self.cycle_start_time} for {color}")
-            
-            start_time = self.cycle_start_time
-            
-            while not self.stop_event.is_set():
-                # Check if scheduled activation should end (only for scheduled activations with duration)
-                if is_scheduled and activation_duration is not None and not self.user_override:
-                    if time.time() - start_time >= activation_duration:
-                        self.logger.info(f"Scheduled activation of {color} completed after {activation_duration}s")
-                        break
-                
-                # Activate pin (aligned with cycle_start_time)
-                self.gpio.output(pin, self.gpio.HIGH)
-                self.logger.debug(f"Pin {pin} ({color}) activated")
-                
-                # Wait for duration
-                if self.stop_event.wait(duration):
-                    break
-                
-                # Deactivate pin
-                self.gpio.output(pin, self.gpio.LOW)
-                self.logger.debug(f"Pin {pin} ({color}) deactivated")
-                
-                # Wait for rest of cycle
-                remaining_time = cycle_time - duration
-                if remaining_time > 0:
-                    if self.stop_event.wait(remaining_time):
-                        break
-                else:
-                    # If duration >= cycle_time, just wait a bit
-                    if self.stop_event.wait(1):
-                        break
-                        
-        except Exception as e:
-            self.logger.error(f"Error in activation cycle for {color}: {e}")
-        finally:
-            # Ensure pin is off when thread ends
-            try:
-                self.gpio.output(pin, self.gpio.LOW)
-            except:
-                pass
+    def _start_cycle(self, pin, color, cycle_time, duration, anchor=None):
+        """Start the engine cycling pin for the current activation; returns its anchor"""
+        self._activation += 1
+        activation = self._activation
+        return self.engine.start(
+            pin,
+            cycle_time,
+            duration,
+            run_for=self._run_for,
+            may_finish=lambda: not self.user_override,
+            on_finish=lambda: self._scheduled_activation_finished(activation, color),
+            anchor=anchor,
+        )
+    
+    def checkpoint_state(self):
+        """Compact state for checkpoint.StateCheckpoint (restore() takes it back)"""
+        with self.lock:
+            return {
+                'active_formula': self.active_formula,
+                'active_schedule': self.active_schedule,
+                'user_override': self.user_override,
+                'cycle_start_time': self.cycle_start_time,
+                'cycle_time': self.current_cycle_time,
+                'duration': self.current_duration,
+                'run_for': self._run_for,
+                'schedule_end_time': self.schedule_end_time,
+            }
+    
+    def restore(self, state):
+        """Resume the activation of a checkpoint_state() saved before a restart
+        
+        The cycle keeps its phase: the engine continues at the next cycle
+        boundary counted from the saved cycle start. Returns True if an
+        activation was resumed, False if there was none or it has ended in
+        the meantime (a scheduled activation past its run time).
+        """
+        with self.lock:
+            color = state.get('active_formula')
+            started = state.get('cycle_start_time')
+            cycle_time = state.get('cycle_time')
+            duration = state.get('duration')
+            run_for = state.get('run_for')
+            if color not in self.pin_mapping or None in (started, cycle_time, duration):
+                return False
+            elapsed = max(time.time() - started, 0)
+            if run_for is not None and elapsed >= run_for:
+                self.logger.info(f"Checkpointed activation of {color} ended while stopped")
+                return False
             
-            # Clear schedule state if this was a scheduled activation that completed naturally
-            if is_scheduled and not self.user_override:
-                with self.lock:
-                    self.active_formula = None
-                    self.active_schedule = None
-                    self.schedule_end_time = None
-                    self.logger.info(f"Scheduled activation of {color} fully completed and cleared")
+            self._deactivate_all_internal()
+            self.active_formula = color
+            self.active_schedule = state.get('active_schedule')
+            self.schedule_end_time = state.get('schedule_end_time')
+            self.user_override = bool(state.get('user_override'))
+            self.current_cycle_time = cycle_time
+            self.current_duration = duration
+            self._run_for = run_for
+            self._start_cycle(
+                self.pin_mapping[color], color, cycle_time, duration, anchor=time.monotonic() - elapsed
+            )
+            self.cycle_start_time = started
+            self.logger.info(f"Restored {color} formula from checkpoint ({elapsed:.0f}s into its run)")
+            self._notify()
+            return True
+    
+    def _scheduled_activation_finished(self, activation, color):
+        """Clear schedule state once the engine ends a scheduled activation naturally"""
+        with self.lock:
+            # Ignore activations that were already replaced or stopped
+            if activation != self._activation:
+                return
+            self.active_formula = None
+            self.active_schedule = None
+            self.schedule_end_time = None
+            self._run_for = None
+            self.logger.info(f"Scheduled activation of {color} fully completed and cleared")
+            self._notify()
     
     def _deactivate_all_internal(self, clear_user_override=True):
         """Internal deactivate method without locking (for use within locked contexts)"""
         try:
-            # Stop activation thread
-            self.stop_event.set()
-            if self.active_thread and self.active_thread.is_alive():
-                self.active_thread.join(timeout=0.1)  # Reduced timeout for faster response
+            # Stop the cycle; pending edges of this activation become stale. Only
+            # this controller's pins: the engine may be driving other zones too
+            self._activation += 1
+            for pin in self.pin_mapping.values():
+                self.engine.stop(pin)
             
             # Turn off all pins
             for color, pin in self.pin_mapping.items():
@@ -215,6 +251,7 @@ class SimpleGPIOController:
                 self.user_override = False
             
             # Clear cycle timing
+            self._run_for = None
             self.cycle_start_time = None
             self.current_cycle_time = None
             self.current_duration = None
@@ -228,12 +265,14 @@ class SimpleGPIOController:
         """Deactivate all GPIO pins"""
         with self.lock:
             self._deactivate_all_internal()
+            self._notify()
     
     def clear_user_override(self):
         """Clear user override flag to allow schedules to resume"""
         with self.lock:
             self.user_override = False
             self.logger.info("User override cleared - schedules can resume")
+            self._notify()
     
     def force_schedule_transition(self, new_formula, cycle_time, duration, activation_duration):
         """Force a transition to a new scheduled formula, clearing any user override"""
@@ -253,28 +292,43 @@ class SimpleGPIOController:
             )
     
     def get_status(self):
-        """Get current activation status"""
-        return {
-            'active': bool(self.active_formula),  # Add active flag
-            'active_formula': self.active_formula,
-            'active_schedule': self.active_schedule,
-            'is_scheduled': bool(self.active_schedule and not self.user_override),  # Add is_scheduled flag
-            'user_override': self.user_override,
-            'schedule_end_time': self.schedule_end_time,
-            'pin_mapping': self.pin_mapping,
-            'gpio_available': GPIO_AVAILABLE,
-            # Cycle timing for frontend synchronization
-            'cycle_start_time': self.cycle_start_time,
-            'current_cycle_time': self.current_cycle_time,
-            'current_duration': self.current_duration
-        }
+        """Get current activation status
+        
+        Returns the snapshot published by the last state change without taking
+        the lock: it is consistent (never a mix of two states) and shared
+        between callers, so treat it as read-only.
+        """
+        return self._status
     
+    def collect_metrics(self, out, labels=None):
+        """Add the controller lock metrics to a metrics.Exposition (GPIO edges come from the engine)"""
+        labels = labels or {}
+        out.counter(
+            "controller_lock_acquisitions_total",
+            "Acquisitions of the controller lock.",
+            [(labels, self.lock.acquisitions)],
+        )
+        out.counter(
+            "controller_lock_contended_total",
+            "Acquisitions of the controller lock that had to wait.",
+            [(labels, self.lock.contended)],
+        )
+        out.counter(
+            "controller_lock_wait_seconds_total",
+            "Time spent waiting for the controller lock.",
+            [(labels, self.lock.wait_seconds)],
+        )
+        out.histogram(
+            "controller_lock_wait_seconds",
+            "Wait time of the contended controller lock acquisitions.",
+            [(labels, self.lock.waits)],
+        )
+
     def cleanup(self):
         """Clean up GPIO resources"""
         try:
             self.deactivate_all()
-            if GPIO_AVAILABLE:
-                self.gpio.cleanup()
+            self.gpio.cleanup()
             self.logger.info("GPIO cleanup completed")
         except Exception as e:
             self.logger.error(f"Error during GPIO cleanup: {e}")
\ No newline at end of file
@@ -0,0 +1,304 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Usage buckets kept per zone: hourly for a week, daily for a year
+HOURS_KEPT = 7 * 24
+DAYS_KEPT = 366
+
+# Totals are saved at most this often (seconds), and on close()
+SAVE_INTERVAL = 60
+
+
+def rotate_log(path, backups):
+    """Shift path to path.1, path.1 to path.2 ... dropping the oldest beyond backups"""
+    for index in range(backups - 1, 0, -1):
+        source = f"{path}.{index}"
+        if os.path.exists(source):
+            os.replace(source, f"{path}.{index + 1}")
+    os.replace(path, f"{path}.1")
+
+
+def _hour_key(moment):
+    return moment.strftime("%Y-%m-%dT%H")
+
+
+def _day_key(moment):
+    return moment.strftime("%Y-%m-%d")
+
+
+class ActivationHistory:
+    """Rotating on-disk log of activation sessions and pin edges, with running usage totals
+
+    Every log line is a compact JSON array led by the wall-clock time in
+    milliseconds and a record type:
+
+        [ms, "start", zone, formula, scheduled, cycle_time, duration]
+        [ms, "stop", zone, formula]
+        [ms, "edge", zone, formula, pin, level]
+
+    The log rotates to <path>.1 ... <path>.<backups> past max_bytes. The
+    callers (controller listeners and the timing engine's edge hook) only
+    put records on a queue; a writer thread appends them to the log and adds
+    every HIGH pulse to the per-formula, per-hour and per-day on-time totals.
+    Those totals are saved to totals_path (atomically, at most every
+    SAVE_INTERVAL seconds) and loaded on start, so usage() answers from
+    them without reading the log.
+    """
+
+    def __init__(self, path="activation_history.log", totals_path="usage_totals.json",
+                 max_bytes=1024 * 1024, backups=5):
+        self.path = path
+        self.totals_path = totals_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.logger = logging.getLogger(__name__)
+
+        self._queue = queue.SimpleQueue()
+        self._pins = {}  # pin -> (zone id, formula)
+        self._sessions = {}  # zone id -> formula of the running session
+        self._rises = {}  # pin -> wall time it went HIGH
+        self._file = None
+        self._size = 0
+        self._thread = None
+
+        # zone id -> {"formulas": {formula: {...}}, "hours": {hour: {formula: s}}, "days": {...}}
+        self._totals = {}
+        self._lock = threading.Lock()  # Guards _totals between the writer and usage()
+        self._dirty = False
+        self._saved_at = 0.0
+
+        self.records = 0
+        self.rotations = 0
+        self.write_errors = 0
+
+    def load(self):
+        """Read the saved usage totals (keeps empty totals when missing or unreadable)"""
+        try:
+            with open(self.totals_path, "r") as f:
+                totals = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Ignoring unreadable usage totals {self.totals_path}: {e}")
+            return
+        with self._lock:
+            self._totals = totals if isinstance(totals, dict) else {}
+
+    def watch(self, zone_id, controller):
+        """Log the controller's activation sessions and attribute its pins' edges to zone_id"""
+        for formula, pin in controller.pin_mapping.items():
+            self._pins[pin] = (zone_id, formula)
+        status = controller.get_status()
+        self._sessions[zone_id] = status["active_formula"]
+
+        def changed():
+            # Pins can be remapped through the API
+            for formula, pin in controller.pin_mapping.items():
+                self._pins[pin] = (zone_id, formula)
+            status = controller.get_status()
+            formula = status["active_formula"]
+            if formula == self._sessions.get(zone_id):
+                return
+            if self._sessions.get(zone_id) is not None:
+                self._queue.put((time.time(), "stop", zone_id, self._sessions[zone_id]))
+            if formula is not None:
+                self._queue.put(
+                    (
+                        time.time(),
+                        "start",
+                        zone_id,
+                        formula,
+                        status["is_scheduled"],
+                        status["current_cycle_time"],
+                        status["current_duration"],
+                    )
+                )
+            self._sessions[zone_id] = formula
+
+        controller.add_listener(changed)
+
+    def edge(self, pin, level, monotonic_time):
+        """TimingEngine edge listener: queue a level change of pin (cheap, runs under the engine lock)"""
+        self._queue.put((monotonic_time, "edge", pin, level))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="activation-history", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Write out the queued records and save the totals"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=SAVE_INTERVAL)
+            except queue.Empty:
+                item = ()
+            # Drain what else is queued, so a burst costs one flush
+            items = [item]
+            while item is not None:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+
+            try:
+                self._write([i for i in items if i])
+                if self._dirty and (None in items or time.time() - self._saved_at >= SAVE_INTERVAL):
+                    self._save_totals()
+            except Exception as e:
+                self.write_errors += 1
+                self.logger.error(f"Error writing activation history: {e}")
+            if None in items:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _write(self, items):
+        if not items:
+            return
+        lines = []
+        # Edges carry monotonic times (the engine's clock); log wall-clock times
+        offset = time.time() - time.monotonic()
+        for item in items:
+            if item[1] == "edge":
+                _, _, pin, level = item
+                zone_id, formula = self._pins.get(pin, (None, None))
+                moment = item[0] + offset
+                self._account(pin, zone_id, formula, level, moment)
+                record = [round(moment * 1000), "edge", zone_id, formula, pin, level]
+            else:
+                record = [round(item[0] * 1000), *item[1:]]
+                if record[1] == "start":
+                    self._count_session(record[2], record[3])
+            lines.append(json.dumps(record, separators=(",", ":")))
+        self._append("\n".join(lines) + "\n")
+        self.records += len(lines)
+
+    def _append(self, text):
+        data = text.encode()
+        if self._file is None:
+            self._file = open(self.path, "ab")
+            self._size = self._file.tell()
+        if self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def _rotate(self):
+        self._file.close()
+        rotate_log(self.path, self.backups)
+        self._file = open(self.path, "ab")
+        self._size = 0
+        self.rotations += 1
+
+    def _zone_totals(self, zone_id):
+        totals = self._totals.get(zone_id)
+        if totals is None:
+            totals = self._totals[zone_id] = {"formulas": {}, "hours": {}, "days": {}}
+        return totals
+
+    def _formula_totals(self, zone_id, formula):
+        formulas = self._zone_totals(zone_id)["formulas"]
+        totals = formulas.get(formula)
+        if totals is None:
+            totals = formulas[formula] = {"on_seconds": 0.0, "pulses": 0, "activations": 0}
+        return totals
+
+    def _count_session(self, zone_id, formula):
+        with self._lock:
+            self._formula_totals(zone_id, formula)["activations"] += 1
+            self._dirty = True
+
+    def _account(self, pin, zone_id, formula, level, moment):
+        """Add a finished HIGH pulse of pin to the totals"""
+        if level:
+            self._rises[pin] = moment
+            return
+        rise = self._rises.pop(pin, None)
+        if rise is None or zone_id is None:
+            return
+        with self._lock:
+            totals = self._formula_totals(zone_id, formula)
+            totals["on_seconds"] += moment - rise
+            totals["pulses"] += 1
+            zone = self._zone_totals(zone_id)
+            # Split the pulse at hour boundaries (an hour bucket lies within one day)
+            start = datetime.fromtimestamp(rise)
+            end = datetime.fromtimestamp(moment)
+            while start < end:
+                boundary = start.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+                piece_end = min(boundary, end)
+                seconds = (piece_end - start).total_seconds()
+                for buckets, key, kept in (
+                    (zone["hours"], _hour_key(start), HOURS_KEPT),
+                    (zone["days"], _day_key(start), DAYS_KEPT),
+                ):
+                    bucket = buckets.get(key)
+                    if bucket is None:
+                        bucket = buckets[key] = {}
+                        # Keys sort chronologically; drop the oldest past the limit
+                        for old in sorted(buckets)[:-kept]:
+                            del buckets[old]
+                    bucket[formula] = bucket.get(formula, 0.0) + seconds
+                start = piece_end
+            self._dirty = True
+
+    def _save_totals(self):
+        with self._lock:
+            content = json.dumps(self._totals, separators=(",", ":"))
+            self._dirty = False
+        tmp_path = f"{self.totals_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.totals_path)
+        self._saved_at = time.time()
+
+    def usage(self):
+        """On-time totals by zone: per formula (seconds, pulses, activations), per hour and per day"""
+        with self._lock:
+            return {
+                zone_id: {
+                    "formulas": {
+                        formula: {
+                            "on_seconds": round(totals["on_seconds"], 3),
+                            "pulses": totals["pulses"],
+                            "activations": totals["activations"],
+                        }
+                        for formula, totals in zone["formulas"].items()
+                    },
+                    "hours": {
+                        hour: {formula: round(s, 3) for formula, s in bucket.items()}
+                        for hour, bucket in zone["hours"].items()
+                    },
+                    "days": {
+                        day: {formula: round(s, 3) for formula, s in bucket.items()}
+                        for day, bucket in zone["days"].items()
+                    },
+                }
+                for zone_id, zone in self._totals.items()
+            }
+
+    def collect_metrics(self, out):
+        """Add the history log counters to a metrics.Exposition"""
+        out.counter("activation_history_records_total", "Records appended to the activation history.", self.records)
+        out.counter("activation_history_rotations_total", "Rotations of the activation history log.", self.rotations)
+        out.counter(
+            "activation_history_write_errors_total",
+            "Failed writes of the activation history or usage totals.",
+            self.write_errors,
+        )
@@ -0,0 +1,421 @@
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): only single-process mode is available
+    fcntl = None
+
+
+class LeaderLock:
+    """Elects the one worker process that owns the GPIO and the schedule monitor
+
+    The leader holds an exclusive flock on the lock file for as long as it
+    runs and writes the address and key of its command socket into it. The
+    kernel drops the lock when the process exits, however it exits, so a
+    follower calling try_acquire() again takes over.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.address = os.path.splitext(self.path)[0] + ".sock"
+        self.authkey = None
+        self._fd = None
+
+    @property
+    def is_leader(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        """Become the leader unless another process is; returns True in the leader"""
+        if fcntl is None:
+            raise RuntimeError("Multi-worker mode needs fcntl.flock (Linux or macOS)")
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        # Followers read where to connect; the key keeps other local users off the socket
+        self.authkey = secrets.token_bytes(32)
+        info = {"pid": os.getpid(), "address": self.address, "authkey": self.authkey.hex()}
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, json.dumps(info).encode(), 0)
+        os.fsync(fd)
+        self._fd = fd
+        return True
+
+    def leader_info(self):
+        """(address, authkey) the current leader published, or None while there is none"""
+        try:
+            with open(self.path, "r") as f:
+                info = json.load(f)
+            return info["address"], bytes.fromhex(info["authkey"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+class _Outbox:
+    """Messages waiting to be sent on one connection, only the latest one per key
+
+    put() never blocks, and a slow reader only ever has one pending state
+    per zone, so it cannot hold up or bloat the sending process.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.condition = threading.Condition()
+
+    def put(self, key, message):
+        with self.condition:
+            self.pending.pop(key, None)
+            self.pending[key] = message
+            self.condition.notify()
+
+    def get(self):
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            key = next(iter(self.pending))
+            return self.pending.pop(key)
+
+
+class LeaderServer:
+    """Command socket of the leader: runs the hardware commands of the other workers
+
+    Connections carry one of three conversations, chosen by their first message:
+
+    - ("call", zone_id, method, args, kwargs): run a controller command of a
+      zone; the reply is ("ok", result, state) or ("error", message), where
+      state is the zone's controller state afterwards
+    - ("schedules_changed", zone_id): one-way notice that a follower wrote a
+      zone's schedules; the leader re-reads them, which wakes its monitor
+    - ("subscribe",): the leader pushes ("status", zone_id, state) after
+      every controller change and ("schedules", zone_id) after every
+      schedule change, starting with the state of every zone
+
+    state is (epoch, version, status); epoch identifies this leader, so
+    followers can order the versions and notice a new leader.
+    """
+
+    COMMANDS = frozenset({"activate_formula", "deactivate_all", "clear_user_override", "set_pin_mapping"})
+
+    def __init__(self, election, zones, queries=None):
+        self.election = election
+        self.zones = zones
+        self.queries = queries or {}  # name -> function answering ("query", name)
+        self.epoch = secrets.token_hex(4)
+        self.logger = logging.getLogger(__name__)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._listener = None
+
+        for zone in zones.values():
+            zone.controller.add_listener(lambda zone=zone: self._publish_status(zone))
+            zone.store.add_listener(lambda zone=zone: self._publish(("schedules", zone.id), ("schedules", zone.id)))
+
+    def state(self, zone):
+        controller = zone.controller
+        return self.epoch, controller.version, controller.get_status()
+
+    def _publish_status(self, zone):
+        key = ("status", zone.id)
+        self._publish(key, ("status", zone.id, self.state(zone)))
+
+    def _publish(self, key, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for outbox in subscribers:
+            outbox.put(key, message)
+
+    def start(self):
+        # The socket of a previous leader may be left behind; only the leader binds it
+        if os.path.exists(self.election.address):
+            os.remove(self.election.address)
+        self._listener = Listener(self.election.address, family="AF_UNIX", authkey=self.election.authkey)
+        threading.Thread(target=self._accept, name="leader-server", daemon=True).start()
+        self.logger.info(f"Leader process {os.getpid()} listening on {self.election.address}")
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self._listener.accept()
+            except (AuthenticationError, OSError, EOFError) as e:
+                self.logger.warning(f"Rejected worker connection: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        try:
+            while True:
+                message = connection.recv()
+                kind = message[0]
+                if kind == "subscribe":
+                    self._push(connection)
+                    return
+                if kind == "schedules_changed":
+                    zone = self.zones.get(message[1])
+                    if zone is not None:
+                        # Picks up the file change and runs the store listeners
+                        zone.store.current_version()
+                    continue
+                connection.send(self._handle(message))
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def _handle(self, message):
+        try:
+            if message[0] == "query":
+                return ("ok", self.queries[message[1]](), None)
+            _, zone_id, method, args, kwargs = message
+            if method not in self.COMMANDS:
+                return ("error", f"Unknown command: {method}")
+            zone = self.zones.get(zone_id)
+            if zone is None:
+                return ("error", f"Unknown zone: {zone_id}")
+            result = getattr(zone.controller, method)(*args, **kwargs)
+            return ("ok", result, self.state(zone))
+        except Exception as e:
+            self.logger.error(f"Error running {message[:3]} for a worker: {e}")
+            return ("error", str(e))
+
+    def _push(self, connection):
+        outbox = _Outbox()
+        with self._lock:
+            self._subscribers.add(outbox)
+        try:
+            # Anything published after subscribing replaces these initial states
+            for zone in list(self.zones.values()):
+                key = ("status", zone.id)
+                with outbox.condition:
+                    if key not in outbox.pending:
+                        outbox.pending[key] = ("status", zone.id, self.state(zone))
+            while True:
+                connection.send(outbox.get())
+        finally:
+            with self._lock:
+                self._subscribers.discard(outbox)
+
+
+class LeaderClient:
+    """A follower worker's connection to the leader
+
+    call() runs a controller command in the leader. A background thread
+    follows the leader's state pushes and hands them to the zones'
+    RemoteControllers; when the leader goes away it runs the election again
+    and calls on_elected() if this process won. Schedule change notices are
+    sent from another thread, so store listeners never wait for the leader.
+    """
+
+    def __init__(self, election, zones, on_elected, timeout=10, retry=1.0):
+        self.election = election
+        self.zones = zones
+        self.on_elected = on_elected
+        self.timeout = timeout
+        self.retry = retry
+        self.logger = logging.getLogger(__name__)
+
+        self.stopped = False
+        self._connection = None
+        self._lock = threading.Lock()
+        self._notices = _Outbox()
+        self._follower = threading.Thread(target=self._follow, name="leader-follower", daemon=True)
+
+    def start(self):
+        self._follower.start()
+        threading.Thread(target=self._send_notices, name="leader-notices", daemon=True).start()
+
+    def _connect(self):
+        info = self.election.leader_info()
+        if info is None:
+            raise ConnectionError("No leader process is running")
+        address, authkey = info
+        return Client(address, family="AF_UNIX", authkey=authkey)
+
+    def _request(self, message):
+        with self._lock:
+            # A cached connection may belong to a leader that has since exited: reconnect once
+            for attempt in (1, 2):
+                try:
+                    if self._connection is None:
+                        self._connection = self._connect()
+                    self._connection.send(message)
+                    break
+                except (OSError, EOFError, AuthenticationError):
+                    self._close()
+                    if attempt == 2:
+                        raise ConnectionError("Leader process is not reachable")
+            try:
+                if not self._connection.poll(self.timeout):
+                    raise ConnectionError("Leader process did not answer")
+                reply = self._connection.recv()
+            except (OSError, EOFError) as e:
+                self._close()
+                raise ConnectionError(f"Lost the connection to the leader process: {e}")
+        if reply[0] == "error":
+            raise RuntimeError(reply[1])
+        return reply
+
+    def _close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except OSError:
+                pass
+            self._connection = None
+
+    def call(self, zone_id, method, *args, **kwargs):
+        """Run a controller command of a zone in the leader; returns (result, state)"""
+        _, result, state = self._request(("call", zone_id, method, args, kwargs))
+        return result, state
+
+    def query(self, name):
+        """Ask the leader for one of its query results (e.g. "timing_stats")"""
+        return self._request(("query", name))[1]
+
+    def schedules_changed(self, zone_id):
+        """Tell the leader this worker wrote a zone's schedules (returns immediately)"""
+        # Re-reads triggered by the leader's own push need no notice back
+        if self.stopped or threading.current_thread() is self._follower:
+            return
+        self._notices.put(zone_id, ("schedules_changed", zone_id))
+
+    def _send_notices(self):
+        connection = None
+        while not self.stopped:
+            message = self._notices.get()
+            try:
+                if connection is None:
+                    connection = self._connect()
+                connection.send(message)
+            except (OSError, EOFError, AuthenticationError) as e:
+                # A new leader reads the schedules from disk when it starts
+                self.logger.warning(f"Could not notify the leader of a schedule change: {e}")
+                connection = None
+
+    def _follow(self):
+        while True:
+            try:
+                connection = self._connect()
+                connection.send(("subscribe",))
+                while True:
+                    self._dispatch(connection.recv())
+            except (OSError, EOFError, AuthenticationError):
+                pass
+
+            # The leader is gone (or not up yet): whoever takes the lock first leads
+            if self.election.try_acquire():
+                self.stopped = True
+                self.logger.info(f"Worker process {os.getpid()} elected leader")
+                self.on_elected()
+                return
+            time.sleep(self.retry)
+
+    def _dispatch(self, message):
+        zone = self.zones.get(message[1])
+        if zone is None:
+            return
+        try:
+            if message[0] == "status":
+                zone.controller.apply(message[2])
+            elif message[0] == "schedules":
+                zone.store.current_version()
+        except Exception as e:
+            self.logger.error(f"Error applying leader update for zone {zone.id}: {e}")
+
+
+class RemoteController:
+    """Stands in for a zone's SimpleGPIOController in a follower worker
+
+    State reads (get_status(), version, user_override, ...) are served from
+    the copy the leader pushes after every change and cost no round trip;
+    commands run in the leader. version is counted locally, so ETags built
+    from it stay unique when a new leader restarts its own count.
+    """
+
+    def __init__(self, client, zone_id):
+        self.client = client
+        self.zone_id = zone_id
+        self.version = 0
+        self._leader_state = None  # (epoch, version) of the applied status
+        self._status = None
+        self._synced = threading.Event()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.logger = logging.getLogger(__name__)
+
+    def add_listener(self, callback):
+        """Register callback() to run whenever the controller state changes (keep it cheap)"""
+        self._listeners.append(callback)
+
+    def apply(self, state):
+        """Take over a (epoch, version, status) state from the leader unless it is stale"""
+        epoch, version, status = state
+        with self._lock:
+            if self._leader_state and self._leader_state[0] == epoch and self._leader_state[1] >= version:
+                return
+            self._leader_state = (epoch, version)
+            self._status = status
+            self.version += 1
+            self._synced.set()
+            for listener in self._listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    self.logger.error(f"Error in controller state listener: {e}")
+
+    def _call(self, method, *args, **kwargs):
+        result, state = self.client.call(self.zone_id, method, *args, **kwargs)
+        self.apply(state)
+        return result
+
+    def activate_formula(self, *args, **kwargs):
+        return self._call("activate_formula", *args, **kwargs)
+
+    def deactivate_all(self):
+        return self._call("deactivate_all")
+
+    def clear_user_override(self):
+        return self._call("clear_user_override")
+
+    def set_pin_mapping(self, mapping):
+        return self._call("set_pin_mapping", mapping)
+
+    def get_status(self):
+        """The leader's last pushed status, shared and read-only (waits for the first push)"""
+        if not self._synced.wait(self.client.timeout):
+            raise ConnectionError("No controller state from the leader process yet")
+        return self._status
+
+    @property
+    def pin_mapping(self):
+        return self.get_status()["pin_mapping"]
+
+    @property
+    def active_formula(self):
+        return self.get_status()["active_formula"]
+
+    @property
+    def active_schedule(self):
+        return self.get_status()["active_schedule"]
+
+    @property
+    def user_override(self):
+        return self.get_status()["user_override"]
+
+    def collect_metrics(self, out, labels=None):
+        """The controller lock lives in the leader, which reports it"""
+
+    def cleanup(self):
+        """The leader owns the GPIO and cleans it up"""
@@ -0,0 +1,179 @@
+import bisect
+import threading
+import time
+
+# Bucket upper bounds (seconds) shared by the instrumented components
+REQUEST_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+IO_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+LOCK_WAIT_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1)
+SCHEDULER_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class Histogram:
+    """Bucketed distribution of observed values (seconds)
+
+    observe() is a bisect and three additions under a private lock, cheap
+    enough for every request and every disk write; nothing is formatted
+    until the metrics endpoint is scraped.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.bounds, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        """Return (cumulative bucket counts, sum, count); the last bucket is +Inf"""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for bucket in counts:
+            running += bucket
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class HistogramFamily:
+    """Histograms keyed by a tuple of label values, created on first use"""
+
+    def __init__(self, labelnames, bounds):
+        self.labelnames = tuple(labelnames)
+        self.bounds = tuple(bounds)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.bounds))
+        return child
+
+    def items(self):
+        """(labels dict, Histogram) pairs for the exposition"""
+        with self._lock:
+            children = list(self._children.items())
+        return [(dict(zip(self.labelnames, values)), child) for values, child in children]
+
+
+class TimedLock:
+    """threading.Lock that accounts how long callers wait to acquire it
+
+    The uncontended path is a single non-blocking acquire; the clock is only
+    read when the lock is already held by someone else. The counters are
+    updated while holding the lock, so they need no lock of their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+        self.waits = Histogram(LOCK_WAIT_BUCKETS)
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        waited = time.perf_counter() - started
+        self.acquisitions += 1
+        self.contended += 1
+        self.wait_seconds += waited
+        self.waits.observe(waited)
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Exposition:
+    """Builds a Prometheus text exposition (format version 0.0.4)
+
+    Samples are given as a plain number or as (labels dict, value) pairs.
+    Several components may add samples with different labels to the same
+    metric (e.g. one per zone); they are grouped under one HELP/TYPE header.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._families = {}  # name -> header and sample lines, in first-use order
+
+    def _family(self, name, help_text, kind):
+        name = self.prefix + name
+        if name not in self._families:
+            self._families[name] = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        return name, self._families[name]
+
+    def _samples(self, name, help_text, kind, samples):
+        name, lines = self._family(name, help_text, kind)
+        if isinstance(samples, (int, float)):
+            samples = [({}, samples)]
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def counter(self, name, help_text, samples):
+        self._samples(name, help_text, "counter", samples)
+
+    def gauge(self, name, help_text, samples):
+        self._samples(name, help_text, "gauge", samples)
+
+    def histogram(self, name, help_text, histograms):
+        """histograms: a Histogram, or (labels dict, Histogram) pairs"""
+        name, lines = self._family(name, help_text, "histogram")
+        if isinstance(histograms, Histogram):
+            histograms = [({}, histograms)]
+        for labels, histogram in histograms:
+            cumulative, total, count = histogram.snapshot()
+            for bound, running in zip(histogram.bounds + (float("inf"),), cumulative):
+                bucket_labels = dict(labels, le=_format_value(float(bound)))
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {running}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    def text(self):
+        return "\n".join(line for lines in self._families.values() for line in lines) + "\n"
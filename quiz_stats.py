@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from history import rotate_log
+from schedule_store import FileRLock
+
+# Answers that are not one of the scents are counted together
+OTHER_ANSWER = "other"
+
+
+class QuizStats:
+    """Log of quiz submissions with running answer and recommendation counters
+
+    Every submission is appended to the log as [ms, recommended, answers],
+    rotated to <path>.1 ... past max_bytes, and counted: submissions, the
+    recommended scent, and each question's answers (anything that is not a
+    scent as "other"). The counters are saved
+    to counters_path after every submission, so they survive restarts and
+    stats() answers from them without reading the log. With shared=True a
+    FileRLock on <counters_path>.lock serializes the worker processes, and
+    each picks up the others' counts when the file changed.
+    """
+
+    def __init__(self, scents, path="quiz_submissions.log", counters_path="quiz_counters.json",
+                 max_bytes=5 * 1024 * 1024, backups=5, shared=False):
+        self.scents = tuple(scents)
+        self.path = path
+        self.counters_path = counters_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = FileRLock(f"{counters_path}.lock") if shared else threading.RLock()
+        self.logger = logging.getLogger(__name__)
+        self._counters = self._empty()
+        self._signature = None
+
+    def _empty(self):
+        return {"submissions": 0, "recommended": dict.fromkeys(self.scents, 0), "questions": []}
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.counters_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        """Load the saved counters if the file changed since this process last saw it"""
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            return
+        try:
+            with open(self.counters_path, "r") as f:
+                self._counters = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Ignoring unreadable quiz counters {self.counters_path}: {e}")
+        self._signature = signature
+
+    def record(self, answers, recommended):
+        """Log a submission and add it to the counters"""
+        with self.lock:
+            self._refresh()
+            # Counted on a copy, swapped in once the log line and counters are on disk,
+            # so a failed write leaves the in-memory counters matching the saved ones
+            current = self._counters
+            counters = {
+                "submissions": current["submissions"] + 1,
+                "recommended": dict(current["recommended"]),
+                "questions": [dict(counts) for counts in current["questions"]],
+            }
+            counters["recommended"][recommended] = counters["recommended"].get(recommended, 0) + 1
+            answers = [answer if answer in self.scents else OTHER_ANSWER for answer in answers]
+            questions = counters["questions"]
+            while len(questions) < len(answers):
+                questions.append(dict.fromkeys(self.scents, 0))
+            for counts, answer in zip(questions, answers):
+                counts[answer] = counts.get(answer, 0) + 1
+
+            line = json.dumps([round(time.time() * 1000), recommended, answers], separators=(",", ":"))
+            self._append(line + "\n")
+            self._save(counters)
+            self._counters = counters
+            self._signature = self._file_signature()
+
+    def _append(self, line):
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+            rotate_log(self.path, self.backups)
+        with open(self.path, "a") as f:
+            f.write(line)
+
+    def _save(self, counters):
+        tmp_path = f"{self.counters_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(counters, f, separators=(",", ":"))
+        os.replace(tmp_path, self.counters_path)
+
+    def stats(self):
+        """Submission count and the distributions of recommendations and per-question answers"""
+        with self.lock:
+            self._refresh()
+            counters = self._counters
+
+            def distribution(counts):
+                answered = sum(counts.values())
+                return {
+                    key: {"count": count, "percent": round(count / answered * 100, 1) if answered else 0.0}
+                    for key, count in counts.items()
+                }
+
+            return {
+                "submissions": counters["submissions"],
+                "recommended": distribution(counters["recommended"]),
+                "questions": [distribution(counts) for counts in counters["questions"]],
+            }
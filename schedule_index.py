@@ -0,0 +1,265 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from heapq import heappop, heappush
+
+from schedule_model import (
+    DAYS_OF_WEEK,
+    MASK_DAYS,
+    MINUTES_PER_DAY,
+    MINUTES_PER_WEEK,
+    Schedule,
+    minute_ranges,
+)
+
+# Sorted keys are packed into one integer (start << 32 | position) so the
+# per-day lists can live in compact arrays instead of lists of tuples
+POSITION_BITS = 32
+POSITION_MASK = (1 << POSITION_BITS) - 1
+
+
+class ActiveScheduleIndex:
+    """Minute-of-week lookup table answering "which schedule is active now" in O(1)
+
+    Built from the compiled Schedule list and mirrors find_active_schedule_for_time:
+    a schedule matches when it is eligible (enabled, not paused, one-time ones
+    not yet executed), runs on the current weekday (or, for one-time
+    schedules, the current date) and the current minute falls in
+    [start_time, end_time). When several schedules match, the one listed first
+    wins, exactly as with the linear scan.
+    """
+
+    def __init__(self, schedules):
+        self.schedules = schedules
+
+        # Position of the winning schedule for every minute of the week, -1 if none
+        self.table = array("i", [-1]) * MINUTES_PER_WEEK
+        # Dated one-time schedules keyed by date ordinal: [(position, start, end)]
+        self.dated = {}
+        # Start minutes of the eligible schedules per weekday, packed with their position
+        starts = [[] for _ in range(7)]
+
+        # "Next unpainted cell" pointers so every cell is written at most once;
+        # schedules are painted in list order, so the first match keeps the cell
+        next_free = list(range(MINUTES_PER_WEEK + 1))
+        unpainted = MINUTES_PER_WEEK
+
+        def find_free(cell):
+            root = cell
+            while next_free[root] != root:
+                root = next_free[root]
+            while next_free[cell] != root:
+                next_free[cell], cell = root, next_free[cell]
+            return root
+
+        for position, schedule in enumerate(schedules):
+            if not schedule.eligible:
+                continue
+            start, end = schedule.start, schedule.end
+
+            if schedule.date > 0:
+                self.dated.setdefault(schedule.date, []).append((position, start, end))
+                continue
+
+            days = MASK_DAYS[schedule.days]
+            for day in days:
+                starts[day].append(start << POSITION_BITS | position)
+
+            if unpainted == 0:
+                # Every minute already has an earlier winner
+                continue
+
+            for day in days:
+                for range_start, range_end in minute_ranges(start, end):
+                    offset = day * MINUTES_PER_DAY
+                    cell = find_free(offset + range_start)
+                    while cell < offset + range_end:
+                        self.table[cell] = position
+                        next_free[cell] = cell + 1
+                        unpainted -= 1
+                        cell = find_free(cell + 1)
+
+        self.starts = [array("q", sorted(day_starts)) for day_starts in starts]
+
+        # Minutes of the week at which the winner differs from the minute before
+        self.changes = array(
+            "i",
+            (cell for cell in range(MINUTES_PER_WEEK) if self.table[cell] != self.table[cell - 1]),
+        )
+
+    def active_at(self, moment):
+        """Return the Schedule active at the given datetime, or None"""
+        minute = moment.hour * 60 + moment.minute
+        position = self.table[moment.weekday() * MINUTES_PER_DAY + minute]
+
+        dated = self.dated.get(moment.toordinal())
+        if dated:
+            for dated_position, start, end in dated:
+                if position != -1 and dated_position > position:
+                    break
+                if any(s <= minute < e for s, e in minute_ranges(start, end)):
+                    position = dated_position
+                    break
+
+        return self.schedules[position] if position != -1 else None
+
+    def next_change_after(self, moment):
+        """Return the next minute boundary after moment at which active_at can change"""
+        minute = moment.hour * 60 + moment.minute
+        midnight = datetime.combine(moment.date(), datetime.min.time())
+        candidates = []
+
+        if self.changes:
+            week_minute = moment.weekday() * MINUTES_PER_DAY + minute
+            upcoming = bisect_right(self.changes, week_minute)
+            if upcoming < len(self.changes):
+                change = self.changes[upcoming]
+            else:
+                change = self.changes[0] + MINUTES_PER_WEEK
+            week_start = midnight - timedelta(days=moment.weekday())
+            candidates.append(week_start + timedelta(minutes=change))
+
+        if self.dated:
+            # One-time schedules of the next date take over at midnight
+            candidates.append(midnight + timedelta(days=1))
+            for _, start, end in self.dated.get(moment.toordinal(), ()):
+                for boundary in (start, end):
+                    if boundary > minute:
+                        candidates.append(midnight + timedelta(minutes=boundary))
+
+        return min(candidates) if candidates else None
+
+    def next_after(self, moment):
+        """Return (Schedule, start datetime) of the next start eligible today, or (None, None)
+
+        Matches the status page: a schedule that already started today is
+        reported at the same time tomorrow.
+        """
+        minute = moment.hour * 60 + moment.minute
+        day_starts = self.starts[moment.weekday()]
+
+        best = None
+        upcoming = bisect_right(day_starts, minute << POSITION_BITS | POSITION_MASK)
+        if upcoming < len(day_starts):
+            key = day_starts[upcoming]
+            best = (0, key >> POSITION_BITS, key & POSITION_MASK)
+        elif day_starts:
+            key = day_starts[0]
+            best = (1, key >> POSITION_BITS, key & POSITION_MASK)
+
+        for position, start, _ in self.dated.get(moment.toordinal(), ()):
+            candidate = (0 if start > minute else 1, start, position)
+            if best is None or candidate < best:
+                best = candidate
+
+        if best is None:
+            return None, None
+        tomorrow, start, position = best
+        start_datetime = datetime.combine(moment.date(), datetime.min.time()) + timedelta(
+            days=tomorrow, minutes=start
+        )
+        return self.schedules[position], start_datetime
+
+
+def _overlap_pieces(schedules):
+    """Per-weekday sorted (start, end, position) pieces of the enabled schedules
+
+    Each piece is packed as start << 43 | end << 32 | position so sorting and
+    storage work on plain integers.
+    """
+    pieces = [[] for _ in range(7)]
+    for position, schedule in enumerate(schedules):
+        if not schedule.enabled:
+            continue
+        days = MASK_DAYS[schedule.overlap_days]
+        if not days:
+            continue
+        for start, end in schedule.overlap_ranges():
+            key = start << 43 | end << POSITION_BITS | position
+            for day in days:
+                pieces[day].append(key)
+    for day_pieces in pieces:
+        day_pieces.sort()
+    return pieces
+
+
+def _unpack_piece(key):
+    return key >> 43, (key >> POSITION_BITS) & 0x7FF, key & POSITION_MASK
+
+
+class OverlapIndex:
+    """Per-weekday sorted interval arrays of the enabled schedules for overlap checks
+
+    Overnight windows are split at midnight. Each day keeps its pieces sorted by
+    start together with a running maximum of their ends, so a query is a bisect
+    plus a short backwards walk: O(log n + k) when the stored schedules do not
+    overlap each other, which the API enforces.
+    """
+
+    def __init__(self, schedules):
+        self.schedules = schedules
+
+        self.days = []
+        for day_pieces in _overlap_pieces(schedules):
+            starts = array("i")
+            ends = array("i")
+            max_ends = array("i")
+            positions = array("i")
+            running = 0
+            for key in day_pieces:
+                start, end, position = _unpack_piece(key)
+                running = max(running, end)
+                starts.append(start)
+                ends.append(end)
+                max_ends.append(running)
+                positions.append(position)
+            self.days.append((starts, ends, max_ends, positions))
+
+    def overlapping(self, new_schedule, exclude_id=None):
+        """Return the enabled schedules (stored dicts) that overlap new_schedule, in stored order"""
+        query = Schedule(new_schedule)
+        found = set()
+        ranges = query.overlap_ranges()
+        for day in MASK_DAYS[query.overlap_days]:
+            starts, ends, max_ends, positions = self.days[day]
+            for query_start, query_end in ranges:
+                j = bisect_left(starts, query_end) - 1
+                while j >= 0 and max_ends[j] > query_start:
+                    if ends[j] > query_start:
+                        found.add(positions[j])
+                    j -= 1
+
+        overlapping = []
+        for position in sorted(found):
+            schedule = self.schedules[position]
+            # Skip the schedule being updated (for edit operations)
+            if exclude_id and schedule.id == exclude_id:
+                continue
+            overlapping.append(schedule.data)
+        return overlapping
+
+
+def find_conflicts(schedules):
+    """Report every pair of enabled schedules that overlap, in one sweep per weekday
+
+    Takes the compiled Schedule list and returns a list of (first, second, days)
+    tuples of stored dicts, first listed before second and days the weekday
+    names on which they collide.
+    """
+    pair_days = {}
+    for day, day_pieces in enumerate(_overlap_pieces(schedules)):
+        active = []  # min-heap of (end, position) for pieces still open
+        for key in day_pieces:
+            start, end, position = _unpack_piece(key)
+            while active and active[0][0] <= start:
+                heappop(active)
+            for _, other in active:
+                if other != position:
+                    pair = (min(position, other), max(position, other))
+                    pair_days.setdefault(pair, set()).add(day)
+            heappush(active, (end, position))
+
+    return [
+        (schedules[a].data, schedules[b].data, [DAYS_OF_WEEK[d] for d in sorted(days)])
+        for (a, b), days in sorted(pair_days.items())
+    ]
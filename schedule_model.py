@@ -0,0 +1,164 @@
+from datetime import date, datetime, timedelta
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+DAYS_OF_WEEK = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+
+# Weekday numbers (datetime.weekday(), Monday == 0) covered by each recurrence
+RECURRENCE_DAYS = {
+    "daily": tuple(range(7)),
+    "weekdays": (0, 1, 2, 3, 4),
+    "weekends": (5, 6),
+}
+RECURRENCE_DAYS.update({day: (number,) for number, day in enumerate(DAYS_OF_WEEK)})
+
+# The same as weekday bitmasks (bit n set for weekday n), and the days of every mask
+RECURRENCE_MASKS = {
+    recurrence: sum(1 << day for day in days) for recurrence, days in RECURRENCE_DAYS.items()
+}
+ALL_DAYS_MASK = RECURRENCE_MASKS["daily"]
+MASK_DAYS = [tuple(day for day in range(7) if mask >> day & 1) for mask in range(ALL_DAYS_MASK + 1)]
+
+
+# One shared int object per minute of the day (Python only caches ints up to 256)
+_MINUTES = tuple(range(MINUTES_PER_DAY))
+
+
+def parse_minutes(time_str):
+    """Convert an "HH:MM" (or "H:MM") string to minutes since midnight, None if invalid"""
+    try:
+        hours, minutes = time_str.split(":")
+        hours, minutes = int(hours), int(minutes)
+    except (AttributeError, ValueError):
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return _MINUTES[hours * 60 + minutes]
+
+
+def parse_date_ordinal(date_str):
+    """Convert a "YYYY-MM-DD" string to a date ordinal, 0 if missing and -1 if invalid"""
+    if not date_str:
+        return 0
+    try:
+        parsed = date.fromisoformat(date_str)
+    except (TypeError, ValueError):
+        return -1
+    # Dates are matched as exact strings, so other ISO spellings never match
+    return parsed.toordinal() if parsed.isoformat() == date_str else -1
+
+
+def minute_ranges(start, end):
+    """Split a daily [start, end) window into non-wrapping minute ranges"""
+    if start < end:
+        return ((start, end),)
+    # Overnight window like 23:00-01:00 wraps within the same day
+    return ((start, MINUTES_PER_DAY), (0, end))
+
+
+class Schedule:
+    """Compact, pre-parsed view of one stored schedule (treat as read-only)
+
+    start and end are minutes since midnight (None if unparseable), days is
+    the weekday bitmask the schedule can run on and date the ordinal of a
+    one-time schedule's date (0 when it has none, -1 when it is invalid).
+    data is the stored dict itself, which API responses keep returning.
+    """
+
+    __slots__ = ("id", "start", "end", "days", "date", "once", "enabled", "paused", "executed", "data")
+
+    def __init__(self, data):
+        self.data = data
+        self.id = data.get("id")
+        self.start = parse_minutes(data.get("start_time"))
+        self.end = parse_minutes(data.get("end_time"))
+        self.enabled = bool(data.get("enabled"))
+        self.paused = bool(data.get("paused", False))
+        self.executed = bool(data.get("executed", False))
+
+        recurrence = data.get("recurrence", "daily")
+        self.once = recurrence == "once"
+        if self.once:
+            self.date = parse_date_ordinal(data.get("schedule_date"))
+            # A one-time schedule without a date is eligible on any day
+            self.days = ALL_DAYS_MASK if self.date == 0 else 0
+        else:
+            self.date = 0
+            self.days = RECURRENCE_MASKS.get(recurrence, 0)
+
+    def __repr__(self):
+        return f"Schedule(id={self.id!r}, start={self.start}, end={self.end}, days={self.days:07b})"
+
+    @property
+    def eligible(self):
+        """Whether the schedule can become active at all (enabled, not paused, pending, valid window)"""
+        return (
+            self.enabled
+            and not self.paused
+            and not (self.once and self.executed)
+            and self.start is not None
+            and self.end is not None
+            and self.start != self.end
+        )
+
+    def runs_on(self, day):
+        """Whether the schedule is eligible on the given date (or datetime)"""
+        return self.eligible and bool(
+            self.days >> day.weekday() & 1 or (self.date > 0 and self.date == day.toordinal())
+        )
+
+    def contains(self, minute):
+        """Whether a minute of the day falls in the [start, end) window"""
+        if self.start <= self.end:
+            return self.start <= minute < self.end
+        # Overnight window like 23:00-01:00
+        return minute >= self.start or minute < self.end
+
+    def active_at(self, moment):
+        """Whether the schedule is active at the given datetime"""
+        return self.runs_on(moment) and self.contains(moment.hour * 60 + moment.minute)
+
+    @property
+    def overlap_days(self):
+        """Weekday bitmask used for overlap checks (one-time schedules never overlap)"""
+        return 0 if self.once else self.days
+
+    def overlap_ranges(self):
+        """Non-wrapping minute ranges the schedule occupies each active day
+
+        Unparseable times occupy the whole day, matching time_ranges_overlap's
+        "assume overlap on error" behaviour.
+        """
+        if self.start is None or self.end is None:
+            return ((0, MINUTES_PER_DAY),)
+        return tuple((s, e) for s, e in minute_ranges(self.start, self.end) if s < e)
+
+    def duration_seconds(self):
+        """Length of the window in seconds (overnight windows end the next day)"""
+        if self.start is None or self.end is None:
+            return 3600  # Default to 1 hour
+        minutes = (self.end - self.start) % MINUTES_PER_DAY
+        return max(minutes * 60, 60)  # Minimum 1 minute
+
+    def end_after(self, moment):
+        """The first end of the window strictly after moment"""
+        midnight = datetime.combine(moment.date(), datetime.min.time())
+        end_datetime = midnight + timedelta(minutes=self.end)
+        # Handle case where end time is next day (crosses midnight)
+        if end_datetime <= moment:
+            end_datetime += timedelta(days=1)
+        return end_datetime
+
+
+def compile_schedules(schedules_data):
+    """Build the Schedule objects for a schedules document, in stored order"""
+    return [Schedule(schedule) for schedule in schedules_data.get("schedules", [])]
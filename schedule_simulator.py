@@ -0,0 +1,199 @@
+import logging
+import math
+from datetime import timedelta
+
+# The scheduler logs every start and stop; in a replay those are the result, not news
+SIMULATION_LOGGER = logging.getLogger(__name__)
+SIMULATION_LOGGER.setLevel(logging.WARNING)
+
+
+class SimulatedController:
+    """Stand-in for SimpleGPIOController that records activations on a virtual clock
+
+    Keeps the controller's state the same way (scheduled vs manual
+    activations, user override) and ends a timed activation by the timing
+    engine's rule: at the first cycle boundary at least activation_duration
+    after it started, postponed by whole cycles while a user override is set.
+    """
+
+    def __init__(self, clock, pin_mapping):
+        self.clock = clock
+        self.pin_mapping = dict(pin_mapping)
+        self.version = 0
+
+        self.active_formula = None
+        self.active_schedule = None
+        self.schedule_end_time = None
+        self.user_override = False
+        self.current_cycle_time = None
+        self.current_duration = None
+
+        # Every activation: formula, scheduled, cycle_time, duration, start, end, ended_by
+        self.activations = []
+        self._current = None
+        self.finishes_at = None  # When the engine would end the current timed activation
+        self._period = None
+
+    def add_listener(self, callback):
+        pass
+
+    def _end(self, ended_by):
+        if self._current is not None:
+            self._current["end"] = self.clock.now()
+            self._current["ended_by"] = ended_by
+            self._current = None
+        self.finishes_at = None
+
+    def _deactivate_all_internal(self, clear_user_override=True, ended_by="stopped"):
+        self._end(ended_by)
+        self.active_formula = None
+        self.active_schedule = None
+        self.schedule_end_time = None
+        if clear_user_override:
+            self.user_override = False
+        self.current_cycle_time = None
+        self.current_duration = None
+
+    def activate_formula(self, color, cycle_time=60, duration=10, is_scheduled=False, activation_duration=None):
+        self._deactivate_all_internal(clear_user_override=is_scheduled, ended_by="replaced")
+        self.version += 1
+        if color not in self.pin_mapping:
+            return False
+
+        now = self.clock.now()
+        self.active_formula = color
+        self.current_cycle_time = cycle_time
+        self.current_duration = duration
+        if is_scheduled:
+            self.active_schedule = color
+            if activation_duration:
+                self.schedule_end_time = now + timedelta(seconds=activation_duration)
+        else:
+            self.active_schedule = None
+            self.schedule_end_time = None
+            self.user_override = True
+
+        # Same period rule as the timing engine
+        self._period = cycle_time if cycle_time > duration else duration + 1
+        if is_scheduled and activation_duration is not None:
+            cycles = math.ceil(activation_duration / self._period)
+            self.finishes_at = now + timedelta(seconds=cycles * self._period)
+
+        self._current = {
+            "formula": color,
+            "scheduled": is_scheduled,
+            "cycle_time": cycle_time,
+            "duration": duration,
+            "start": now,
+            "end": None,
+            "ended_by": None,
+        }
+        self.activations.append(self._current)
+        return True
+
+    def finish_until(self, limit):
+        """Let the engine end the timed activation if it is due by limit (the clock moves there)"""
+        if self.finishes_at is None or self.finishes_at > limit:
+            return
+        if self.user_override:
+            # may_finish() says no at every cycle boundary until the override is cleared
+            cycles = math.floor((limit - self.finishes_at).total_seconds() / self._period) + 1
+            self.finishes_at += timedelta(seconds=cycles * self._period)
+            return
+        self.clock.set(self.finishes_at)
+        self._end("completed")
+        self.active_formula = None
+        self.active_schedule = None
+        self.schedule_end_time = None
+        self.version += 1
+
+    def deactivate_all(self):
+        self._deactivate_all_internal()
+        self.version += 1
+
+    def clear_user_override(self):
+        self.user_override = False
+        self.version += 1
+
+    def get_status(self):
+        return {
+            "active": bool(self.active_formula),
+            "active_formula": self.active_formula,
+            "active_schedule": self.active_schedule,
+            "is_scheduled": bool(self.active_schedule and not self.user_override),
+            "user_override": self.user_override,
+            "schedule_end_time": self.schedule_end_time,
+            "pin_mapping": self.pin_mapping,
+            "gpio_available": False,
+            "cycle_start_time": None,
+            "current_cycle_time": self.current_cycle_time,
+            "current_duration": self.current_duration,
+        }
+
+
+class SimulationRecorder:
+    """Collects the activations and schedule changes of a simulated zone into a timeline"""
+
+    def __init__(self, zone):
+        self.zone = zone
+        self.events = []
+        self._schedules = zone.store.snapshot()["schedules"]
+        self._recorded = 0  # Activations already matched to their schedule
+
+    def record(self):
+        """Note what the scheduler changed since the last call (call after every step)"""
+        now = self.zone.clock.now()
+        activations = self.zone.controller.activations
+        for activation in activations[self._recorded:]:
+            schedule = self.zone.store.active_at(activation["start"]) if activation["scheduled"] else None
+            activation["schedule_id"] = schedule.get("id") if schedule else None
+        self._recorded = len(activations)
+
+        # Store writes replace the changed schedule dicts, so identity finds them
+        schedules = self.zone.store.snapshot()["schedules"]
+        if schedules is self._schedules:
+            return
+        before = {id(s): s for s in self._schedules}
+        previous = {s.get("id"): s for s in self._schedules}
+        for schedule in schedules:
+            if id(schedule) in before:
+                continue
+            old = previous.get(schedule.get("id"), {})
+            for event, key, value in (
+                ("executed", "executed", True),
+                ("paused", "paused", True),
+                ("resumed", "paused", False),
+            ):
+                if bool(schedule.get(key)) == value and bool(old.get(key)) != value:
+                    self.events.append(
+                        {
+                            "time": now.isoformat(),
+                            "event": event,
+                            "schedule_id": schedule.get("id"),
+                            "formula": schedule.get("formula"),
+                        }
+                    )
+        self._schedules = schedules
+
+    def result(self, start, end):
+        activations = []
+        for activation in self.zone.controller.activations:
+            activations.append(
+                {
+                    "formula": activation["formula"],
+                    "schedule_id": activation.get("schedule_id"),
+                    "scheduled": activation["scheduled"],
+                    "cycle_time": activation["cycle_time"],
+                    "duration": activation["duration"],
+                    "start": activation["start"].isoformat(),
+                    "end": (activation["end"] or end).isoformat(),
+                    # completed (timed end), replaced, stopped, or still running at the end
+                    "ended_by": activation["ended_by"] or "running",
+                }
+            )
+        return {
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "activations": activations,
+            "events": self.events,
+        }
@@ -0,0 +1,757 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): stores can only be shared between threads
+    fcntl = None
+
+from metrics import IO_BUCKETS, Histogram
+from schedule_index import ActiveScheduleIndex
+from schedule_model import DAYS_OF_WEEK, RECURRENCE_DAYS, compile_schedules, parse_minutes
+
+
+def _stat_signature(path):
+    """Return a cheap fingerprint of a file on disk, or None if missing"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _write_atomic(path, data, **dump_kwargs):
+    """Write JSON to a temp file and rename it over path so readers never see a torn file
+
+    Returns the number of bytes written.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, **dump_kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+        size = os.fstat(f.fileno()).st_size
+    os.replace(tmp_path, path)
+    return size
+
+
+class FileRLock:
+    """Reentrant lock that also excludes other processes, through flock on a lock file
+
+    Used as the store lock when several worker processes serve the same
+    schedule files: threads queue on the RLock, and the outermost holder
+    takes the file lock, so a check-then-write sequence in one worker
+    cannot interleave with a write in another.
+    """
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise RuntimeError("Sharing schedule files between processes needs fcntl.flock")
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def diff_records(old, new):
+    """Return the change records (upsert/delete/replace) that turn old into new"""
+    old_schedules = old.get("schedules", [])
+    new_schedules = new.get("schedules", [])
+    old_ids = [s.get("id") for s in old_schedules]
+    new_ids = [s.get("id") for s in new_schedules]
+    old_set, new_set = set(old_ids), set(new_ids)
+
+    # Records address schedules by id and append new ones at the end; anything
+    # they cannot express (missing/duplicate ids, reordering, other top-level
+    # keys) is recorded as one full replacement instead
+    expected_order = [i for i in old_ids if i in new_set]
+    expected_order += [i for i in new_ids if i not in old_set]
+    other_old = {k: v for k, v in old.items() if k != "schedules"}
+    other_new = {k: v for k, v in new.items() if k != "schedules"}
+    if (
+        None in new_set
+        or len(new_set) != len(new_ids)
+        or len(old_set) != len(old_ids)
+        or expected_order != new_ids
+        or other_old != other_new
+    ):
+        return [{"op": "replace", "data": new}]
+
+    old_by_id = dict(zip(old_ids, old_schedules))
+    records = [{"op": "delete", "id": i} for i in old_ids if i not in new_set]
+    for schedule in new_schedules:
+        if old_by_id.get(schedule["id"]) != schedule:
+            records.append({"op": "upsert", "schedule": schedule})
+    return records
+
+
+class ScheduleStore:
+    """Process-wide in-memory schedule store with write-through persistence
+
+    Reads are served from memory. Writes go through save() (whole document)
+    or the targeted insert()/update()/delete() operations; all of them hold
+    the store lock, so callers can also take `with store.lock:` to make a
+    check-then-write sequence atomic. Subclasses only decide how the change
+    records reach the disk.
+
+    With shared=True the store lock is a FileRLock on <path>.lock, for
+    several worker processes serving the same files; every read picks up
+    the other processes' writes through the file signature check.
+    """
+
+    def __init__(self, path="schedules.json", shared=False):
+        self.path = path
+        self.lock = FileRLock(f"{path}.lock") if shared else threading.RLock()
+        self.logger = logging.getLogger(__name__)
+
+        # Cached file contents and the file signature they were read from
+        self._data = None
+        self._signature = None
+
+        # Bumped whenever the cached schedules change (save or reload from disk)
+        self.version = 0
+
+        # Structures derived from the cached schedules: key -> (version, value)
+        self._derived = {}
+
+        # Called (under the store lock) whenever the cached schedules change
+        self._listeners = []
+
+        # Disk I/O per operation: latency histogram and bytes moved. Reads and
+        # writes add their byte counts to _io_tally while holding the store lock
+        self.io_seconds = {op: Histogram(IO_BUCKETS) for op in ("load", "save", "compact")}
+        self.io_bytes = dict.fromkeys(self.io_seconds, 0)
+        self._io_tally = 0
+
+    @staticmethod
+    def _default_data():
+        return {"schedules": []}
+
+    @staticmethod
+    def _copy(data):
+        """Copy schedules data deep enough that callers can mutate it freely"""
+        copied = dict(data)
+        copied["schedules"] = [dict(s) for s in data.get("schedules", [])]
+        return copied
+
+    def _file_signature(self):
+        return _stat_signature(self.path)
+
+    def _load_from_disk(self):
+        """Read the schedules data from disk, creating the default file if missing"""
+        if not os.path.exists(self.path):
+            # Create default schedules file
+            data = self._default_data()
+            self._io_tally += _write_atomic(self.path, data, indent=2)
+            return data
+        with open(self.path, "r") as f:
+            self._io_tally += os.fstat(f.fileno()).st_size
+            return json.load(f)
+
+    def _persist(self, data, records):
+        """Write a change to disk; data is the full new document, records the delta"""
+        self._io_tally += _write_atomic(self.path, data, indent=2)
+
+    def _disk_io(self, operation, func, *args):
+        """Run a disk read or write, recording its latency and the bytes it moved"""
+        self._io_tally = 0
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.io_seconds[operation].observe(time.perf_counter() - started)
+            self.io_bytes[operation] += self._io_tally
+
+    def _refresh(self):
+        """Reload the cache if the files changed on disk since we last saw them"""
+        signature = self._file_signature()
+        if self._data is not None and signature == self._signature:
+            return
+
+        try:
+            data = self._disk_io("load", self._load_from_disk)
+            self._signature = self._file_signature()
+        except Exception as e:
+            # Keep serving the last good copy; retry on the next read
+            self.logger.error(f"Error loading schedules: {e}")
+            if self._data is not None:
+                return
+            data = self._default_data()
+
+        data.setdefault("schedules", [])
+        if self._data is not None:
+            self.logger.info(f"Reloaded {self.path} after external change")
+        self._data = data
+        self.version += 1
+        self._notify()
+
+    def _commit(self, data, records):
+        """Persist records and swap in data as the new cached snapshot"""
+        if not records:
+            return
+        self._disk_io("save", self._persist, data, records)
+        self._signature = self._file_signature()
+        self._data = data
+        self.version += 1
+        self._notify()
+
+    def _notify(self):
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception as e:
+                self.logger.error(f"Error in schedule change listener: {e}")
+
+    def add_listener(self, callback):
+        """Register callback() to run whenever the schedules change (keep it cheap)"""
+        self._listeners.append(callback)
+
+    def collect_metrics(self, out, labels=None):
+        """Add the store's size and disk I/O metrics to a metrics.Exposition"""
+        labels = labels or {}
+        out.gauge("schedules", "Stored schedules.", [(labels, len(self.snapshot()["schedules"]))])
+        out.counter("schedule_store_changes_total", "Changes to the stored schedules.", [(labels, self.version)])
+        out.histogram(
+            "schedule_store_io_seconds",
+            "Time spent reading or writing the schedules on disk.",
+            [(dict(labels, operation=op), histogram) for op, histogram in self.io_seconds.items()],
+        )
+        out.counter(
+            "schedule_store_io_bytes_total",
+            "Bytes of schedules read from or written to disk.",
+            [(dict(labels, operation=op), count) for op, count in self.io_bytes.items()],
+        )
+
+    def snapshot(self):
+        """Return the cached schedules data without copying (treat as read-only)"""
+        with self.lock:
+            self._refresh()
+            return self._data
+
+    def current_version(self):
+        """Return the version of the schedules, picking up external file changes first"""
+        with self.lock:
+            self._refresh()
+            return self.version
+
+    def cached(self, key, build):
+        """Return build(snapshot), rebuilt only when the schedules have changed"""
+        with self.lock:
+            self._refresh()
+            entry = self._derived.get(key)
+            if entry is None or entry[0] != self.version:
+                entry = (self.version, build(self._data))
+                self._derived[key] = entry
+            return entry[1]
+
+    def compiled(self):
+        """Return the schedules as pre-parsed Schedule objects, built once per version"""
+        return self.cached("compiled", compile_schedules)
+
+    def cached_compiled(self, key, build):
+        """Like cached(), but build receives the compiled Schedule list"""
+        return self.cached(key, lambda data: build(self.compiled()))
+
+    def load(self):
+        """Return a private copy of the schedules data for read-modify-write use"""
+        with self.lock:
+            self._refresh()
+            return self._copy(self._data)
+
+    def save(self, data):
+        """Persist schedules data and update the cache (raises on I/O errors)"""
+        with self.lock:
+            self._refresh()
+            data = self._copy(data)
+            self._commit(data, diff_records(self._data, data))
+
+    def get(self, schedule_id):
+        """Return the cached schedule with the given id, or None (treat as read-only)"""
+        for schedule in self.snapshot()["schedules"]:
+            if schedule.get("id") == schedule_id:
+                return schedule
+        return None
+
+    def insert(self, schedule):
+        """Store a new schedule under the next free id and return it"""
+        with self.lock:
+            self._refresh()
+            schedules = self._data["schedules"]
+            schedule = dict(schedule)
+            schedule["id"] = max([s.get("id", 0) for s in schedules], default=0) + 1
+
+            data = dict(self._data)
+            data["schedules"] = schedules + [schedule]
+            self._commit(data, [{"op": "upsert", "schedule": schedule}])
+            return dict(schedule)
+
+    def insert_many(self, schedules):
+        """Store several new schedules under consecutive free ids in one atomic write
+
+        Returns the stored schedules; on error nothing is stored.
+        """
+        with self.lock:
+            self._refresh()
+            existing = self._data["schedules"]
+            next_id = max([s.get("id", 0) for s in existing], default=0) + 1
+
+            added = []
+            for offset, schedule in enumerate(schedules):
+                schedule = dict(schedule)
+                schedule["id"] = next_id + offset
+                added.append(schedule)
+
+            data = dict(self._data)
+            data["schedules"] = existing + added
+            self._commit(data, [{"op": "upsert", "schedule": s} for s in added])
+            return [dict(s) for s in added]
+
+    def update(self, schedule_id, changes, remove=()):
+        """Apply field changes (and drop the keys in remove) to one schedule
+
+        Returns the updated schedule, or None if no schedule has that id.
+        """
+        with self.lock:
+            self._refresh()
+            schedules = self._data["schedules"]
+            for index, schedule in enumerate(schedules):
+                if schedule.get("id") == schedule_id:
+                    break
+            else:
+                return None
+
+            updated = dict(schedule)
+            updated.update(changes)
+            for key in remove:
+                updated.pop(key, None)
+            if updated == schedule:
+                return dict(updated)
+
+            data = dict(self._data)
+            data["schedules"] = schedules[:index] + [updated] + schedules[index + 1:]
+            self._commit(data, [{"op": "upsert", "schedule": updated}])
+            return dict(updated)
+
+    def delete(self, schedule_id):
+        """Remove a schedule, returning True if it existed"""
+        with self.lock:
+            self._refresh()
+            schedules = self._data["schedules"]
+            remaining = [s for s in schedules if s.get("id") != schedule_id]
+            if len(remaining) == len(schedules):
+                return False
+
+            data = dict(self._data)
+            data["schedules"] = remaining
+            self._commit(data, [{"op": "delete", "id": schedule_id}])
+            return True
+
+    def active_schedule_at(self, moment):
+        """Return the compiled Schedule that should be active at the given datetime, or None"""
+        return self.cached_compiled("active_index", ActiveScheduleIndex).active_at(moment)
+
+    def active_at(self, moment):
+        """Return the schedule that should be active at the given datetime, or None"""
+        schedule = self.active_schedule_at(moment)
+        return schedule.data if schedule else None
+
+    def next_after(self, moment):
+        """Return (schedule, start datetime) of the next schedule start, or (None, None)"""
+        schedule, start = self.cached_compiled("active_index", ActiveScheduleIndex).next_after(moment)
+        return (schedule.data if schedule else None), start
+
+    def next_transition_after(self, moment):
+        """Return the next instant at which the active schedule can change, or None"""
+        return self.cached_compiled("active_index", ActiveScheduleIndex).next_change_after(moment)
+
+
+class JournalScheduleStore(ScheduleStore):
+    """Schedule store that appends each change to a journal instead of rewriting the file
+
+    schedules.json is kept as the snapshot; every change appends one line to
+    schedules.journal, a small JSON record per changed schedule (wrapped in a
+    single batch record when a change touches several, so it is atomic). On
+    load the journal is replayed on top of the snapshot. Once the journal grows past
+    compact_after records a background thread folds it into a new snapshot
+    with an atomic rename.
+    """
+
+    def __init__(self, path="schedules.json", compact_after=200, shared=False):
+        super().__init__(path, shared)
+        self.journal_path = os.path.splitext(path)[0] + ".journal"
+        # The journal is moved here while compaction writes the new snapshot
+        self.compacting_path = self.journal_path + ".compacting"
+        self.compact_after = compact_after
+
+        self._journal_records = 0
+        self._compaction_thread = None
+
+    def _file_signature(self):
+        return tuple(
+            _stat_signature(path)
+            for path in (self.path, self.compacting_path, self.journal_path)
+        )
+
+    def _load_from_disk(self):
+        data = super()._load_from_disk()
+        self._journal_records = 0
+        for path in (self.compacting_path, self.journal_path):
+            data, replayed = self._replay(path, data)
+            self._journal_records += replayed
+        return data
+
+    def _replay(self, path, data):
+        """Apply the records in a journal file to data, returning (data, record count)"""
+        if not os.path.exists(path):
+            return data, 0
+
+        by_id = None
+        count = 0
+        offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("record not terminated")
+                    record = json.loads(line)
+                except ValueError:
+                    # Only the last record can be torn (power cut mid-append); cut
+                    # it off so the next append starts on a clean line
+                    self.logger.warning(f"Dropping incomplete record at end of {path}")
+                    with open(path, "r+b") as journal:
+                        journal.truncate(offset)
+                    break
+                offset += len(line)
+                self._io_tally += len(line)
+
+                # A multi-record change is one "batch" line, so it replays all or nothing
+                changes = record["records"] if record.get("op") == "batch" else (record,)
+                for change in changes:
+                    op = change.get("op")
+                    if op == "replace":
+                        data = change["data"]
+                        data.setdefault("schedules", [])
+                        by_id = None
+                    else:
+                        if by_id is None:
+                            by_id = {s.get("id"): s for s in data["schedules"]}
+                        if op == "upsert":
+                            schedule = change["schedule"]
+                            by_id[schedule.get("id")] = schedule
+                        elif op == "delete":
+                            by_id.pop(change["id"], None)
+                    count += 1
+
+        if by_id is not None:
+            data["schedules"] = list(by_id.values())
+        return data, count
+
+    def _persist(self, data, records):
+        # Several records go out as one line: a torn append then drops the whole change
+        line = records[0] if len(records) == 1 else {"op": "batch", "records": records}
+        line = json.dumps(line, separators=(",", ":")) + "\n"
+        with open(self.journal_path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._io_tally += len(line)
+        self._journal_records += len(records)
+        if self._journal_records >= self.compact_after:
+            self._start_compaction()
+
+    def _start_compaction(self):
+        if self._compaction_thread and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self.compact, daemon=True)
+        self._compaction_thread.start()
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot"""
+        try:
+            with self.lock:
+                self._refresh()
+                data = self._copy(self._data)
+                compacted_records = self._journal_records
+
+                # Move the journal aside; new saves start a fresh one meanwhile
+                if os.path.exists(self.journal_path):
+                    if os.path.exists(self.compacting_path):
+                        # Left over from an interrupted compaction: keep both
+                        with open(self.journal_path, "r") as src, open(
+                            self.compacting_path, "a"
+                        ) as dst:
+                            dst.write(src.read())
+                            dst.flush()
+                            os.fsync(dst.fileno())
+                        os.remove(self.journal_path)
+                    else:
+                        os.replace(self.journal_path, self.compacting_path)
+                self._signature = self._file_signature()
+
+            # The slow full write happens without blocking readers or writers
+            started = time.perf_counter()
+            written = _write_atomic(self.path, data, indent=2)
+            self.io_seconds["compact"].observe(time.perf_counter() - started)
+            self.io_bytes["compact"] += written
+
+            with self.lock:
+                if os.path.exists(self.compacting_path):
+                    os.remove(self.compacting_path)
+                self._journal_records -= compacted_records
+                self._signature = self._file_signature()
+
+            self.logger.info(f"Compacted {compacted_records} journal records into {self.path}")
+
+        except Exception as e:
+            self.logger.error(f"Error compacting schedule journal: {e}")
+
+
+class SqliteScheduleStore(ScheduleStore):
+    """Schedule store backed by a SQLite database (schedules.db)
+
+    Each change runs as a single-row statement inside one transaction instead
+    of rewriting the whole document. The columns the scheduler filters on are
+    kept next to the JSON of each schedule and indexed, so the active and
+    next-schedule lookups are indexed queries. On first use an existing
+    schedules.json is migrated into the database.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS schedules (
+            position INTEGER PRIMARY KEY,
+            id INTEGER,
+            enabled INTEGER NOT NULL,
+            recurrence TEXT,
+            start_minute INTEGER,
+            end_minute INTEGER,
+            schedule_date TEXT,
+            paused INTEGER NOT NULL,
+            executed INTEGER NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_schedules_lookup
+            ON schedules (enabled, recurrence, start_minute);
+        CREATE INDEX IF NOT EXISTS idx_schedules_id ON schedules (id);
+        CREATE TABLE IF NOT EXISTS schedule_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    # A schedule can be active or start today (see Schedule.eligible and Schedule.runs_on)
+    ELIGIBLE_TODAY = """
+        enabled = 1 AND paused = 0
+        AND start_minute IS NOT NULL AND end_minute IS NOT NULL
+        AND start_minute != end_minute
+        AND (
+            recurrence IN (?, ?, ?)
+            OR (recurrence = 'once' AND executed = 0
+                AND (schedule_date IS NULL OR schedule_date = ?))
+        )
+    """
+
+    def __init__(self, path="schedules.json", shared=False):
+        super().__init__(path, shared)
+        self.db_path = os.path.splitext(path)[0] + ".db"
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(self.SCHEMA)
+        self._migrate_json()
+
+    def _file_signature(self):
+        return (_stat_signature(self.db_path), _stat_signature(self.db_path + "-wal"))
+
+    @staticmethod
+    def _row(position, schedule):
+        enabled = 1 if schedule.get("enabled") else 0
+        return (
+            position,
+            schedule.get("id"),
+            enabled,
+            schedule.get("recurrence", "daily"),
+            parse_minutes(schedule.get("start_time")),
+            parse_minutes(schedule.get("end_time")),
+            schedule.get("schedule_date") or None,
+            1 if schedule.get("paused", False) else 0,
+            1 if schedule.get("executed", False) else 0,
+            json.dumps(schedule, separators=(",", ":")),
+        )
+
+    def _insert_all(self, data):
+        rows = [self._row(p, s) for p, s in enumerate(data.get("schedules", []))]
+        extra = json.dumps({k: v for k, v in data.items() if k != "schedules"})
+        self.connection.execute("DELETE FROM schedules")
+        self.connection.executemany("INSERT INTO schedules VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.connection.execute("INSERT OR REPLACE INTO schedule_meta VALUES ('extra', ?)", (extra,))
+        # Count the JSON payloads, which dominate what SQLite writes
+        self._io_tally += sum(len(row[-1]) for row in rows) + len(extra)
+
+    def _migrate_json(self):
+        """Import schedules.json once when the database is first created"""
+        with self.lock, self.connection:
+            migrated = self.connection.execute(
+                "SELECT value FROM schedule_meta WHERE key = 'migrated_from'"
+            ).fetchone()
+            if migrated:
+                return
+
+            data = self._default_data()
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                data.setdefault("schedules", [])
+                self.logger.info(
+                    f"Migrating {len(data['schedules'])} schedules from {self.path} to {self.db_path}"
+                )
+            self._insert_all(data)
+            self.connection.execute(
+                "INSERT INTO schedule_meta VALUES ('migrated_from', ?)", (self.path,)
+            )
+
+    def _load_from_disk(self):
+        with self.lock:
+            extra = self.connection.execute(
+                "SELECT value FROM schedule_meta WHERE key = 'extra'"
+            ).fetchone()
+            data = json.loads(extra[0]) if extra else {}
+            rows = self.connection.execute("SELECT data FROM schedules ORDER BY position").fetchall()
+            data["schedules"] = [json.loads(row[0]) for row in rows]
+            self._io_tally += sum(len(row[0]) for row in rows) + (len(extra[0]) if extra else 0)
+            return data
+
+    def _persist(self, data, records):
+        with self.connection:
+            for record in records:
+                op = record["op"]
+                if op == "replace":
+                    self._insert_all(record["data"])
+                elif op == "delete":
+                    self.connection.execute("DELETE FROM schedules WHERE id = ?", (record["id"],))
+                elif op == "upsert":
+                    schedule = record["schedule"]
+                    position = self.connection.execute(
+                        "SELECT position FROM schedules WHERE id = ?", (schedule.get("id"),)
+                    ).fetchone()
+                    if position is None:
+                        position = self.connection.execute(
+                            "SELECT COALESCE(MAX(position), -1) + 1 FROM schedules"
+                        ).fetchone()
+                    row = self._row(position[0], schedule)
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO schedules VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+                    )
+                    self._io_tally += len(row[-1])
+
+    def _eligible_params(self, moment):
+        weekday = moment.weekday()
+        group = "weekdays" if weekday in RECURRENCE_DAYS["weekdays"] else "weekends"
+        return ["daily", group, DAYS_OF_WEEK[weekday], moment.date().isoformat()]
+
+    def active_at(self, moment):
+        minute = moment.hour * 60 + moment.minute
+        with self.lock:
+            self._refresh()
+            row = self.connection.execute(
+                f"""
+                SELECT data FROM schedules
+                WHERE {self.ELIGIBLE_TODAY}
+                AND (
+                    (start_minute < end_minute AND start_minute <= ? AND ? < end_minute)
+                    OR (start_minute > end_minute AND (? >= start_minute OR ? < end_minute))
+                )
+                ORDER BY position LIMIT 1
+                """,
+                self._eligible_params(moment) + [minute] * 4,
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def next_after(self, moment):
+        minute = moment.hour * 60 + moment.minute
+        with self.lock:
+            self._refresh()
+            row = self.connection.execute(
+                f"""
+                SELECT data, start_minute <= ?, start_minute FROM schedules
+                WHERE {self.ELIGIBLE_TODAY}
+                ORDER BY start_minute <= ?, start_minute, position LIMIT 1
+                """,
+                [minute] + self._eligible_params(moment) + [minute],
+            ).fetchone()
+        if not row:
+            return None, None
+        data, tomorrow, start = row
+        day = datetime.combine(moment.date(), datetime.min.time())
+        return json.loads(data), day + timedelta(days=tomorrow, minutes=start)
+
+
+class MemoryScheduleStore(ScheduleStore):
+    """Schedule store that keeps its schedules in memory only
+
+    Serves a private copy of data with the same indexes and write
+    operations as the other stores; the schedule simulator replays the
+    scheduler on one without touching the real schedules.
+    """
+
+    def __init__(self, data=None):
+        super().__init__(path="<memory>")
+        self._initial = self._copy(data or self._default_data())
+
+    def _file_signature(self):
+        return "memory"
+
+    def _load_from_disk(self):
+        return self._initial
+
+    def _persist(self, data, records):
+        pass
+
+
+STORAGE_MODES = {
+    "json": ScheduleStore,
+    "journal": JournalScheduleStore,
+    "sqlite": SqliteScheduleStore,
+}
+
+
+def create_schedule_store(path="schedules.json", storage="json", shared=False):
+    """Create the schedule store for the configured storage mode
+
+    shared=True when several processes use the files (see ScheduleStore).
+    """
+    if storage not in STORAGE_MODES:
+        raise ValueError(
+            f"Unknown schedule storage '{storage}'. Must be one of: {', '.join(STORAGE_MODES)}"
+        )
+    return STORAGE_MODES[storage](path, shared=shared)
@@ -83,9 +83,50 @@ class ApiClient {
     }
 }
 
+class EventStream {
+    // Shared Server-Sent Events connection to /api/events; EventSource reconnects by itself
+    constructor(url = '/api/events') {
+        this.url = url;
+        this.source = null;
+        this.handlers = {};
+        this.supported = typeof window.EventSource !== 'undefined';
+    }
+    
+    on(type, handler) {
+        if (!this.handlers[type]) {
+            this.handlers[type] = [];
+            if (this.source) {
+                this.listen(type);
+            }
+        }
+        this.handlers[type].push(handler);
+        this.connect();
+    }
+    
+    connect() {
+        if (this.source || !this.supported) return;
+        this.source = new EventSource(this.url);
+        Object.keys(this.handlers).forEach(type => this.listen(type));
+    }
+    
+    listen(type) {
+        this.source.addEventListener(type, (event) => {
+            let data = null;
+            try {
+                data = JSON.parse(event.data);
+            } catch (error) {
+                console.error(`Invalid ${type} event:`, error);
+                return;
+            }
+            this.handlers[type].forEach(handler => handler(data));
+        });
+    }
+}
+
 // Global instances
 window.notifications = new NotificationManager();
 window.api = new ApiClient();
+window.events = new EventStream();
 
 // Utility functions
 function formatTime(timeString) {
@@ -8,6 +8,10 @@ class SimpleScheduleManager {
         this.currentDate = new Date();
         this.editParameterProcessed = false;
 
+        // Occurrences of the displayed range from /api/timeline, by local date (YYYY-MM-DD)
+        this.timeline = {};
+        this.timelineRequest = 0;
+
         // Wait for DOM
         if (document.readyState === 'loading') {
             document.addEventListener('DOMContentLoaded', () => this.init());
@@ -585,18 +589,29 @@ class SimpleScheduleManager {
             });
         }
         
-        // Also listen for localStorage changes
-        let lastReloadRequest = localStorage.getItem('scheduleReloadRequested') || '0';
-        setInterval(() => {
-            const currentReloadRequest = localStorage.getItem('scheduleReloadRequested') || '0';
-            if (currentReloadRequest !== lastReloadRequest) {
-                console.log('Detected schedule reload request via localStorage');
-                lastReloadRequest = currentReloadRequest;
-                this.loadSchedules().then(() => {
-                    this.renderCalendarView();
-                });
-            }
-        }, 1000);
+        // Reload whenever the server reports a schedule change, from any page or device
+        if (window.events.supported) {
+            let schedulesVersion = null;
+            window.events.on('schedules', (data) => {
+                if (schedulesVersion !== null && data.version !== schedulesVersion) {
+                    console.log('Received schedule change event');
+                    this.loadSchedules().then(() => {
+                        this.renderCalendarView();
+                    });
+                }
+                schedulesVersion = data.version;
+            });
+        } else {
+            // Without EventSource, fall back to reload requests signalled through localStorage
+            window.addEventListener('storage', (event) => {
+                if (event.key === 'scheduleReloadRequested') {
+                    console.log('Detected schedule reload request via localStorage');
+                    this.loadSchedules().then(() => {
+                        this.renderCalendarView();
+                    });
+                }
+            });
+        }
     }
 
     checkForEditParameter() {
@@ -705,8 +720,50 @@ class SimpleScheduleManager {
         this.renderCalendarView();
     }
     
-    renderCalendarView() {
+    getViewRange() {
+        switch (this.currentView) {
+            case 'weekly':
+                return { start: this.getWeekStart(this.currentDate), days: 7 };
+            case 'monthly': {
+                const firstDay = new Date(this.currentDate.getFullYear(), this.currentDate.getMonth(), 1);
+                return { start: this.getWeekStart(firstDay), days: 42 };
+            }
+            default:
+                return { start: this.currentDate, days: 1 };
+        }
+    }
+
+    async loadTimeline() {
+        // The server expands the recurrences; only the latest request may fill the calendar
+        const request = ++this.timelineRequest;
+        const { start, days } = this.getViewRange();
+        try {
+            const response = await fetch(`/api/timeline?start=${this.formatDateKey(start)}&days=${days}`);
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || `HTTP ${response.status}`);
+            }
+            if (request !== this.timelineRequest) return false;
+
+            const timeline = {};
+            (data.intervals || []).forEach(interval => {
+                const day = interval.start.split('T')[0];
+                (timeline[day] = timeline[day] || []).push(interval);
+            });
+            this.timeline = timeline;
+            return true;
+        } catch (error) {
+            console.error('Error loading timeline:', error);
+            window.notifications.error('Failed to load calendar: ' + error.message);
+            if (request !== this.timelineRequest) return false;
+            this.timeline = {};
+            return true;
+        }
+    }
+
+    async renderCalendarView() {
         console.log('Rendering calendar view:', this.currentView);
+        if (!await this.loadTimeline()) return;
         this.updatePeriodText();
         
         // Show appropriate calendar view
@@ -1033,36 +1090,14 @@ class SimpleScheduleManager {
     }
     
     getSchedulesForDate(date) {
-        const dayName = date.toLocaleDateString('en-US', { weekday: 'long' }).toLowerCase();
-        
-        return this.schedules.filter(schedule => {
-            if (!schedule.enabled) return false;
-            
-            const recurrence = schedule.recurrence || 'daily';
-            
-            switch (recurrence) {
-                case 'once':
-                    // One-time schedules show only on their specified date (and only if not executed)
-                    if (schedule.executed) return false;
-                    
-                    if (schedule.schedule_date) {
-                        const scheduleDate = new Date(schedule.schedule_date + 'T00:00:00');
-                        return date.toDateString() === scheduleDate.toDateString();
-                    } else {
-                        // Fallback for old one-time schedules without date
-                        const today = new Date();
-                        return date.toDateString() === today.toDateString();
-                    }
-                case 'daily':
-                    return true;
-                case 'weekdays':
-                    return ['monday', 'tuesday', 'wednesday', 'thursday', 'friday'].includes(dayName);
-                case 'weekends':
-                    return ['saturday', 'sunday'].includes(dayName);
-                default:
-                    return recurrence === dayName;
-            }
-        });
+        // Enabled occurrences starting on this date, expanded by /api/timeline
+        return this.timeline[this.formatDateKey(date)] || [];
+    }
+
+    formatDateKey(date) {
+        const month = (date.getMonth() + 1).toString().padStart(2, '0');
+        const day = date.getDate().toString().padStart(2, '0');
+        return `${date.getFullYear()}-${month}-${day}`;
     }
     
     formatHour(hour) {
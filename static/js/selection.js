@@ -533,7 +533,21 @@ class SelectionController {
     async loadStatus() {
         try {
             const status = await window.api.get('/api/status');
+            this.applyStatus(status);
             
+        } catch (error) {
+            console.error('Error loading status:', error);
+            this.updateStatus('Connection Error', false);
+            
+            // Show helpful error message
+            if (error.message.includes('fetch') || error.message.includes('NetworkError') || error.message.includes('Failed to fetch')) {
+                window.notifications.error('Cannot connect to scent controller. Please start the server by running: python app.py', 8000);
+            }
+        }
+    }
+    
+    applyStatus(status) {
+        try {
             if (status.active_formula && status.active_formula !== 'off') {
                 // Always synchronize with backend - this is the single source of truth
                 this.synchronizeWithBackend(status);
@@ -554,21 +568,29 @@ class SelectionController {
             }
             
         } catch (error) {
-            console.error('Error loading status:', error);
-            this.updateStatus('Connection Error', false);
-            
-            // Show helpful error message
-            if (error.message.includes('fetch') || error.message.includes('NetworkError') || error.message.includes('Failed to fetch')) {
-                window.notifications.error('Cannot connect to scent controller. Please start the server by running: python app.py', 8000);
-            }
+            console.error('Error applying status:', error);
         }
     }
     
-    // Auto-refresh status every 30 seconds
+    // Follow status changes pushed by the server (poll every 30 seconds without EventSource)
     startStatusPolling() {
-        setInterval(() => {
-            this.loadStatus();
-        }, 30000);
+        if (!window.events.supported) {
+            setInterval(() => {
+                this.loadStatus();
+            }, 30000);
+            return;
+        }
+        
+        window.events.on('status', (status) => this.applyStatus(status));
+        
+        // Schedule edits change the schedule info shown under the formulas
+        let schedulesVersion = null;
+        window.events.on('schedules', (data) => {
+            if (schedulesVersion !== null && data.version !== schedulesVersion) {
+                this.showScheduleInfo();
+            }
+            schedulesVersion = data.version;
+        });
     }
     
     // Progress Circle Methods
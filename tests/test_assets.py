@@ -0,0 +1,52 @@
+import pytest
+
+from assets import minify_css, minify_js
+
+
+def test_leading_block_comment_keeps_the_code_after_it():
+    assert minify_js("/* a */ var x = 1;\nvar y = 2;") == "var x = 1;\nvar y = 2;"
+
+
+def test_block_comment_spanning_lines_is_dropped_entirely():
+    text = "var z = 1; /* start\nvar hidden = 2;\n*/\nvar w = 3;"
+    assert minify_js(text) == "var z = 1;\nvar w = 3;"
+
+
+def test_backtick_in_a_string_does_not_open_a_template():
+    text = 'var s = "`";\n    var t = 1;\n'
+    assert minify_js(text) == 'var s = "`";\nvar t = 1;'
+
+
+def test_comment_markers_inside_literals_are_kept():
+    text = "var a = '/* no */';\nvar b = \"// no\";\nvar c = /\\/\\/ no/;\n"
+    assert minify_js(text) == text.strip()
+
+
+def test_template_literal_is_kept_verbatim():
+    text = "var html = `\n    <div>\n        ${items.map(i => `<p>${i}</p>`).join('')}\n    </div>`;\n    done();"
+    assert minify_js(text) == text.replace("\n    done();", "\ndone();")
+
+
+def test_regex_and_division_are_told_apart():
+    text = "var r = /[/]\\//g.test(s);\nvar q = a / b / c;\nvar n = i++ / 2;"
+    assert minify_js(text) == text
+
+
+def test_indentation_blank_lines_and_line_comments_are_dropped():
+    text = "function f() {\n    // note\n\n    return 1;  // trailing\n}\n"
+    assert minify_js(text) == "function f() {\nreturn 1;\n}"
+
+
+def test_newlines_are_kept_for_semicolon_insertion():
+    assert minify_js("var a = 1\n\n  var b = 2") == "var a = 1\nvar b = 2"
+
+
+@pytest.mark.parametrize("text", ["var s = 'open;", "/* open", "var t = `open", "var r = /open"])
+def test_unterminated_input_raises(text):
+    with pytest.raises(ValueError):
+        minify_js(text)
+
+
+def test_css_keeps_strings_and_drops_comments():
+    text = 'a { content: "x /* y */ ;" } /* c */\n b  >  c { color: red; }'
+    assert minify_css(text) == 'a{content:"x /* y */ ;"}b>c{color:red}'
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from quiz_stats import OTHER_ANSWER, QuizStats
+
+SCENTS = ("red", "blue", "yellow")
+
+
+@pytest.fixture
+def make_stats(tmp_path):
+    return lambda **options: QuizStats(
+        SCENTS, str(tmp_path / "quiz.log"), str(tmp_path / "quiz_counters.json"), **options
+    )
+
+
+def test_record_counts_recommendations_and_answers(make_stats, tmp_path):
+    stats = make_stats()
+    stats.record(["red", "blue"], "red")
+    stats.record(["red", "purple"], "red")
+    stats.record(["yellow", "blue", "blue"], "blue")
+
+    result = stats.stats()
+    assert result["submissions"] == 3
+    assert result["recommended"]["red"] == {"count": 2, "percent": 66.7}
+    assert result["recommended"]["yellow"] == {"count": 0, "percent": 0.0}
+    first, second, third = result["questions"]
+    assert first["red"]["count"] == 2 and first["yellow"]["count"] == 1
+    assert second[OTHER_ANSWER] == {"count": 1, "percent": 33.3}
+    assert third["blue"] == {"count": 1, "percent": 100.0}
+
+    with open(tmp_path / "quiz.log") as f:
+        lines = [json.loads(line) for line in f]
+    assert [line[1:] for line in lines] == [
+        ["red", ["red", "blue"]], ["red", ["red", OTHER_ANSWER]], ["blue", ["yellow", "blue", "blue"]],
+    ]
+
+
+def test_a_restart_reloads_the_saved_counters(make_stats):
+    stats = make_stats()
+    stats.record(["red", "blue"], "red")
+    stats.record(["blue"], "blue")
+
+    restarted = make_stats()
+    assert restarted.stats() == stats.stats()
+    restarted.record(["yellow"], "yellow")
+    assert restarted.stats()["submissions"] == 3
+    # The first instance picks up the newer file
+    assert stats.stats() == restarted.stats()
+
+
+def test_shared_instances_add_to_each_others_counts(make_stats):
+    first, second = make_stats(shared=True), make_stats(shared=True)
+    first.record(["red"], "red")
+    second.record(["blue"], "blue")
+    first.record(["red"], "red")
+
+    assert first.stats() == second.stats()
+    assert first.stats()["recommended"]["red"]["count"] == 2
+
+
+def test_a_failed_save_leaves_the_counters_unchanged(make_stats, monkeypatch):
+    stats = make_stats()
+    stats.record(["red"], "red")
+    before = stats.stats()
+
+    def fail(counters):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(stats, "_save", fail)
+    with pytest.raises(OSError):
+        stats.record(["blue", "blue"], "blue")
+    assert stats.stats() == before
+    monkeypatch.undo()
+
+    # The next submission counts from the saved state, not the failed one
+    stats.record(["yellow"], "yellow")
+    result = stats.stats()
+    assert result["submissions"] == 2
+    assert result["recommended"]["blue"]["count"] == 0
+    assert len(result["questions"]) == 1
+    assert make_stats().stats() == result
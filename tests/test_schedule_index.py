@@ -0,0 +1,171 @@
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import app
+from clock import VirtualClock
+from schedule_index import ActiveScheduleIndex, OverlapIndex
+from schedule_model import compile_schedules
+
+RECURRENCES = [
+    "daily", "weekdays", "weekends", "monday", "tuesday", "wednesday",
+    "thursday", "friday", "saturday", "sunday", "once",
+]
+
+# 2024-06-03 is a Monday; the moments cover that week and the turn into the next
+WEEK_START = datetime(2024, 6, 3)
+
+
+def hhmm(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def random_schedules(rng, count):
+    """Schedules with overnight windows, one-time dates, disabled/paused/executed ones and ties"""
+    schedules = []
+    for schedule_id in range(1, count + 1):
+        # Coarse times, so windows share boundaries and first-listed-wins is exercised
+        start = rng.randrange(0, 24 * 60, 30)
+        end = rng.choice([(start + rng.randrange(30, 600, 30)) % (24 * 60), rng.randrange(0, 24 * 60, 30)])
+        schedule = {
+            "id": schedule_id,
+            "start_time": hhmm(start),
+            "end_time": hhmm(end),
+            "formula": rng.choice(["red", "blue", "yellow", "green"]),
+            "recurrence": rng.choice(RECURRENCES),
+            "enabled": rng.random() < 0.85,
+        }
+        if schedule["recurrence"] == "once":
+            if rng.random() < 0.8:
+                day = WEEK_START.date() + timedelta(days=rng.randrange(-1, 9))
+                schedule["schedule_date"] = day.isoformat()
+            schedule["executed"] = rng.random() < 0.2
+        if rng.random() < 0.05:
+            schedule["paused"] = True
+        schedules.append(schedule)
+    return {"schedules": schedules}
+
+
+# The linear scan checks the recurrence against the system clock; tests swap in a virtual one
+should_activate_schedule = app.should_activate_schedule
+
+
+def linear_active_at(data, moment, monkeypatch):
+    """app.find_active_schedule_for_time, with its recurrence check reading moment's date"""
+    clock = VirtualClock(moment)
+    monkeypatch.setattr(app, "should_activate_schedule", lambda schedule: should_activate_schedule(schedule, clock))
+    return app.find_active_schedule_for_time(data, moment.strftime("%H:%M"))
+
+
+def sample_moments(rng, count):
+    moments = [WEEK_START + timedelta(minutes=rng.randrange(8 * 24 * 60)) for _ in range(count)]
+    # Around midnight and the week boundary
+    moments += [WEEK_START + timedelta(days=day, minutes=offset) for day in (0, 6, 7) for offset in (-1, 0, 29, 30)]
+    return moments
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_active_index_matches_the_linear_scan(seed, monkeypatch):
+    rng = random.Random(seed)
+    data = random_schedules(rng, rng.randrange(1, 40))
+    index = ActiveScheduleIndex(compile_schedules(data))
+
+    for moment in sample_moments(rng, 200):
+        expected = linear_active_at(data, moment, monkeypatch)
+        found = index.active_at(moment)
+        assert (found.data if found else None) is expected, moment
+
+
+def test_first_listed_schedule_wins_a_tie():
+    data = {"schedules": [
+        {"id": 7, "start_time": "09:00", "end_time": "11:00", "recurrence": "weekdays", "enabled": True},
+        {"id": 3, "start_time": "08:00", "end_time": "12:00", "recurrence": "daily", "enabled": True},
+        {"id": 5, "start_time": "09:30", "end_time": "10:00", "recurrence": "once",
+         "schedule_date": "2024-06-03", "enabled": True},
+    ]}
+    index = ActiveScheduleIndex(compile_schedules(data))
+    assert index.active_at(datetime(2024, 6, 3, 9, 45)).id == 7  # Monday
+    assert index.active_at(datetime(2024, 6, 8, 9, 45)).id == 3  # Saturday
+    assert index.active_at(datetime(2024, 6, 3, 8, 30)).id == 3
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_next_change_is_never_late(seed):
+    rng = random.Random(seed)
+    data = random_schedules(rng, rng.randrange(0, 25))
+    index = ActiveScheduleIndex(compile_schedules(data))
+
+    for moment in sample_moments(rng, 20):
+        change = index.next_change_after(moment)
+        current = index.active_at(moment)
+        # Walk minute by minute for up to eight days: the first real change
+        probe = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        while probe < moment + timedelta(days=8) and index.active_at(probe) is current:
+            probe += timedelta(minutes=1)
+        if probe >= moment + timedelta(days=8):
+            assert change is None or change > moment
+            continue
+        assert change is not None and moment < change <= probe, (moment, change, probe)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_next_start_matches_a_scan_of_todays_schedules(seed):
+    rng = random.Random(seed)
+    data = random_schedules(rng, rng.randrange(0, 25))
+    schedules = compile_schedules(data)
+    index = ActiveScheduleIndex(schedules)
+
+    for moment in sample_moments(rng, 50):
+        minute = moment.hour * 60 + moment.minute
+        candidates = [
+            (0 if schedule.start > minute else 1, schedule.start, position)
+            for position, schedule in enumerate(schedules)
+            if schedule.runs_on(moment)
+        ]
+        schedule, start = index.next_after(moment)
+        if not candidates:
+            assert (schedule, start) == (None, None)
+            continue
+        tomorrow, start_minute, position = min(candidates)
+        assert schedule is schedules[position], moment
+        assert start == datetime.combine(moment.date(), datetime.min.time()) + timedelta(
+            days=tomorrow, minutes=start_minute
+        )
+
+
+def test_next_change_crosses_the_week_boundary():
+    data = {"schedules": [
+        {"id": 1, "start_time": "08:00", "end_time": "09:00", "recurrence": "monday", "enabled": True},
+    ]}
+    index = ActiveScheduleIndex(compile_schedules(data))
+    # Sunday evening: the next change is Monday 08:00 of the following week
+    assert index.next_change_after(datetime(2024, 6, 9, 22, 0)) == datetime(2024, 6, 10, 8, 0)
+    assert index.next_change_after(datetime(2024, 6, 3, 8, 30)) == datetime(2024, 6, 3, 9, 0)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_overlap_index_matches_the_linear_scan(seed):
+    rng = random.Random(seed)
+    existing = random_schedules(rng, rng.randrange(0, 40))["schedules"]
+    index = OverlapIndex(compile_schedules({"schedules": existing}))
+
+    for query in random_schedules(rng, 30)["schedules"]:
+        exclude_id = rng.choice([None, rng.randrange(1, 41)])
+        expected = app.find_overlapping_schedules(query, existing, exclude_id)
+        assert index.overlapping(query, exclude_id) == expected, query
+
+
+def test_compile_schedules_parses_every_field():
+    schedule, once, broken = compile_schedules({"schedules": [
+        {"id": 1, "start_time": "22:30", "end_time": "1:15", "recurrence": "weekends", "enabled": True},
+        {"id": 2, "start_time": "09:00", "end_time": "10:00", "recurrence": "once",
+         "schedule_date": "2024-06-05", "executed": True, "enabled": True},
+        {"id": 3, "start_time": "25:00", "end_time": "10:00", "recurrence": "sometimes"},
+    ]})
+    assert (schedule.start, schedule.end, schedule.days) == (22 * 60 + 30, 75, 0b1100000)
+    assert schedule.eligible and schedule.runs_on(date(2024, 6, 8)) and not schedule.runs_on(date(2024, 6, 7))
+    assert schedule.contains(23 * 60) and schedule.contains(60) and not schedule.contains(75)
+    assert (once.once, once.days, once.date) == (True, 0, date(2024, 6, 5).toordinal())
+    assert not once.eligible
+    assert (broken.start, broken.days, broken.eligible) == (None, 0, False)
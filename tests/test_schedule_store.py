@@ -0,0 +1,204 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from schedule_store import (
+    STORAGE_MODES,
+    JournalScheduleStore,
+    MemoryScheduleStore,
+    create_schedule_store,
+)
+
+
+def schedule(start="09:00", end="10:00", formula="red", **fields):
+    return {
+        "start_time": start,
+        "end_time": end,
+        "formula": formula,
+        "cycle_time": 60,
+        "duration": 10,
+        "recurrence": "daily",
+        "enabled": True,
+        **fields,
+    }
+
+
+def write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def write_journal(path, records):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture(params=[(storage, shared) for storage in STORAGE_MODES for shared in (False, True)],
+                ids=lambda p: f"{p[0]}{'-shared' if p[1] else ''}")
+def make_store(request, tmp_path):
+    storage, shared = request.param
+    path = str(tmp_path / "schedules.json")
+    return lambda: create_schedule_store(path, storage, shared=shared)
+
+
+def test_changes_round_trip_through_a_new_store(make_store):
+    store = make_store()
+    first = store.insert(schedule())
+    second, third = store.insert_many([schedule("11:00", "12:00", "blue"), schedule("13:00", "14:00")])
+    assert (first["id"], second["id"], third["id"]) == (1, 2, 3)
+    assert store.update(2, {"formula": "green"}, remove=("enabled",))["formula"] == "green"
+    assert store.update(99, {"formula": "green"}) is None
+    assert store.delete(1)
+    assert not store.delete(1)
+    expected = store.load()
+
+    reopened = make_store()
+    assert reopened.load() == expected
+    assert [s["id"] for s in reopened.load()["schedules"]] == [2, 3]
+    assert "enabled" not in reopened.get(2)
+
+
+def test_save_replaces_the_document(make_store):
+    store = make_store()
+    store.insert_many([schedule(), schedule("11:00", "12:00")])
+    data = store.load()
+    # Reordered: only a full replacement can express this
+    data["schedules"].reverse()
+    data["schedules"][0]["formula"] = "yellow"
+    store.save(data)
+
+    assert make_store().load() == data
+
+
+def test_version_and_listeners_follow_every_change(make_store):
+    store = make_store()
+    version = store.current_version()
+    calls = []
+    store.add_listener(lambda: calls.append(store.version))
+
+    store.insert(schedule())
+    store.update(1, {"duration": 20})
+    store.update(1, {"duration": 20})  # No change, no notification
+    store.delete(1)
+    assert store.current_version() == version + 3
+    assert calls == [version + 1, version + 2, version + 3]
+
+
+def test_a_write_by_another_store_is_picked_up(make_store):
+    store = make_store()
+    store.insert(schedule())
+    version = store.current_version()
+    calls = []
+    store.add_listener(lambda: calls.append(True))
+
+    make_store().update(1, {"formula": "blue"})
+
+    assert store.get(1)["formula"] == "blue"
+    assert store.version > version
+    assert calls
+
+
+def test_memory_store_never_touches_the_input():
+    data = {"schedules": [dict(schedule(), id=1)]}
+    store = MemoryScheduleStore(data)
+    store.update(1, {"formula": "blue"})
+    store.insert(schedule())
+    assert data == {"schedules": [dict(schedule(), id=1)]}
+    assert [s["formula"] for s in store.load()["schedules"]] == ["blue", "red"]
+
+
+def test_journal_replays_records_and_batches_in_order(tmp_path):
+    path = tmp_path / "schedules.json"
+    write_json(path, {"schedules": [dict(schedule(), id=1), dict(schedule("11:00", "12:00"), id=2)]})
+    write_journal(tmp_path / "schedules.journal", [
+        {"op": "upsert", "schedule": dict(schedule(formula="blue"), id=1)},
+        {"op": "batch", "records": [
+            {"op": "delete", "id": 2},
+            {"op": "upsert", "schedule": dict(schedule("15:00", "16:00"), id=3)},
+        ]},
+    ])
+
+    store = JournalScheduleStore(str(path))
+    assert [(s["id"], s["formula"]) for s in store.load()["schedules"]] == [(1, "blue"), (3, "red")]
+
+
+def test_journal_replays_an_interrupted_compaction_before_the_new_journal(tmp_path):
+    # Cut after the journal was moved aside but before the snapshot was rewritten
+    path = tmp_path / "schedules.json"
+    write_json(path, {"schedules": [dict(schedule(), id=1)]})
+    write_journal(tmp_path / "schedules.journal.compacting", [
+        {"op": "upsert", "schedule": dict(schedule(formula="blue"), id=1)},
+        {"op": "upsert", "schedule": dict(schedule("11:00", "12:00"), id=2)},
+    ])
+    write_journal(tmp_path / "schedules.journal", [
+        {"op": "upsert", "schedule": dict(schedule(formula="green"), id=1)},
+    ])
+
+    store = JournalScheduleStore(str(path))
+    expected = [(1, "green"), (2, "red")]
+    assert [(s["id"], s["formula"]) for s in store.load()["schedules"]] == expected
+
+    # The next compaction keeps both journals' records and removes them
+    store.compact()
+    assert not (tmp_path / "schedules.journal").exists()
+    assert not (tmp_path / "schedules.journal.compacting").exists()
+    assert [(s["id"], s["formula"]) for s in JournalScheduleStore(str(path)).load()["schedules"]] == expected
+
+
+def test_journal_drops_a_torn_last_record(tmp_path):
+    path = tmp_path / "schedules.json"
+    write_json(path, {"schedules": []})
+    journal = tmp_path / "schedules.journal"
+    write_journal(journal, [{"op": "upsert", "schedule": dict(schedule(), id=1)}])
+    with open(journal, "a") as f:
+        f.write('{"op": "batch", "records": [{"op": "delete", "id"')
+
+    store = JournalScheduleStore(str(path))
+    assert [s["id"] for s in store.load()["schedules"]] == [1]
+    # Cut off, so the next append starts on a clean line
+    store.insert(schedule("11:00", "12:00"))
+    assert [s["id"] for s in JournalScheduleStore(str(path)).load()["schedules"]] == [1, 2]
+
+
+def test_journal_compacts_past_the_threshold(tmp_path):
+    path = str(tmp_path / "schedules.json")
+    store = JournalScheduleStore(path, compact_after=3)
+    for hour in range(9, 13):
+        store.insert(schedule(f"{hour}:00", f"{hour}:30"))
+    store._compaction_thread.join(timeout=5)
+
+    with open(path) as f:
+        assert len(json.load(f)["schedules"]) >= 3
+    assert JournalScheduleStore(path).load() == store.load()
+
+
+def test_sqlite_migrates_the_json_file_once(tmp_path):
+    path = tmp_path / "schedules.json"
+    write_json(path, {"schedules": [dict(schedule(), id=1)], "note": "kept"})
+    store = create_schedule_store(str(path), "sqlite")
+    assert store.load() == {"schedules": [dict(schedule(), id=1)], "note": "kept"}
+
+    # Later edits of the JSON file are not imported again
+    write_json(path, {"schedules": []})
+    store.insert(schedule("11:00", "12:00"))
+    assert [s["id"] for s in create_schedule_store(str(path), "sqlite").load()["schedules"]] == [1, 2]
+
+
+def test_sqlite_queries_match_the_in_memory_index(tmp_path):
+    schedules = [
+        dict(schedule("22:00", "02:00", "blue"), id=1),
+        dict(schedule("09:00", "10:00", recurrence="weekends"), id=2),
+        dict(schedule("09:30", "11:00", "green"), id=3),
+        dict(schedule("12:00", "13:00", "yellow", enabled=False), id=4),
+    ]
+    write_json(tmp_path / "schedules.json", {"schedules": schedules})
+    sqlite_store = create_schedule_store(str(tmp_path / "schedules.json"), "sqlite")
+    memory_store = MemoryScheduleStore({"schedules": schedules})
+
+    for day in range(3, 10):  # 2024-06-03 is a Monday
+        for hour in range(24):
+            moment = datetime(2024, 6, day, hour, 45)
+            assert sqlite_store.active_at(moment) == memory_store.active_at(moment), moment
+            assert sqlite_store.next_after(moment) == memory_store.next_after(moment), moment
@@ -0,0 +1,115 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from schedule_index import ActiveScheduleIndex
+from schedule_model import compile_schedules
+from timeline import TimelineCache, TimelineIndex
+
+RECURRENCES = ["daily", "weekdays", "weekends", "monday", "friday", "sunday", "once"]
+
+# 2024-06-03 is a Monday
+WEEK_START = datetime(2024, 6, 3)
+
+
+def hhmm(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def random_schedules(rng, count):
+    """Schedules with overnight windows, one-time dates (and none), disabled and paused ones"""
+    schedules = []
+    for schedule_id in range(1, count + 1):
+        start = rng.randrange(0, 24 * 60, 30)
+        end = rng.randrange(0, 24 * 60, 30)
+        schedule = {
+            "id": schedule_id,
+            "start_time": hhmm(start),
+            "end_time": hhmm(end),
+            "formula": rng.choice(["red", "blue", "yellow"]),
+            "recurrence": rng.choice(RECURRENCES),
+            "enabled": rng.random() < 0.85,
+            "paused": rng.random() < 0.1,
+        }
+        if schedule["recurrence"] == "once" and rng.random() < 0.7:
+            schedule["schedule_date"] = (WEEK_START.date() + timedelta(days=rng.randrange(8))).isoformat()
+        schedules.append(schedule)
+    return {"schedules": schedules}
+
+
+def spans(intervals):
+    return [(i["id"], i["start"][11:16], i["end"][11:16], i["start"][:10]) for i in intervals]
+
+
+def test_an_overnight_window_wraps_within_its_day():
+    index = TimelineIndex(compile_schedules({"schedules": [
+        {"id": 1, "start_time": "23:00", "end_time": "01:00", "recurrence": "monday", "enabled": True},
+        {"id": 2, "start_time": "00:30", "end_time": "02:00", "recurrence": "tuesday", "enabled": True},
+    ]}))
+    intervals = index.expand(WEEK_START.date(), 2, WEEK_START.date())
+
+    # Monday's window covers both ends of Monday; nothing spills into Tuesday
+    assert spans(intervals) == [
+        (1, "00:00", "01:00", "2024-06-03"),
+        (1, "23:00", "00:00", "2024-06-03"),
+        (2, "00:30", "02:00", "2024-06-04"),
+    ]
+    assert intervals[1]["end"] == "2024-06-04T00:00:00"
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_timeline_shows_what_the_scheduler_runs(seed):
+    rng = random.Random(seed)
+    schedules = compile_schedules(random_schedules(rng, rng.randrange(1, 20)))
+    timeline = TimelineIndex(schedules)
+    scheduler = ActiveScheduleIndex(schedules)
+
+    for offset in range(8):
+        day = (WEEK_START + timedelta(days=offset)).date()
+        # Dateless one-time schedules run on any day and show on the current one
+        intervals = [
+            (datetime.fromisoformat(i["start"]), datetime.fromisoformat(i["end"]), i["id"])
+            for i in timeline.expand(day, 1, day)
+            if not i["paused"]
+        ]
+        for minute in range(0, 24 * 60, 15):
+            moment = datetime.combine(day, datetime.min.time()) + timedelta(minutes=minute)
+            shown = {schedule_id for begins, ends, schedule_id in intervals if begins <= moment < ends}
+            running = {schedule.id for schedule in schedules if schedule.active_at(moment)}
+            assert shown == running, moment
+            active = scheduler.active_at(moment)
+            assert (active.id if active else None) in (shown or {None})
+
+
+def test_intervals_come_by_start_time_and_pauses_run_out():
+    index = TimelineIndex(
+        compile_schedules({"schedules": [
+            {"id": 1, "start_time": "12:00", "end_time": "13:00", "recurrence": "daily",
+             "enabled": True, "paused": True},
+            {"id": 2, "start_time": "22:00", "end_time": "06:00", "recurrence": "daily", "enabled": True},
+        ]}),
+        pause_expires_at=lambda data: WEEK_START + timedelta(days=1),
+    )
+    intervals = index.expand(WEEK_START.date(), 2, WEEK_START.date())
+
+    assert [(i["id"], i["start"]) for i in intervals] == [
+        (2, "2024-06-03T00:00:00"), (1, "2024-06-03T12:00:00"), (2, "2024-06-03T22:00:00"),
+        (2, "2024-06-04T00:00:00"), (1, "2024-06-04T12:00:00"), (2, "2024-06-04T22:00:00"),
+    ]
+    assert [i["paused"] for i in intervals if i["id"] == 1] == [True, False]
+
+
+def test_cache_builds_each_range_once():
+    cache = TimelineCache(size=2)
+    builds = []
+
+    def build(key):
+        return lambda: builds.append(key) or key
+
+    assert cache.get("a", build("a")) == "a"
+    assert cache.get("a", build("a")) == "a"
+    cache.get("b", build("b"))
+    cache.get("c", build("c"))  # Drops "a", the least recently used
+    cache.get("a", build("a"))
+    assert builds == ["a", "b", "c", "a"]
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+from gpio_backends import RecordingBackend
+from timing_engine import TimingEngine
+
+PIN = 18
+# Short cycles keep the tests quick; edges must land within TOLERANCE of their deadline
+PERIOD = 0.1
+DURATION = 0.03
+TOLERANCE = 0.03
+
+
+@pytest.fixture
+def gpio():
+    return RecordingBackend()
+
+
+@pytest.fixture
+def engine(gpio):
+    return TimingEngine(gpio)
+
+
+def rises(gpio, anchor):
+    """Seconds from anchor to every rising edge of PIN"""
+    return [rise / 1e9 - anchor for rise, _ in gpio.pulses(PIN)]
+
+
+def wait_for(event):
+    assert event.wait(timeout=5), "timed out"
+
+
+def test_edges_follow_the_anchor(engine, gpio):
+    anchor = engine.start(PIN, PERIOD, DURATION)
+    time.sleep(3.5 * PERIOD)
+    engine.stop(PIN)
+
+    pulses = gpio.pulses(PIN)
+    assert len(pulses) == 4
+    for cycle, (rise, fall) in enumerate(pulses):
+        assert rise / 1e9 - anchor == pytest.approx(cycle * PERIOD, abs=TOLERANCE)
+        assert (fall - rise) / 1e9 == pytest.approx(DURATION, abs=TOLERANCE)
+    assert gpio.level(PIN) == gpio.LOW
+    assert engine.active_pins() == []
+
+
+def test_edges_of_a_replaced_activation_are_stale(engine, gpio):
+    engine.start(PIN, PERIOD, DURATION)
+    time.sleep(DURATION / 3)
+    # Replaced while HIGH: the first activation's LOW edge must not end the new, longer pulse
+    anchor = engine.start(PIN, 1.0, 0.5)
+    time.sleep(3 * PERIOD)
+    assert gpio.level(PIN) == gpio.HIGH
+
+    engine.stop(PIN)
+    edges = len(gpio.edges(PIN))
+    time.sleep(2 * PERIOD)
+    assert len(gpio.edges(PIN)) == edges  # Nothing fires after stop
+    assert rises(gpio, anchor)[-1] < 0  # The pin stayed HIGH from the first activation on
+
+
+def test_timed_activation_ends_on_a_cycle_boundary(engine, gpio):
+    finished = threading.Event()
+    anchor = engine.start(PIN, PERIOD, DURATION, run_for=2.5 * PERIOD, on_finish=finished.set)
+    wait_for(finished)
+
+    # Cycles at 0, 1 and 2 periods; the boundary at 3 periods is past run_for and ends it
+    assert len(rises(gpio, anchor)) == 3
+    assert time.monotonic() - anchor == pytest.approx(3 * PERIOD, abs=TOLERANCE)
+    assert engine.active_pins() == []
+    assert gpio.level(PIN) == gpio.LOW
+
+
+def test_may_finish_postpones_the_end_by_whole_cycles(engine, gpio):
+    answers = iter([False, False, True])
+    finished = threading.Event()
+    anchor = engine.start(
+        PIN, PERIOD, DURATION, run_for=1.5 * PERIOD,
+        may_finish=lambda: next(answers), on_finish=finished.set,
+    )
+    wait_for(finished)
+
+    # Asked at 2 and 3 periods (no), ends at 4
+    assert len(rises(gpio, anchor)) == 4
+    assert time.monotonic() - anchor == pytest.approx(4 * PERIOD, abs=TOLERANCE)
+
+
+def test_an_anchor_in_the_past_resumes_in_phase(engine, gpio):
+    finished = threading.Event()
+    past = time.monotonic() - 2.5 * PERIOD
+    anchor = engine.start(PIN, PERIOD, DURATION, run_for=4.5 * PERIOD, anchor=past, on_finish=finished.set)
+    assert anchor == past
+    wait_for(finished)
+
+    # Picks up at the next boundary (3 periods) and run_for still counts from the anchor
+    assert rises(gpio, anchor) == [
+        pytest.approx(3 * PERIOD, abs=TOLERANCE),
+        pytest.approx(4 * PERIOD, abs=TOLERANCE),
+    ]
+
+
+def test_a_stall_skips_the_missed_cycles(engine, gpio):
+    anchor = engine.start(PIN, PERIOD, DURATION)
+    time.sleep(DURATION / 3)
+    # Hold the engine lock across the LOW edge and several cycles
+    with engine._condition:
+        time.sleep(4.5 * PERIOD)
+    time.sleep(PERIOD)
+    engine.stop(PIN)
+
+    # Released at 4.5 periods: cycles 1 to 4 are skipped, the next pulse is on time at 5
+    assert engine.skipped_cycles == 4
+    assert engine.get_stats()["skipped_cycles"] == 4
+    times = rises(gpio, anchor)
+    assert len(times) == 2
+    assert times[1] == pytest.approx(5 * PERIOD, abs=TOLERANCE)
+
+
+def test_edge_listeners_and_pin_stats_see_every_level_change(engine, gpio):
+    levels = []
+    engine.add_edge_listener(lambda pin, level, moment: levels.append((pin, level)))
+    finished = threading.Event()
+    engine.start(PIN, PERIOD, DURATION, run_for=1.5 * PERIOD, on_finish=finished.set)
+    wait_for(finished)
+
+    assert levels == [(PIN, 1), (PIN, 0)] * 2
+    stats = engine.pin_stats()[PIN]
+    assert stats["edges"] == 4
+    assert stats["on_seconds"] == pytest.approx(2 * DURATION, abs=TOLERANCE)
@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+
+class TimelineIndex:
+    """Schedules grouped by the days they occur on, for expanding a date range into intervals
+
+    Built once per schedules version from the compiled Schedule list. Holds
+    everything the calendar shows: enabled schedules with a valid window,
+    paused ones included, one-time schedules until they have run.
+    pause_expires_at(data) tells when a pause runs out (None: never), so
+    only the occurrences before that are reported as paused.
+    """
+
+    def __init__(self, schedules, pause_expires_at=None):
+        # Recurring schedules per weekday, and one-time schedules per date ordinal
+        # (0: one-time schedules without a date, shown on the current day)
+        self.weekdays = [[] for _ in range(7)]
+        self.dates = {}
+        self.pause_expiry = {}
+
+        for schedule in sorted(
+            (s for s in schedules if self._shown(s)), key=lambda s: s.start
+        ):
+            if schedule.once:
+                self.dates.setdefault(schedule.date, []).append(schedule)
+            else:
+                for day in range(7):
+                    if schedule.days >> day & 1:
+                        self.weekdays[day].append(schedule)
+            if schedule.paused and pause_expires_at is not None:
+                self.pause_expiry[id(schedule)] = pause_expires_at(schedule.data)
+
+    @staticmethod
+    def _shown(schedule):
+        return (
+            schedule.enabled
+            and not (schedule.once and schedule.executed)
+            and schedule.start is not None
+            and schedule.end is not None
+            and schedule.start != schedule.end
+            and schedule.date != -1
+        )
+
+    def on(self, day, today):
+        """Schedules occurring on a date, by start time"""
+        recurring = self.weekdays[day.weekday()]
+        once = self.dates.get(day.toordinal(), [])
+        if day == today:
+            once = once + self.dates.get(0, [])
+        if not once:
+            return recurring
+        return sorted(recurring + once, key=lambda s: s.start)
+
+    def expand(self, start, days, today):
+        """Intervals of the schedules on the days from start (a date), by start time
+
+        Each day is expanded from the schedule's minute ranges, the same ones
+        the scheduler runs: an overnight window like 23:00-01:00 wraps within
+        its day, giving 00:00-01:00 and 23:00-24:00 on every day it occurs.
+        """
+        range_start = datetime.combine(start, datetime.min.time())
+        intervals = []
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            midnight = range_start + timedelta(days=offset)
+            occurrences = [
+                (range_begin, range_end, schedule)
+                for schedule in self.on(day, today)
+                for range_begin, range_end in schedule.overlap_ranges()
+            ]
+            occurrences.sort(key=lambda occurrence: occurrence[0])
+            for range_begin, range_end, schedule in occurrences:
+                begins = midnight + timedelta(minutes=range_begin)
+                ends = midnight + timedelta(minutes=range_end)
+                paused = schedule.paused
+                if paused:
+                    expiry = self.pause_expiry.get(id(schedule))
+                    paused = expiry is None or begins < expiry
+                data = schedule.data
+                intervals.append(
+                    {
+                        "id": schedule.id,
+                        "formula": data.get("formula"),
+                        "start": begins.isoformat(),
+                        "end": ends.isoformat(),
+                        "start_time": data.get("start_time"),
+                        "end_time": data.get("end_time"),
+                        "cycle_time": data.get("cycle_time", 60),
+                        "duration": data.get("duration", 10),
+                        "recurrence": data.get("recurrence", "daily"),
+                        "paused": paused,
+                    }
+                )
+        return intervals
+
+
+class TimelineCache:
+    """Rendered timelines by range, least recently used dropped past size
+
+    Make one per schedules version (ScheduleStore.cached does that), so
+    a schedule change starts over with an empty cache.
+    """
+
+    def __init__(self, size=32):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        """Return the cached value for key, calling build() on a miss"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+        # Built outside the lock; two requests for a new range may both build it
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
@@ -0,0 +1,289 @@
+import bisect
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+
+# Upper bounds (milliseconds) of the edge lateness histogram buckets
+LATENESS_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500)
+
+
+class TimingEngine:
+    """One long-lived thread that drives the on/off edges of every GPIO channel
+
+    Activations and deactivations are posted as commands: they update the
+    channel table and push the next edge deadline onto a heap under the engine
+    lock, then nudge the engine thread. Switching formulas therefore never
+    starts or joins a thread, and any number of channels can cycle at once on
+    the same thread. Every edge carries the generation of the activation that
+    scheduled it; edges left over from a superseded activation are dropped
+    when they come due, so a stale cycle can never toggle a pin.
+    """
+
+    HIGH_EDGE = "high"
+    LOW_EDGE = "low"
+
+    def __init__(self, gpio):
+        self.gpio = gpio
+        self.logger = logging.getLogger(__name__)
+
+        self._condition = threading.Condition()
+        self._heap = []  # (deadline, sequence, pin, generation, edge)
+        self._sequence = itertools.count()
+        self._generations = itertools.count(1)
+        self._channels = {}  # pin -> state of the activation currently driving it
+
+        # Edge timing statistics
+        self.edges = 0
+        self.skipped_cycles = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+        self.lateness_histogram = [0] * (len(LATENESS_BUCKETS_MS) + 1)
+        # pin -> [level changes, seconds spent HIGH, monotonic time it went HIGH or None]
+        self._pins = {}
+        # Called as listener(pin, level, monotonic time) on every level change, under the engine lock
+        self._edge_listeners = []
+
+        self._thread = threading.Thread(target=self._run, name="gpio-timing", daemon=True)
+        self._thread.start()
+
+    def start(self, pin, cycle_time, duration, run_for=None, may_finish=None, on_finish=None, anchor=None):
+        """Start cycling pin: HIGH for duration seconds at the top of every cycle_time
+
+        With run_for set, the activation ends at the first cycle boundary after
+        run_for seconds as long as may_finish() (if given) agrees; on_finish()
+        is then called from the engine thread. Replaces any activation already
+        driving the pin. Returns the monotonic anchor every edge is timed from.
+
+        An anchor in the past resumes an activation in its cycle phase: the
+        pin cycles as if it had been started then, from the next cycle
+        boundary on (run_for still counts from the anchor).
+        """
+        with self._condition:
+            now = time.monotonic()
+            generation = next(self._generations)
+            # If duration >= cycle_time, wait a second between pulses
+            period = cycle_time if cycle_time > duration else duration + 1
+            cycle = 0
+            if anchor is None:
+                anchor = now
+            elif anchor < now:
+                cycle = math.ceil((now - anchor) / period)
+            self._channels[pin] = {
+                "generation": generation,
+                "anchor": anchor,
+                "period": period,
+                "duration": duration,
+                "cycle": cycle,
+                "run_for": run_for,
+                "may_finish": may_finish,
+                "on_finish": on_finish,
+            }
+            heapq.heappush(
+                self._heap, (anchor + cycle * period, next(self._sequence), pin, generation, self.HIGH_EDGE)
+            )
+            self._condition.notify()
+            return anchor
+
+    def stop(self, pin):
+        """Stop cycling pin and drive it LOW"""
+        with self._condition:
+            if self._channels.pop(pin, None) is not None:
+                self._output(pin, self.gpio.LOW)
+
+    def stop_all(self):
+        """Stop every channel and drive their pins LOW"""
+        with self._condition:
+            for pin in list(self._channels):
+                del self._channels[pin]
+                self._output(pin, self.gpio.LOW)
+
+    def active_pins(self):
+        """Pins currently being cycled"""
+        with self._condition:
+            return list(self._channels)
+
+    def _output(self, pin, state):
+        try:
+            self.gpio.output(pin, state)
+            self._account(pin, state)
+        except Exception as e:
+            self.logger.error(f"Error setting pin {pin}: {e}")
+
+    def add_edge_listener(self, callback):
+        """Register callback(pin, level, monotonic_time) for every level change (must not block)"""
+        self._edge_listeners.append(callback)
+
+    def _account(self, pin, state):
+        """Add a level change of pin to its edge count and on-time"""
+        stats = self._pins.get(pin)
+        if stats is None:
+            stats = self._pins[pin] = [0, 0.0, None]
+        now = time.monotonic()
+        if state == self.gpio.HIGH:
+            if stats[2] is not None:
+                return
+            stats[0] += 1
+            stats[2] = now
+            level = 1
+        elif stats[2] is not None:
+            stats[0] += 1
+            stats[1] += now - stats[2]
+            stats[2] = None
+            level = 0
+        else:
+            return
+        for listener in self._edge_listeners:
+            try:
+                listener(pin, level, now)
+            except Exception as e:
+                self.logger.error(f"Error in edge listener: {e}")
+
+    def _run(self):
+        while True:
+            finished = None
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+
+                deadline, _, pin, generation, edge = self._heap[0]
+                now = time.monotonic()
+                if deadline > now:
+                    self._condition.wait(deadline - now)
+                    continue
+
+                heapq.heappop(self._heap)
+                channel = self._channels.get(pin)
+                if channel is None or channel["generation"] != generation:
+                    continue  # Edge of a stopped or replaced activation
+
+                try:
+                    finished = self._fire(pin, channel, edge, generation, deadline)
+                except Exception as e:
+                    self.logger.error(f"Error in activation cycle for pin {pin}: {e}")
+                    self._channels.pop(pin, None)
+                    self._output(pin, self.gpio.LOW)
+
+            # Callbacks run outside the engine lock so they may call back into the engine
+            if finished:
+                try:
+                    finished()
+                except Exception as e:
+                    self.logger.error(f"Error finishing activation on pin {pin}: {e}")
+
+    def _fire(self, pin, channel, edge, generation, deadline):
+        """Drive one edge and queue the next; returns on_finish when the activation ended
+
+        Deadlines are absolute, counted in whole cycles from the anchor, so the
+        time spent logging and driving the pin never accumulates as drift.
+        """
+        anchor = channel["anchor"]
+        period = channel["period"]
+        if edge == self.HIGH_EDGE:
+            # Check if a timed activation should end (only at cycle boundaries)
+            run_for = channel["run_for"]
+            if run_for is not None and deadline - anchor >= run_for:
+                may_finish = channel["may_finish"]
+                if may_finish is None or may_finish():
+                    del self._channels[pin]
+                    self.gpio.output(pin, self.gpio.LOW)
+                    self._account(pin, self.gpio.LOW)
+                    self._record_lateness(deadline)
+                    self.logger.info(f"Timed activation on pin {pin} completed after {run_for}s")
+                    return channel["on_finish"]
+
+            self.gpio.output(pin, self.gpio.HIGH)
+            self._account(pin, self.gpio.HIGH)
+            self._record_lateness(deadline)
+            self.logger.debug(f"Pin {pin} activated")
+            next_edge = self.LOW_EDGE
+            next_deadline = deadline + channel["duration"]
+        else:
+            self.gpio.output(pin, self.gpio.LOW)
+            self._account(pin, self.gpio.LOW)
+            self._record_lateness(deadline)
+            self.logger.debug(f"Pin {pin} deactivated")
+            next_edge = self.HIGH_EDGE
+            channel["cycle"] += 1
+            next_deadline = anchor + channel["cycle"] * period
+            # After a stall longer than a cycle (e.g. a suspended host), resume on the
+            # next cycle boundary instead of firing the missed pulses in a burst
+            behind = time.monotonic() - next_deadline
+            if behind > period:
+                missed = math.ceil(behind / period)
+                channel["cycle"] += missed
+                self.skipped_cycles += missed
+                next_deadline = anchor + channel["cycle"] * period
+
+        heapq.heappush(
+            self._heap,
+            (next_deadline, next(self._sequence), pin, generation, next_edge),
+        )
+        return None
+
+    def _record_lateness(self, deadline):
+        """Add how late an edge hit the pin to the lateness statistics"""
+        lateness = time.monotonic() - deadline
+        self.edges += 1
+        self.total_lateness += lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        self.lateness_histogram[bisect.bisect_left(LATENESS_BUCKETS_MS, lateness * 1000)] += 1
+
+    def pin_stats(self):
+        """Per pin: level changes and seconds spent HIGH (including a pulse in progress)"""
+        with self._condition:
+            now = time.monotonic()
+            return {
+                pin: {
+                    "edges": edges,
+                    "on_seconds": on_seconds + (now - high_since if high_since is not None else 0.0),
+                }
+                for pin, (edges, on_seconds, high_since) in self._pins.items()
+            }
+
+    def get_stats(self):
+        """Edge counts and lateness (milliseconds) for the stats endpoint"""
+        with self._condition:
+            buckets = [f"<={bound}" for bound in LATENESS_BUCKETS_MS]
+            buckets.append(f">{LATENESS_BUCKETS_MS[-1]}")
+            return {
+                "active_pins": list(self._channels),
+                "edges": self.edges,
+                "skipped_cycles": self.skipped_cycles,
+                "lateness_ms": {
+                    "mean": (
+                        round(self.total_lateness / self.edges * 1000, 3)
+                        if self.edges
+                        else None
+                    ),
+                    "max": round(self.max_lateness * 1000, 3),
+                    "histogram": dict(zip(buckets, self.lateness_histogram)),
+                },
+            }
+
+    def collect_metrics(self, out, pin_labels):
+        """Add the GPIO edge metrics to a metrics.Exposition; pin_labels maps pin -> labels dict"""
+        pins = self.pin_stats()
+        labels = {pin: pin_labels.get(pin, {"pin": pin}) for pin in pins}
+        out.counter(
+            "gpio_edges_total",
+            "Level changes driven on each output pin.",
+            [(labels[pin], stats["edges"]) for pin, stats in pins.items()],
+        )
+        out.counter(
+            "gpio_on_seconds_total",
+            "Cumulative time each output pin has been HIGH.",
+            [(labels[pin], round(stats["on_seconds"], 6)) for pin, stats in pins.items()],
+        )
+        out.gauge(
+            "gpio_active_channels",
+            "Pins the timing engine is currently cycling.",
+            len(self.active_pins()),
+        )
+        out.counter(
+            "gpio_skipped_cycles_total",
+            "Cycles skipped after the timing thread stalled.",
+            self.skipped_cycles,
+        )
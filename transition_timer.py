@@ -0,0 +1,116 @@
+import threading
+from datetime import datetime
+
+from metrics import SCHEDULER_BUCKETS, Histogram
+
+
+class TransitionTimer:
+    """Sleeps until the next schedule transition instead of polling every minute
+
+    The schedule monitor asks the store for the next start/end instant and
+    waits for it here. wake() (hooked to schedule changes) interrupts the
+    wait so edits take effect immediately. Sleeps are capped at max_sleep
+    seconds so a wall-clock jump, such as NTP setting the clock after boot,
+    is noticed within a minute.
+    """
+
+    def __init__(self, max_sleep=60):
+        self.max_sleep = max_sleep
+        self._wake = threading.Event()
+
+        self.next_transition = None
+        self.transitions = 0
+        self.change_wakeups = 0
+        self.last_lateness = None
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+        self.lateness_seconds = Histogram(SCHEDULER_BUCKETS)
+        # How long each schedule evaluation of the monitor loop took (see record_evaluation)
+        self.evaluation_seconds = Histogram(SCHEDULER_BUCKETS)
+
+    def wake(self):
+        """Interrupt the current wait so the monitor re-evaluates now"""
+        self._wake.set()
+
+    def wait_until(self, deadline):
+        """Wait for deadline (naive local datetime, None for "no transition")
+
+        Returns True when the monitor should evaluate schedules (deadline
+        reached or schedules changed) and False when the capped sleep ran out
+        first and the deadline should simply be recomputed.
+        """
+        self.next_transition = deadline
+        if deadline is None:
+            remaining = self.max_sleep
+        else:
+            remaining = (deadline - datetime.now()).total_seconds()
+
+        if remaining > 0:
+            if self._wake.wait(min(remaining, self.max_sleep)):
+                self._wake.clear()
+                self.change_wakeups += 1
+                return True
+            if deadline is None:
+                return False
+            remaining = (deadline - datetime.now()).total_seconds()
+            if remaining > 0:
+                return False
+
+        # How late the transition fired
+        lateness = -remaining
+        self.transitions += 1
+        self.last_lateness = lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        self.total_lateness += lateness
+        self.lateness_seconds.observe(lateness)
+        return True
+
+    def record_evaluation(self, seconds):
+        """Record how long the monitor took to evaluate the schedules after waking"""
+        self.evaluation_seconds.observe(seconds)
+
+    def get_stats(self):
+        """Transition counts and lateness (milliseconds) for the stats endpoint"""
+        return {
+            "next_transition": (
+                self.next_transition.isoformat() if self.next_transition else None
+            ),
+            "transitions": self.transitions,
+            "change_wakeups": self.change_wakeups,
+            "lateness_ms": {
+                "last": (
+                    round(self.last_lateness * 1000, 3)
+                    if self.last_lateness is not None
+                    else None
+                ),
+                "mean": (
+                    round(self.total_lateness / self.transitions * 1000, 3)
+                    if self.transitions
+                    else None
+                ),
+                "max": round(self.max_lateness * 1000, 3),
+            },
+        }
+
+    def collect_metrics(self, out):
+        """Add the schedule monitor metrics to a metrics.Exposition"""
+        out.counter(
+            "scheduler_transitions_total",
+            "Schedule transitions the monitor woke up for.",
+            self.transitions,
+        )
+        out.counter(
+            "scheduler_change_wakeups_total",
+            "Monitor wake-ups caused by schedule edits.",
+            self.change_wakeups,
+        )
+        out.histogram(
+            "scheduler_wake_lateness_seconds",
+            "How late the monitor woke up for a schedule transition.",
+            self.lateness_seconds,
+        )
+        out.histogram(
+            "scheduler_evaluation_seconds",
+            "Duration of one schedule monitor loop evaluation.",
+            self.evaluation_seconds,
+        )
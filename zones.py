@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import re
+
+from clock import SYSTEM_CLOCK
+from schedule_store import create_schedule_store
+
+# The zone served by the original /api/... routes, configured by pin_mapping.json
+DEFAULT_ZONE = "default"
+
+# Zone ids end up in URLs and file names
+ZONE_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,31}$")
+
+
+class Zone:
+    """One dispenser zone (e.g. a room): its own pin mapping, controller and schedules
+
+    Every zone's controller drives the shared GPIO backend through the shared
+    timing engine, and the single schedule monitor thread evaluates all zones;
+    active_schedules and last_active_schedule are its bookkeeping for this zone.
+    The controller is attached once the process knows whether it owns the
+    GPIO (a SimpleGPIOController) or forwards to the leader (a RemoteController).
+    The scheduler logic reads the time from clock and logs to logger, so the
+    schedule simulator can run it on a virtual clock without log noise.
+    """
+
+    def __init__(self, zone_id, name, formulas, store, clock=SYSTEM_CLOCK, logger=None):
+        self.id = zone_id
+        self.name = name
+        self.formulas = formulas  # Configured pin mapping
+        self.controller = None
+        self.store = store
+        self.clock = clock
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.active_schedules = {}
+        self.last_active_schedule = None
+
+    def summary(self):
+        """Zone overview for the zones listing"""
+        status = self.controller.get_status()
+        return {
+            "id": self.id,
+            "name": self.name,
+            "pin_mapping": self.controller.pin_mapping,
+            "active_formula": status["active_formula"],
+            "is_scheduled": status["is_scheduled"],
+            "schedule_count": len(self.store.snapshot()["schedules"]),
+        }
+
+
+def zone_schedules_path(zone_id):
+    """Schedules file of a zone; the default zone keeps schedules.json"""
+    return "schedules.json" if zone_id == DEFAULT_ZONE else f"schedules-{zone_id}.json"
+
+
+def load_zone_config(path="zones.json"):
+    """Read the additional zones as {zone_id: {"name": ..., "formulas": {color: pin}}}
+
+    A missing file means a single-zone installation. Raises ValueError for
+    invalid zone definitions.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        config = json.load(f)
+
+    zones = {}
+    for zone_id, zone in config.get("zones", {}).items():
+        if zone_id == DEFAULT_ZONE or not ZONE_ID_PATTERN.match(zone_id):
+            raise ValueError(
+                f"Invalid zone id '{zone_id}': use lowercase letters, digits, '-' and '_' "
+                f"(and not '{DEFAULT_ZONE}', which pin_mapping.json configures)"
+            )
+        formulas = zone.get("formulas")
+        if not isinstance(formulas, dict) or not formulas:
+            raise ValueError(f"Zone '{zone_id}' needs a \"formulas\" pin mapping")
+        zones[zone_id] = {"name": zone.get("name", zone_id), "formulas": formulas}
+    return zones
+
+
+def check_pin_conflicts(mappings):
+    """Raise ValueError if a pin is mapped in more than one zone
+
+    mappings is {zone_id: {color: pin}}; zones sharing the timing engine
+    must drive disjoint pins.
+    """
+    owners = {}
+    for zone_id, formulas in mappings.items():
+        for pin in formulas.values():
+            owner = owners.setdefault(pin, zone_id)
+            if owner != zone_id:
+                raise ValueError(f"Pin {pin} is mapped in both zone '{owner}' and zone '{zone_id}'")
+
+
+def create_zone(zone_id, name, formulas, storage, shared=False):
+    """Create a zone and its schedule store (shared=True when several workers use its files)"""
+    store = create_schedule_store(zone_schedules_path(zone_id), storage, shared)
+    return Zone(zone_id, name, formulas, store)